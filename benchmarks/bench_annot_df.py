@@ -0,0 +1,91 @@
+"""Compare AnnotDf with the previous row-by-row DataFrame growth.
+
+The previous version added every annotation with df.loc[key, col] = ...,
+which copies the DataFrame for each new row, i.e. O(rows^2).
+
+    python benchmarks/bench_annot_df.py --images 500
+"""
+
+import argparse
+import json
+import os.path as osp
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from labelme import LabelFile
+from labelme.user_extns import tools
+
+
+def get_annot_df_before(file_list):
+    df = pd.DataFrame(columns=['image_path', 'image_basename', 'annot_num',
+                               'label', 'group_id', 'shape_obj'])
+    for img_file in file_list:
+        label_file = osp.splitext(img_file)[0] + '.json'
+        shapes = LabelFile(label_file, loadImage=False).shapes
+        for annot_num, shape in enumerate(shapes, 1):
+            key = len(df)
+            df.loc[key, 'image_path'] = img_file
+            df.loc[key, 'image_basename'] = osp.basename(img_file)
+            df.loc[key, 'annot_num'] = annot_num
+            df.loc[key, 'label'] = shape['label']
+            df.loc[key, 'group_id'] = shape['group_id']
+            for flag, value in shape['flags'].items():
+                df.loc[key, flag.replace(' ', '_')] = value
+            df.loc[key, 'shape_obj'] = tools.shape_dict_to_obj(shape)
+    return df
+
+
+def make_label_files(tmp_dir, n_images, n_shapes):
+    file_list = []
+    for i in range(n_images):
+        img_file = osp.join(tmp_dir, '{:05d}.bmp'.format(i))
+        shapes = [
+            dict(
+                label=['Tissue boundary', 'Hole', 'Residual Epi'][j % 3],
+                points=[[j, j], [j + 50, j], [j + 50, j + 50], [j, j + 50]],
+                group_id=j % 5,
+                shape_type='polygon',
+                flags={'Not in tissue': False, 'Rework': j % 2 == 0},
+            )
+            for j in range(n_shapes)
+        ]
+        data = dict(version='4.2.9', flags={}, shapes=shapes,
+                    imagePath=osp.basename(img_file), imageData=None,
+                    imageHeight=4000, imageWidth=5000)
+        with open(osp.splitext(img_file)[0] + '.json', 'w') as f:
+            json.dump(data, f)
+        file_list.append(img_file)
+    return file_list
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=500)
+    parser.add_argument('--shapes', type=int, default=10)
+    parser.add_argument('--skip-before', action='store_true')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        file_list = make_label_files(tmp_dir, args.images, args.shapes)
+
+        t_start = time.time()
+        df = tools.getAnnotDf(file_list)
+        print('AnnotDf:       {:.2f} s ({} rows)'.format(
+            time.time() - t_start, len(df)))
+
+        if not args.skip_before:
+            t_start = time.time()
+            df_before = get_annot_df_before(file_list)
+            print('row by row:    {:.2f} s ({} rows)'.format(
+                time.time() - t_start, len(df_before)))
+            assert df['label'].tolist() == df_before['label'].tolist()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Compare the time auto-save blocks the GUI thread, before and after.
+
+Each edit used to call LabelFile.save on the GUI thread: JSON encoding,
+base64 of the image with store_data, and the write itself.  Now the GUI
+thread only queues a snapshot (not timed here) and LabelFileWriter writes
+it, coalescing saves of the same file that arrive while it is busy.
+
+    python benchmarks/bench_auto_save.py --edits 20 --image-mb 8
+"""
+
+import argparse
+import os.path as osp
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from labelme.label_file import LabelFile
+from labelme.label_writer import LabelFileWriter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edits', type=int, default=20)
+    parser.add_argument('--shapes', type=int, default=100)
+    parser.add_argument('--vertices', type=int, default=100)
+    parser.add_argument('--image-mb', type=float, default=8)
+    args = parser.parse_args()
+
+    random_state = np.random.RandomState(0)
+    shapes = [
+        dict(
+            label='class_{}'.format(i % 5),
+            points=random_state.uniform(0, 5000, (args.vertices, 2)).tolist(),
+            group_id=None,
+            shape_type='polygon',
+            flags={},
+        )
+        for i in range(args.shapes)
+    ]
+    # not a real image: LabelFile only reads the header of imageData
+    with open(osp.join(osp.dirname(osp.abspath(__file__)), '..', 'tests',
+                       'labelme_tests', 'data', 'raw', '2011_000003.jpg'),
+              'rb') as f:
+        image_data = f.read()
+    image_data += random_state.bytes(int(args.image_mb * 2 ** 20))
+    kwargs = dict(
+        shapes=shapes, imagePath='image.jpg', imageData=image_data,
+        imageHeight=None, imageWidth=None,
+    )
+
+    tmp_dir = tempfile.mkdtemp()
+    filename = osp.join(tmp_dir, 'label.json')
+    try:
+        t_start = time.time()
+        for _ in range(args.edits):
+            LabelFile().save(filename, **kwargs)
+        before = (time.time() - t_start) / args.edits
+
+        writer = LabelFileWriter()
+        t_start = time.time()
+        for _ in range(args.edits):
+            writer.save(LabelFile(), filename, **kwargs)
+        after = (time.time() - t_start) / args.edits
+        writer.shutdown()
+        total = time.time() - t_start
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print('{} edits, {} shapes x {} vertices, {} MB imageData'.format(
+        args.edits, args.shapes, args.vertices, args.image_mb))
+    print('before: {:.1f} ms / edit on the GUI thread'.format(before * 1000))
+    print('after:  {:.3f} ms / edit on the GUI thread, {} writes in {:.2f} s'
+          .format(after * 1000, writer.written, total))
+
+
+if __name__ == '__main__':
+    main()
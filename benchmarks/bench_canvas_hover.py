@@ -0,0 +1,129 @@
+"""Compare the hover hit-test of Canvas with the previous implementation.
+
+The previous version tested every visible shape on each mouse move:
+nearestVertex and nearestEdge looped over the points in Python (with a few
+numpy arrays per edge) and containsPoint built a new QPainterPath, i.e.
+O(shapes x vertices) per event.
+
+    python benchmarks/bench_canvas_hover.py --shapes 300 --vertices 2000
+"""
+
+import argparse
+import time
+
+import numpy as np
+from qtpy import QtCore
+from qtpy import QtGui
+from qtpy import QtWidgets
+
+from labelme.shape import Shape
+import labelme.utils
+from labelme.widgets import Canvas
+
+
+def nearest_vertex_before(shape, point, epsilon):
+    min_distance = float('inf')
+    min_i = None
+    for i, p in enumerate(shape.points):
+        dist = labelme.utils.distance(p - point)
+        if dist <= epsilon and dist < min_distance:
+            min_distance = dist
+            min_i = i
+    return min_i
+
+
+def nearest_edge_before(shape, point, epsilon):
+    min_distance = float('inf')
+    post_i = None
+    points = shape.points  # a list of QPointF before
+    for i in range(len(points)):
+        line = [points[i - 1], points[i]]
+        dist = labelme.utils.distancetoline(point, line)
+        if dist <= epsilon and dist < min_distance:
+            min_distance = dist
+            post_i = i
+    return post_i
+
+
+def contains_point_before(shape, point):
+    points = shape.points
+    path = QtGui.QPainterPath(points[0])
+    for p in points[1:]:
+        path.lineTo(p)
+    return path.contains(point)
+
+
+def hover_before(canvas, pos, epsilon):
+    for shape in reversed([s for s in canvas.shapes if canvas.isVisible(s)]):
+        index = nearest_vertex_before(shape, pos, epsilon)
+        index_edge = nearest_edge_before(shape, pos, epsilon)
+        if index is not None or contains_point_before(shape, pos):
+            return shape, index, index_edge
+    return None, None, None
+
+
+def hover_after(canvas, pos, epsilon):
+    for shape in canvas.shapesAt(pos, epsilon):
+        index = shape.nearestVertex(pos, epsilon)
+        index_edge = shape.nearestEdge(pos, epsilon)
+        if index is not None or shape.containsPoint(pos):
+            return shape, index, index_edge
+    return None, None, None
+
+
+def random_shapes(n_shapes, n_vertices, width, height, seed=0):
+    random_state = np.random.RandomState(seed)
+    angles = np.linspace(0, 2 * np.pi, n_vertices, endpoint=False)
+    shapes = []
+    for _ in range(n_shapes):
+        center = random_state.uniform(0, [width, height])
+        radius = random_state.uniform(20, 100, n_vertices)
+        xs = center[0] + radius * np.cos(angles)
+        ys = center[1] + radius * np.sin(angles)
+        shape = Shape(label='tissue')
+        shape.points = [QtCore.QPointF(x, y) for x, y in zip(xs, ys)]
+        shape.close()
+        shapes.append(shape)
+    return shapes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shapes', type=int, default=300)
+    parser.add_argument('--vertices', type=int, default=2000)
+    parser.add_argument('--moves', type=int, default=5)
+    parser.add_argument('--size', default='8000x6000', help='WIDTHxHEIGHT')
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication([])  # NOQA
+    width, height = [int(x) for x in args.size.split('x')]
+    canvas = Canvas()
+    canvas.loadShapes(
+        random_shapes(args.shapes, args.vertices, width, height)
+    )
+    random_state = np.random.RandomState(1)
+    positions = [
+        QtCore.QPointF(x, y)
+        for x, y in random_state.uniform(0, [width, height], (args.moves, 2))
+    ]
+    epsilon = canvas.epsilon
+
+    t_start = time.time()
+    results1 = [hover_before(canvas, pos, epsilon) for pos in positions]
+    before = (time.time() - t_start) / args.moves
+
+    canvas.shapesAt(positions[0])  # build the index
+    t_start = time.time()
+    results2 = [hover_after(canvas, pos, epsilon) for pos in positions]
+    after = (time.time() - t_start) / args.moves
+
+    assert results1 == results2
+    print('{} shapes x {} vertices, {} mouse moves, results identical'
+          .format(args.shapes, args.vertices, args.moves))
+    print('before: {:.2f} ms / move'.format(before * 1000))
+    print('after:  {:.2f} ms / move ({:.0f}x)'
+          .format(after * 1000, before / after))
+
+
+if __name__ == '__main__':
+    main()
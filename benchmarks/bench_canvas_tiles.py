@@ -0,0 +1,69 @@
+"""Compare painting a zoomed-out large image with and without tiles.
+
+Without the tile pyramid, every paint resamples the full resolution pixmap
+under the zoom transform, i.e. O(image pixels) per frame.
+
+    python benchmarks/bench_canvas_tiles.py --size 10000x10000 --zoom 0.1
+"""
+
+import argparse
+import time
+
+from qtpy import QtGui
+from qtpy import QtWidgets
+
+from labelme.widgets import Canvas
+
+
+def paint_time(canvas, n_paints):
+    t_start = time.time()
+    for _ in range(n_paints):
+        canvas.repaint()
+    return (time.time() - t_start) / n_paints
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', default='10000x10000', help='WIDTHxHEIGHT')
+    parser.add_argument('--zoom', type=float, default=0.1)
+    parser.add_argument('--paints', type=int, default=10)
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication([])
+    width, height = [int(x) for x in args.size.split('x')]
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    painter = QtGui.QPainter(image)
+    gradient = QtGui.QLinearGradient(0, 0, width, height)
+    gradient.setColorAt(0, QtGui.QColor(255, 0, 0))
+    gradient.setColorAt(1, QtGui.QColor(0, 0, 255))
+    painter.fillRect(image.rect(), gradient)
+    painter.end()
+    pixmap = QtGui.QPixmap.fromImage(image)
+
+    canvas = Canvas()
+    canvas.scale = args.zoom
+    canvas.loadPixmap(pixmap)
+    canvas.adjustSize()
+    canvas.show()
+    app.processEvents()
+    before = paint_time(canvas, args.paints)
+
+    canvas.loadPixmap(pixmap, image)
+    t_start = time.time()
+    canvas._pyramid.build()
+    canvas._pyramid.tile((canvas._pyramid.num_levels - 1, 0, 0), wait=True)
+    build = time.time() - t_start
+    canvas.repaint()
+    after = paint_time(canvas, args.paints)
+    report = canvas.paintStatsReport()
+    assert report['tiles_drawn'] > 0
+
+    print('{}x{} image at zoom {}'.format(width, height, args.zoom))
+    print('pyramid built in the background in {:.2f} s'.format(build))
+    print('before: {:.1f} ms / paint'.format(before * 1000))
+    print('after:  {:.1f} ms / paint ({:.0f}x)'
+          .format(after * 1000, before / after))
+
+
+if __name__ == '__main__':
+    main()
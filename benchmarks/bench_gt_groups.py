@@ -0,0 +1,83 @@
+"""Compare grouping the images of ground truth builder mode, before and after.
+
+populateFileList used to split every image path with pathlib and run
+gt_grp_transforms on it in a row-wise DataFrame.apply, on every directory
+scan.  Now the folder and file name are extracted with vectorized string
+operations, the transforms run once per distinct file name and the result
+is reused while the list of images does not change.
+
+    python benchmarks/bench_gt_groups.py --images 10000 --annotators 4
+"""
+
+import argparse
+import os.path as osp
+import pathlib
+import time
+
+import pandas as pd
+from qtpy import QtWidgets
+
+import labelme.app
+import labelme.config
+
+
+def index_before(win, all_images):
+
+    def parse_img_path(file_path):
+        parts = pathlib.Path(file_path).parts
+        file_path = parts[-1]
+        gt_grp = file_path
+        for fn in win.gt_grp_transforms:
+            gt_grp = fn(gt_grp)
+        return [parts[-2], file_path, gt_grp]
+
+    df = pd.DataFrame(columns=['Image Folder', 'File Name',
+                               'Ground Truth Group', 'Is Ground Truth'])
+    df['Image Folder'] = [None for i in range(len(all_images))]
+    df.index = all_images
+    df[['Image Folder', 'File Name', 'Ground Truth Group']] = df.apply(
+        lambda row: parse_img_path(row.name), axis=1, result_type='expand'
+    )
+    df['Is Ground Truth'] = \
+        df['Image Folder'].str.upper() == win.groundTruthDirName.upper()
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=10000)
+    parser.add_argument('--annotators', type=int, default=4)
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication([])  # NOQA
+    win = labelme.app.MainWindow(config=labelme.config.get_default_config())
+    folders = ['Ground Truth'] + [
+        'Annotator {}'.format(i) for i in range(args.annotators)
+    ]
+    all_images = [
+        osp.join('/data', 'study', folder,
+                 '{:02d}-Image {}.jpg'.format(i % 100, i))
+        for folder in folders for i in range(args.images)
+    ]
+
+    t_start = time.time()
+    before = index_before(win, all_images)
+    t_before = time.time() - t_start
+
+    t_start = time.time()
+    win.indexGroundTruth(all_images)
+    t_after = time.time() - t_start
+    t_start = time.time()
+    win.indexGroundTruth(list(all_images))
+    t_rescan = time.time() - t_start
+
+    assert (before.values == win.dfAllImages.values).all()
+    print('{} images'.format(len(all_images)))
+    print('before: {:.0f} ms'.format(t_before * 1000))
+    print('after:  {:.0f} ms, {:.1f} ms for a rescan with the same images'
+          .format(t_after * 1000, t_rescan * 1000))
+    win.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Compare loading and saving label files with the previous json calls.
+
+LabelFile.load parsed the whole document with json.load, including the
+base64 imageData when the image was not needed (loadImage=False), and
+LabelFile.save always wrote indented JSON with json.dump.
+
+    python benchmarks/bench_label_file.py --shapes 200 --vertices 100 \\
+        --image-mb 8
+"""
+
+import argparse
+import base64
+import json
+import os
+import os.path as osp
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from labelme import json_codec
+from labelme.label_file import LabelFile
+
+
+def load_before(filename):
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+def save_before(filename, data):
+    with open(filename, 'w') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def save_after(filename, data, compact=False):
+    with open(filename, 'wb') as f:
+        f.write(json_codec.dumps(data, compact=compact))
+
+
+def make_data(n_shapes, n_vertices, image_mb, seed=0):
+    random_state = np.random.RandomState(seed)
+    shapes = [
+        dict(
+            label='class_{}'.format(i % 5),
+            points=random_state.uniform(0, 5000, (n_vertices, 2)).tolist(),
+            group_id=None,
+            shape_type='polygon',
+            flags={},
+        )
+        for i in range(n_shapes)
+    ]
+    image_data = None
+    if image_mb:
+        image_data = base64.b64encode(
+            random_state.bytes(int(image_mb * 2 ** 20))
+        ).decode('utf-8')
+    return dict(
+        version='4.2.9', flags={}, shapes=shapes, imagePath='image.jpg',
+        imageData=image_data, imageHeight=5000, imageWidth=5000,
+    )
+
+
+def timeit(func, n_repeat):
+    t_start = time.time()
+    for _ in range(n_repeat):
+        func()
+    return (time.time() - t_start) / n_repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shapes', type=int, default=200)
+    parser.add_argument('--vertices', type=int, default=100)
+    parser.add_argument('--image-mb', type=float, default=8)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    filename = osp.join(tmp_dir, 'label.json')
+    print('json backend: {}'.format(json_codec.backend))
+    try:
+        for image_mb in [0, args.image_mb]:
+            data = make_data(args.shapes, args.vertices, image_mb)
+            save_before(filename, data)
+            size = os.stat(filename).st_size / 2 ** 20
+            print('{} shapes x {} vertices, imageData {} MB: {:.1f} MB file'
+                  .format(args.shapes, args.vertices, image_mb, size))
+
+            before = timeit(lambda: load_before(filename), args.repeat)
+            after = timeit(
+                lambda: LabelFile(filename, loadImage=False), args.repeat
+            )
+            print('  load without image: before {:.1f} ms, after {:.1f} ms'
+                  .format(before * 1000, after * 1000))
+
+            before = timeit(lambda: save_before(filename, data), args.repeat)
+            after = timeit(lambda: save_after(filename, data), args.repeat)
+            compact = timeit(
+                lambda: save_after(filename, data, compact=True), args.repeat
+            )
+            print('  save: before {:.1f} ms, after {:.1f} ms, '
+                  'compact {:.1f} ms ({:.1f} MB)'.format(
+                      before * 1000, after * 1000, compact * 1000,
+                      os.stat(filename).st_size / 2 ** 20))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Time loading a labeled large BMP the way MainWindow.loadFile does.
+
+before: LabelFile.load decoded the image to check its size (base64 round
+        trip + PIL) and loadFile decoded it again with QImage.fromData.
+after:  LabelFile.load probes the header only; QImage.fromData is the
+        single decode.
+
+    python benchmarks/bench_label_file_load.py --size 5000x4000
+"""
+
+import argparse
+import base64
+import json
+import os.path as osp
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import PIL.Image
+from qtpy import QtGui
+
+from labelme.label_file import LabelFile
+from labelme import utils
+
+
+def load_before(json_file):
+    with open(json_file) as f:
+        data = json.load(f)
+    imageData = LabelFile.load_image_file(
+        osp.join(osp.dirname(json_file), data['imagePath'])
+    )
+    utils.img_b64_to_arr(base64.b64encode(imageData).decode('utf-8'))
+    return QtGui.QImage.fromData(imageData)
+
+
+def load_after(json_file):
+    label_file = LabelFile(json_file)
+    return QtGui.QImage.fromData(label_file.imageData)
+
+
+def timeit(func, arg, repeat):
+    times = []
+    for _ in range(repeat):
+        t_start = time.time()
+        image = func(arg)
+        times.append(time.time() - t_start)
+        assert not image.isNull()
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', default='5000x4000', help='WIDTHxHEIGHT')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    width, height = [int(x) for x in args.size.split('x')]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        img = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+        PIL.Image.fromarray(img).save(osp.join(tmp_dir, 'image.bmp'))
+        json_file = osp.join(tmp_dir, 'image.json')
+        LabelFile().save(
+            json_file,
+            shapes=[],
+            imagePath='image.bmp',
+            imageHeight=height,
+            imageWidth=width,
+        )
+
+        before = timeit(load_before, json_file, args.repeat)
+        after = timeit(load_after, json_file, args.repeat)
+        print('image: {}x{} BMP'.format(width, height))
+        print('before: {:.3f} s'.format(before))
+        print('after:  {:.3f} s ({:.1f}x)'.format(after, before / after))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
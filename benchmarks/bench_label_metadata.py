@@ -0,0 +1,84 @@
+"""Compare scanning the labels of a directory with and without metadata.
+
+Tools that only need the labels and flags of each label file used to load
+the whole file with LabelFile(filename, loadImage=False), which parses the
+points (and the base64 imageData) of every shape.
+
+    python benchmarks/bench_label_metadata.py --files 200 --shapes 50 \\
+        --vertices 200
+"""
+
+import argparse
+import os.path as osp
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from labelme.label_file import LabelFile
+
+
+def scan_before(filenames):
+    return [
+        [s['label'] for s in LabelFile(f, loadImage=False).shapes]
+        for f in filenames
+    ]
+
+
+def scan_after(filenames):
+    return [
+        [s['label'] for s in LabelFile.load_metadata(f)['shapes']]
+        for f in filenames
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--shapes', type=int, default=50)
+    parser.add_argument('--vertices', type=int, default=200)
+    args = parser.parse_args()
+
+    random_state = np.random.RandomState(0)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filenames = []
+        for i in range(args.files):
+            shapes = [
+                dict(
+                    label='class_{}'.format(j % 5),
+                    points=random_state.uniform(
+                        0, 5000, (args.vertices, 2)).tolist(),
+                    group_id=None,
+                    shape_type='polygon',
+                    flags={},
+                )
+                for j in range(args.shapes)
+            ]
+            filename = osp.join(tmp_dir, '{}.json'.format(i))
+            LabelFile().save(filename, shapes, '{}.jpg'.format(i), 5000, 5000)
+            filenames.append(filename)
+
+        t_start = time.time()
+        before = scan_before(filenames)
+        before_time = time.time() - t_start
+        t_start = time.time()
+        after = scan_after(filenames)
+        cold_time = time.time() - t_start
+        t_start = time.time()
+        scan_after(filenames)
+        warm_time = time.time() - t_start
+        assert before == after
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print('{} files x {} shapes x {} vertices'
+          .format(args.files, args.shapes, args.vertices))
+    print('before: {:.3f} s'.format(before_time))
+    print('after:  {:.3f} s, {:.3f} s when cached'
+          .format(cold_time, warm_time))
+
+
+if __name__ == '__main__':
+    main()
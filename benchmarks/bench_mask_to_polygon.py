@@ -0,0 +1,97 @@
+"""Compare MaskToPolygon on a batch of predicted masks, before and after.
+
+get_polygon used to run Canny on the cleaned mask before findContours,
+build a shapely Polygon of every contour to find the largest one and
+simplify it with shapely; only that polygon was kept.  Now the contours
+of the cleaned mask are ranked with cv2.contourArea and simplified with
+cv2.approxPolyDP, and every region can be returned.
+
+    python benchmarks/bench_mask_to_polygon.py --masks 32
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+from shapely import affinity
+from shapely.geometry import Polygon
+
+from labelme.user_extns.img_ml_lib import MaskToPolygon
+
+
+def get_polygon_before(pred_mask, targ_size):
+    kernel = np.ones((10, 10), np.uint8)
+    pred_mask_img = pred_mask.astype(np.uint8)
+    pred_closed = cv2.morphologyEx(pred_mask_img, cv2.MORPH_CLOSE, kernel)
+    pred_closed = cv2.morphologyEx(pred_closed, cv2.MORPH_OPEN, kernel)
+    edges = cv2.Canny(pred_closed, 0, 1, L2gradient=True)
+    contours, _ = cv2.findContours(
+        edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+    )
+    max_area = 0
+    polygon = None
+    for c in contours:
+        p = Polygon(c[:, 0])
+        if p.area > max_area:
+            max_area = p.area
+            polygon = p
+    polygon_s = polygon.simplify(1.5)
+    scale_x = targ_size[0] / pred_mask.shape[0]
+    scale_y = targ_size[1] / pred_mask.shape[1]
+    polygon_s = affinity.scale(polygon_s, xfact=scale_x, yfact=scale_y,
+                               origin=(0, 0))
+    return polygon_s.boundary.coords
+
+
+def make_masks(n_masks, size, seed=0):
+    """Blobs from thresholded smoothed noise, like a segmentation output."""
+    random_state = np.random.RandomState(seed)
+    masks = []
+    for _ in range(n_masks):
+        noise = random_state.uniform(size=(size, size)).astype(np.float32)
+        noise = cv2.GaussianBlur(noise, (0, 0), 8)
+        masks.append((noise > np.percentile(noise, 60)).astype(np.int64))
+    return np.stack(masks)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--masks', type=int, default=32)
+    parser.add_argument('--size', type=int, default=224)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    masks = make_masks(args.masks, args.size)
+    targ_size = (5000, 4000)
+
+    t_start = time.time()
+    for _ in range(args.repeat):
+        before = [get_polygon_before(m, targ_size) for m in masks]
+    t_before = (time.time() - t_start) / args.repeat
+
+    m_to_p = MaskToPolygon(targ_size=targ_size)
+    t_start = time.time()
+    for _ in range(args.repeat):
+        largest = [m_to_p.get_polygon(m) for m in masks]
+    t_largest = (time.time() - t_start) / args.repeat
+    m_to_p.min_area = 100
+    t_start = time.time()
+    for _ in range(args.repeat):
+        after = m_to_p.get_polygons_batch(masks)
+    t_after = (time.time() - t_start) / args.repeat
+
+    print('{} masks of {}x{}'.format(args.masks, args.size, args.size))
+    print('before:          {:.1f} ms, {} polygons, {:.0f} points each'
+          .format(t_before * 1000, len(before),
+                  np.mean([len(p) for p in before])))
+    print('after, largest:  {:.1f} ms, {} polygons, {:.0f} points each'
+          .format(t_largest * 1000, len(largest),
+                  np.mean([len(p) for p in largest])))
+    n_regions = sum(len(polygons) for polygons in after)
+    print('after, regions:  {:.1f} ms, {} polygons'.format(
+        t_after * 1000, n_regions))
+
+
+if __name__ == '__main__':
+    main()
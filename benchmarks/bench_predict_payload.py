@@ -0,0 +1,67 @@
+"""Compare the size and encoding time of prediction requests.
+
+ImgPredMgr.predict_imgs used to send each image as nested lists of rounded
+float64 serialized by the json module, one request (and one newly built
+API client) per call.  The payload can now be a base64 PNG or float16
+array, serialized with the faster JSON backend.
+
+    python benchmarks/bench_predict_payload.py --images 8
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import PIL.Image
+
+from labelme import json_codec
+from labelme.user_extns.gcp_lib import ImgPredMgr
+from labelme.user_extns.gcp_lib import RemoteBackend
+
+
+def encode_before(imgs, size):
+    instances = []
+    for img in imgs:
+        img_resized = img.resize(size, PIL.Image.LANCZOS)
+        img_resized_np = np.asarray(img_resized, dtype=np.float64) / 255
+        instances.append(np.around(img_resized_np, 4).tolist())
+    return json.dumps({'instances': instances}).encode('utf-8')
+
+
+def encode_after(ipm, imgs):
+    instances = ipm.backend.encode(ipm.preprocess(imgs))
+    return json_codec.dumps({'instances': instances}, compact=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=8)
+    args = parser.parse_args()
+
+    random_state = np.random.RandomState(0)
+    imgs = [
+        PIL.Image.fromarray(
+            random_state.randint(0, 256, (1024, 1280, 3), dtype=np.uint8)
+        )
+        for _ in range(args.images)
+    ]
+    print('{} images, json backend: {}'.format(args.images,
+                                               json_codec.backend))
+
+    t_start = time.time()
+    data = encode_before(imgs, (224, 224))
+    print('before:        {:.1f} MB in {:.0f} ms'.format(
+        len(data) / 2 ** 20, (time.time() - t_start) * 1000))
+    for payload in RemoteBackend.PAYLOADS:
+        ipm = ImgPredMgr(backend=RemoteBackend(payload=payload))
+        t_start = time.time()
+        data = encode_after(ipm, imgs)
+        print('after {:8s} {:.1f} MB in {:.0f} ms'.format(
+            payload + ':', len(data) / 2 ** 20,
+            (time.time() - t_start) * 1000))
+        ipm.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Compare generating the rpt01 report, before and after.
+
+rpt01_gen used to query the annotations of each image per label
+(DataFrame.query), read each annotation with df.loc[idx] and build the
+report with one df.loc lookup per annotation, all in a single process,
+and drew the outlines of each image even when no image was exported.
+Now label_instance is one groupby().cumcount() over all annotations,
+groups are iterated and images are rendered in a process pool.
+
+By default no image is exported (all modes 'none'), which measures the
+report itself; --exports also renders and saves the images, where the
+process pool helps.  Images are hard links to one small bitmap.
+
+    python benchmarks/bench_rpt01_gen.py --images 5000 --annots 10
+"""
+
+import argparse
+import json
+import os
+import os.path as osp
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from labelme import user_extns
+from labelme.user_extns import mask_lib
+from labelme.user_extns.annot_export import rpt01_gen
+
+
+def report_before(label_dir, img_paths, min_intensity=5):
+    # The per-image loop and report loop of the previous rpt01_gen,
+    # without exports
+    LABEL_COLORMAP = user_extns.get_colormap()
+    obj_annots = user_extns.AnnotDf()
+    divs = {}
+    label_instances = {}
+    label_colors = {}
+    for img_num, (img_path, label_file, df_shapes) in enumerate(
+            obj_annots.iter_images(img_paths)):
+        if not label_file or not label_file.shapes:
+            continue
+        img_orig = Image.open(img_path)
+        df_shapes['label_instance'] = \
+            df_shapes.groupby('label').cumcount() + 1
+        label_instances.update(df_shapes['label_instance'].items())
+        df_shapes = df_shapes.sort_values(
+            ['label', 'image_basename', 'label_instance'])
+        shapes = {n: s for n, s in enumerate(label_file.shapes, 1)}
+        outlines = []
+        for label in set(df_shapes['label']):
+            label_shapes = [
+                shapes[row['annot_num']] for _, row in
+                df_shapes.query(f'`label` == "{label}"').iterrows()
+                if hasattr(row['shape_obj'], 'label')
+            ]
+            outlines += label_shapes
+            if label and label not in label_colors:
+                label_colors[label] = \
+                    LABEL_COLORMAP[len(label_colors) % len(LABEL_COLORMAP)]
+        mask_lib.draw_outlines(img_orig, outlines, label_colors)
+        for idx in df_shapes.index:
+            row = df_shapes.loc[idx]
+            s_obj = row['shape_obj']
+            if row['group_id'] is not None and \
+                    row['group_id'] < min_intensity:
+                continue
+            divs[idx] = '<div>{} {} {}</div>\n'.format(
+                s_obj.label, osp.basename(img_path), row['annot_num'])
+    df_annot = obj_annots.df_annot
+    df_annot['divs'] = pd.Series(divs, dtype=object)
+    df_annot['label_instance'] = pd.Series(label_instances, dtype=object)
+
+    df_annot_sort = df_annot.sort_values(
+        ['label', 'group_id', 'image_basename', 'annot_num'])
+    image_divs = ''
+    for idx in df_annot_sort.index:
+        row = df_annot_sort.loc[idx]
+        image_div = df_annot.loc[idx, 'divs']
+        if isinstance(image_div, str):
+            image_divs += row['label'] + image_div
+    return df_annot
+
+
+def make_label_dir(tmp_dir, n_images, n_annots, seed=0):
+    random_state = np.random.RandomState(seed)
+    label_dir = osp.join(tmp_dir, 'annot', 'Ground Truth')
+    os.makedirs(label_dir)
+    src = osp.join(tmp_dir, 'src.bmp')
+    Image.fromarray(np.zeros((120, 160, 3), dtype=np.uint8)).save(src)
+    labels = ['Hole', 'Residual Epi', 'Tissue boundary', 'Dermis']
+    for i in range(n_images):
+        name = '{:05d}'.format(i)
+        os.link(src, osp.join(label_dir, name + '.bmp'))
+        shapes = []
+        for j in range(n_annots):
+            x, y = random_state.uniform(0, 120, 2)
+            shapes.append(dict(
+                label=labels[random_state.randint(len(labels))],
+                points=[[x, y], [x + 20, y], [x + 20, y + 20]],
+                group_id=int(random_state.randint(1, 10)),
+                shape_type='polygon',
+                flags={'Rework': bool(random_state.randint(2))},
+            ))
+        with open(osp.join(label_dir, name + '.json'), 'w') as f:
+            json.dump(dict(version='4.2.9', flags={}, shapes=shapes,
+                           imagePath=name + '.bmp', imageData=None,
+                           imageHeight=120, imageWidth=160), f)
+    return label_dir
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=5000)
+    parser.add_argument('--annots', type=int, default=10)
+    parser.add_argument('--max-workers', type=int, default=None)
+    parser.add_argument('--exports', action='store_true')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        label_dir = make_label_dir(tmp_dir, args.images, args.annots)
+        img_paths = sorted(
+            osp.join(label_dir, f) for f in os.listdir(label_dir)
+            if f.endswith('.bmp')
+        )
+        print('{} images, {} annotations'.format(
+            args.images, args.images * args.annots))
+
+        if not args.exports:
+            t_start = time.time()
+            report_before(label_dir, img_paths)
+            print('before:            {:.1f} s'.format(
+                time.time() - t_start))
+
+        mode = 'all' if args.exports else 'none'
+        kwargs = dict(
+            export_root=osp.join(tmp_dir, 'export'),
+            create_img_exports=mode, create_annot_exports=mode,
+            create_img_masks='none', create_annot_masks='none',
+        )
+        os.makedirs(kwargs['export_root'])
+        for max_workers in [0, args.max_workers]:
+            t_start = time.time()
+            rpt01_gen.generate_report(label_dir, max_workers=max_workers,
+                                      **kwargs)
+            print('after, {:11s} {:.1f} s'.format(
+                'no pool:' if max_workers == 0 else 'pool:',
+                time.time() - t_start))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Compare the memory of Shape points with the previous list of QPointF.
+
+Shape used to keep its points as a Python list of QPointF, i.e. a wrapper
+object and a C++ allocation per vertex plus an instance __dict__ per shape.
+Now the points are a (N, 2) float array and the attributes are slots.
+Resident memory is read from /proc (Linux); Python allocations are traced
+with tracemalloc, which does not see the C++ side of QPointF.
+
+    python benchmarks/bench_shape_memory.py --shapes 1000 --vertices 1000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+from qtpy import QtCore
+
+from labelme.shape import Shape
+
+
+class ShapeBefore(object):
+
+    def __init__(self, label=None):
+        self.label = label
+        self.group_id = None
+        self.points = []
+        self.fill = False
+        self.selected = False
+        self.shape_type = 'polygon'
+        self.flags = {}
+        self.other_data = {}
+        self._closed = False
+
+    def moveBy(self, offset):
+        self.points = [p + offset for p in self.points]
+
+
+def rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * 4096
+    except (IOError, OSError):
+        return 0
+
+
+def build(cls, coords):
+    shapes = []
+    for i, points in enumerate(coords):
+        shape = cls(label='class_{}'.format(i % 5))
+        if cls is Shape:
+            shape.points = points
+        else:
+            shape.points = [QtCore.QPointF(x, y) for x, y in points.tolist()]
+        shapes.append(shape)
+    return shapes
+
+
+def measure(cls, coords):
+    gc.collect()
+    rss_start = rss()
+    tracemalloc.start()
+    t_start = time.time()
+    shapes = build(cls, coords)
+    elapsed = time.time() - t_start
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    resident = rss() - rss_start
+
+    offset = QtCore.QPointF(1, 1)
+    t_start = time.time()
+    for shape in shapes:
+        shape.moveBy(offset)
+    move = time.time() - t_start
+    return shapes, elapsed, move, traced, resident
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shapes', type=int, default=1000)
+    parser.add_argument('--vertices', type=int, default=1000)
+    args = parser.parse_args()
+
+    random_state = np.random.RandomState(0)
+    coords = [
+        random_state.uniform(0, 5000, (args.vertices, 2))
+        for _ in range(args.shapes)
+    ]
+
+    # the new storage first, so that memory freed by it can only lower the
+    # resident memory measured for the list of QPointF
+    shapes, *after = measure(Shape, coords)
+    del shapes
+    shapes, *before = measure(ShapeBefore, coords)
+    del shapes
+
+    print('{} shapes x {} vertices = {} vertices'.format(
+        args.shapes, args.vertices, args.shapes * args.vertices))
+    for name, (elapsed, move, traced, resident) in [
+            ('before', before), ('after', after)]:
+        print('{:7} build {:.2f} s, moveBy {:.3f} s, '
+              'python {:.1f} MB, resident {:.1f} MB'.format(
+                  name + ':', elapsed, move,
+                  traced / 2 ** 20, resident / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Compare shapes_to_label with the previous full-frame implementation.
+
+The previous version rasterized every shape into a full-size mask and
+wrote it into the full-size label arrays, i.e. O(shapes x pixels).
+
+    python benchmarks/bench_shapes_to_label.py --shapes 500
+"""
+
+import argparse
+import time
+import uuid
+
+import numpy as np
+import PIL.Image
+import PIL.ImageDraw
+
+from labelme.utils import shape as shape_module
+
+
+def shape_to_mask_before(img_shape, points, shape_type=None,
+                         line_width=10, point_size=5):
+    mask = PIL.Image.fromarray(np.zeros(img_shape[:2], dtype=np.uint8))
+    draw = PIL.ImageDraw.Draw(mask)
+    xy = [tuple(point) for point in points]
+    shape_module._draw_shape(draw, xy, shape_type, line_width, point_size)
+    return np.array(mask, dtype=bool)
+
+
+def shapes_to_label_before(img_shape, shapes, label_name_to_value):
+    cls = np.zeros(img_shape[:2], dtype=np.int32)
+    ins = np.zeros_like(cls)
+    instances = []
+    for shape in shapes:
+        group_id = shape.get('group_id')
+        if group_id is None:
+            group_id = uuid.uuid1()
+        instance = (shape['label'], group_id)
+        if instance not in instances:
+            instances.append(instance)
+        ins_id = instances.index(instance) + 1
+        cls_id = label_name_to_value[shape['label']]
+        mask = shape_to_mask_before(
+            img_shape[:2], shape['points'], shape.get('shape_type')
+        )
+        cls[mask] = cls_id
+        ins[mask] = ins_id
+    return cls, ins
+
+
+def random_shapes(n_shapes, height, width, seed=0):
+    random_state = np.random.RandomState(seed)
+    shape_types = ['polygon', 'polygon', 'polygon', 'rectangle', 'circle',
+                   'linestrip', 'point']
+    n_points = dict(polygon=8, rectangle=2, circle=2, linestrip=4, point=1)
+    shapes = []
+    for i in range(n_shapes):
+        shape_type = shape_types[i % len(shape_types)]
+        center = random_state.uniform(0, [width, height])
+        radius = random_state.uniform(10, 150)
+        points = center + random_state.uniform(
+            -radius, radius, (n_points[shape_type], 2)
+        )
+        if shape_type == 'rectangle':
+            points = np.sort(points, axis=0)
+        shapes.append(dict(
+            label='class_{}'.format(i % 5),
+            points=points.tolist(),
+            shape_type=shape_type,
+            group_id=i // 3,
+        ))
+    return shapes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shapes', type=int, default=500)
+    parser.add_argument('--size', default='2000x1500', help='WIDTHxHEIGHT')
+    args = parser.parse_args()
+
+    width, height = [int(x) for x in args.size.split('x')]
+    shapes = random_shapes(args.shapes, height, width)
+    label_name_to_value = {'class_{}'.format(i): i + 1 for i in range(5)}
+    img_shape = (height, width, 3)
+
+    t_start = time.time()
+    cls1, ins1 = shapes_to_label_before(img_shape, shapes, label_name_to_value)
+    before = time.time() - t_start
+
+    t_start = time.time()
+    cls2, ins2 = shape_module.shapes_to_label(
+        img_shape, shapes, label_name_to_value
+    )
+    after = time.time() - t_start
+
+    assert np.array_equal(cls1, cls2)
+    assert np.array_equal(ins1, ins2)
+    print('{} shapes on {}x{}, results identical'
+          .format(args.shapes, width, height))
+    print('before: {:.3f} s'.format(before))
+    print('after:  {:.3f} s ({:.1f}x)'.format(after, before / after))
+
+
+if __name__ == '__main__':
+    main()
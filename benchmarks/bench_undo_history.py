@@ -0,0 +1,81 @@
+"""Compare the undo history with the previous deep-copy snapshots.
+
+Canvas.storeShapes used to deep-copy every shape after each edit and kept
+the last 10 snapshots, i.e. O(shapes x vertices) time and memory per edit.
+Times include the overhead of tracemalloc, which measures the memory.
+
+    python benchmarks/bench_undo_history.py --shapes 1000 --vertices 200
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from qtpy import QtCore
+
+from labelme.shape import Shape
+from labelme.shape_history import ShapeHistory
+
+
+def store_shapes_before(backups, shapes):
+    backup = [shape.copy() for shape in shapes]
+    if len(backups) >= 10:
+        backups[:] = backups[-9:]
+    backups.append(backup)
+
+
+def random_shapes(n_shapes, n_vertices, seed=0):
+    random_state = np.random.RandomState(seed)
+    shapes = []
+    for i in range(n_shapes):
+        points = random_state.uniform(0, 5000, (n_vertices, 2))
+        shape = Shape(label='class_{}'.format(i % 5))
+        shape.points = [QtCore.QPointF(x, y) for x, y in points]
+        shape.close()
+        shapes.append(shape)
+    return shapes
+
+
+def run(shapes, store, n_edits):
+    tracemalloc.start()
+    t_start = time.time()
+    for i in range(n_edits):
+        shapes[i % len(shapes)].moveVertexBy(0, QtCore.QPointF(1, 1))
+        store()
+    elapsed = (time.time() - t_start) / n_edits
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, memory
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shapes', type=int, default=1000)
+    parser.add_argument('--vertices', type=int, default=200)
+    parser.add_argument('--edits', type=int, default=10)
+    args = parser.parse_args()
+
+    shapes = random_shapes(args.shapes, args.vertices)
+    backups = []
+    before, mem_before = run(
+        shapes, lambda: store_shapes_before(backups, shapes), args.edits
+    )
+    backups[:] = []
+
+    history = ShapeHistory()
+    history.commit(shapes)
+    after, mem_after = run(
+        shapes, lambda: history.commit(shapes), args.edits
+    )
+
+    print('{} shapes x {} vertices, {} edits'
+          .format(args.shapes, args.vertices, args.edits))
+    print('before: {:.1f} ms / edit, {:.1f} MB for the last 10 edits'
+          .format(before * 1000, mem_before / 2 ** 20))
+    print('after:  {:.1f} ms / edit, {:.1f} MB for all {} edits'
+          .format(after * 1000, mem_after / 2 ** 20, len(history)))
+
+
+if __name__ == '__main__':
+    main()
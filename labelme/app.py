@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import collections
 import functools
+import itertools
 import os
 import os.path as osp
-import pathlib
 import re
+import threading
 import webbrowser
 import pandas as pd
 import numpy as np
@@ -21,12 +23,18 @@ from labelme import QT5
 
 from labelme import utils
 from labelme import user_extns
+from labelme.user_extns import mask_lib
 from labelme.config import get_config
+from labelme.dir_index import DirIndex
+from labelme.image_cache import ImageCache
 from labelme.label_file import LabelFile
+from labelme.lazy_image import open_lazy_image
 from labelme.label_file import LabelFileError
+from labelme.label_writer import LabelFileWriter
 from labelme.logger import logger
 from labelme.shape import Shape
 from labelme.widgets import Canvas
+from labelme.widgets import FileListWidget
 from labelme.widgets import LabelDialog
 from labelme.widgets import LabelListWidget
 from labelme.widgets import LabelListWidgetItem
@@ -134,6 +142,12 @@ class MainWindow(QtWidgets.QMainWindow):
 
     FIT_WINDOW, FIT_WIDTH, MANUAL_ZOOM = 0, 1, 2
 
+    dirIndexRefreshed = QtCore.Signal(str, bool)
+    labelFileSaved = QtCore.Signal(str, object)
+    featuresPredicted = QtCore.Signal(str, object, object)
+    autoAnnotateProgress = QtCore.Signal(int, int)
+    autoAnnotateFinished = QtCore.Signal(object)
+
     def __init__(
         self,
         config=None,
@@ -230,6 +244,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btnGetFeatures.clicked.connect(self.getFeatures)   
         #self.cursorPosition.setStyleSheet("font-weight: bold; color: red")
         automDockLayout.addWidget(self.btnGetFeatures)
+        self.btnAutoAnnotate = QtWidgets.QPushButton(
+            self.tr(u'Auto-annotate Directory'))
+        self.btnAutoAnnotate.setObjectName('autoAnnotate')
+        self.btnAutoAnnotate.clicked.connect(self.autoAnnotateDir)
+        automDockLayout.addWidget(self.btnAutoAnnotate)
         automWidget = QtWidgets.QWidget()
         automWidget.setLayout(automDockLayout)
         self.autom_dock.setWidget(automWidget)
@@ -263,7 +282,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.fileSearch = QtWidgets.QLineEdit()
         self.fileSearch.setPlaceholderText(self.tr('Search Filename'))
         self.fileSearch.textChanged.connect(self.fileSearchChanged)
-        self.fileListWidget = QtWidgets.QListWidget()
+        self.fileListWidget = FileListWidget()
         self.fileListWidget.itemSelectionChanged.connect(
             self.fileSelectionChanged
         )
@@ -276,7 +295,7 @@ class MainWindow(QtWidgets.QMainWindow):
         fileListCtrlsLayout = QtWidgets.QHBoxLayout()
         self.showLabeledCheckbox = QtWidgets.QCheckBox('Show Labeled')
         fileListCtrlsLayout.addWidget(self.showLabeledCheckbox)
-        self.showLabeledCheckbox.stateChanged.connect(self.refreshDirImages)        
+        self.showLabeledCheckbox.stateChanged.connect(self.filterFileList)        
         
         self.btnExportData = QtWidgets.QPushButton('Export')
         self.btnExportData.setObjectName('exportData')
@@ -352,6 +371,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self.canvas = self.labelList.canvas = Canvas(
             epsilon=self._config['epsilon'],
             double_click=self._config['canvas']['double_click'],
+            tile_pyramid_megapixels=self._config['canvas'][
+                'tile_pyramid_megapixels'],
+            tile_cache_mb=self._config['canvas']['tile_cache_mb'],
+            undo_memory_mb=self._config['canvas']['undo_memory_mb'],
         )
         self.canvas.zoomRequest.connect(self.zoomRequest)
 
@@ -609,6 +632,10 @@ class MainWindow(QtWidgets.QMainWindow):
                       shortcuts['undo'], 'undo',
                       self.tr('Undo last add and edit of shape'),
                       enabled=False)
+        redo = action(self.tr('Redo'), self.redoShapeEdit,
+                      shortcuts['redo'], None,
+                      self.tr('Redo last undone add and edit of shape'),
+                      enabled=False)
 
         hideAll = action(self.tr('&Hide\nPolygons'),
                          functools.partial(self.togglePolygons, False),
@@ -713,7 +740,7 @@ class MainWindow(QtWidgets.QMainWindow):
             verifyFile=verifyFile,
             toggleKeepPrevMode=toggle_keep_prev_mode,
             delete=delete, edit=edit, copy=copy,
-            undoLastPoint=undoLastPoint, undo=undo,
+            undoLastPoint=undoLastPoint, undo=undo, redo=redo,
             addPointToEdge=addPointToEdge, removePoint=removePoint,
             createMode=createMode, editMode=editMode,
             createRectangleMode=createRectangleMode,
@@ -734,6 +761,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 delete,
                 None,
                 undo,
+                redo,
                 undoLastPoint,
                 None,
                 addPointToEdge,
@@ -753,6 +781,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 copy,
                 delete,
                 undo,
+                redo,
                 undoLastPoint,
                 addPointToEdge,
                 removePoint,
@@ -886,6 +915,9 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         #self.statusBar().showMessage(self.tr('%s started.') % __appname__)
+        self.pendingWritesLabel = QtWidgets.QLabel()
+        self.pendingWritesLabel.hide()
+        self.statusBar().addPermanentWidget(self.pendingWritesLabel)
         self.statusBar().show()
         self.status(self.tr('%s started.') % __appname__, delay=0)
 
@@ -906,6 +938,17 @@ class MainWindow(QtWidgets.QMainWindow):
         # Application state.
         self.image = QtGui.QImage()
         self.imagePath = None
+        self.imageCache = ImageCache(
+            self.readImage,
+            stamp=self.imageStamp,
+            max_bytes=self._config['image_cache']['max_mb'] * 2 ** 20,
+        )
+        self.dirIndex = DirIndex()
+        self._dirIndexJobs = set()
+        self.dirIndexRefreshed.connect(self.dirIndexRefreshedEvent)
+        self.labelWriter = LabelFileWriter(done=self.labelFileSaved.emit)
+        self.labelFileSaved.connect(self.labelFileSavedEvent)
+        self._savedImagePaths = {}  # label file: image path, being written
         self.recentFiles = []
         self.maxRecent = 7
         self.otherData = None
@@ -922,6 +965,17 @@ class MainWindow(QtWidgets.QMainWindow):
         dfAllImages = pd.DataFrame(columns=['Image Folder', 'File Name', 'Ground Truth Group', 'Is Ground Truth'])
         dfAllImages.index.name = 'Image Path'
         self.dfAllImages = dfAllImages
+        self.groundTruthImages = None
+        # image: [(image, folder)] of the other annotators in its group
+        self.annotatorImages = {}
+        # (all_images, dfAllImages, groundTruthImages, annotatorImages)
+        self._groundTruthIndex = None
+        self.annotatorCache = ImageCache(
+            self.readAnnotatorFile,
+            stamp=self.fileStamp,
+            max_bytes=self._config['annotator_cache']['max_mb'] * 2 ** 20,
+            max_workers=self._config['annotator_cache']['max_workers'],
+        )
         gt_grp_transforms = []
         # TODO Get from config file
         gt_grp_transforms.append(lambda x:x[4:] if len(x) > 4 and x[3] == '-' and x[:2].isnumeric() else x)
@@ -971,7 +1025,27 @@ class MainWindow(QtWidgets.QMainWindow):
         self.mouse_timer.start(100)
         
         # Settings for ML
-        self.ipm = user_extns.ImgPredMgr()
+        prediction = self._config['prediction']
+        if prediction['backend'] == 'onnx':
+            backend = user_extns.OnnxBackend(prediction['model_path'])
+        else:
+            backend = user_extns.RemoteBackend(
+                endpoint=prediction['endpoint'],
+                payload=prediction['payload'],
+                timeout=prediction['timeout'],
+            )
+        self.ipm = user_extns.ImgPredMgr(
+            backend=backend, batch_size=prediction['batch_size'],
+        )
+        if prediction['backend'] == 'onnx':
+            self.ipm.warmup()
+        self.featuresPredicted.connect(self.featuresPredictedEvent)
+        self._autoAnnotateCancel = None  # threading.Event of the running job
+        # images loaded while the job runs, which it must not write
+        self._autoAnnotateLock = threading.Lock()
+        self._autoAnnotateExclude = set()
+        self.autoAnnotateProgress.connect(self.autoAnnotateProgressEvent)
+        self.autoAnnotateFinished.connect(self.autoAnnotateFinishedEvent)
         if not self.ipm.cred_set:
             # TODO Get from config file
             cred_path = r'c:\tmp\work1\Tissue Defect UI-ML Svc Acct.json'
@@ -1067,6 +1141,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.dirty = True
         self.actions.save.setEnabled(True)
         self.actions.undo.setEnabled(self.canvas.isShapeRestorable)
+        self.actions.redo.setEnabled(self.canvas.isShapeRedoable)
         title = __appname__
         if self.filename is not None:
             title = '{} - {}*'.format(title, self.filename)
@@ -1154,9 +1229,9 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def getFileDockTitle(self):
         base_title = self.tr(u'File List')
-        if not self.imageList:
+        if not self.fileListWidget.count():
             return base_title
-        return f'{base_title} - # files: {len(self.imageList)}'
+        return f'{base_title} - # files: {self.fileListWidget.count()}'
 
     def setFileDockTitle(self):
         self.file_dock.setWindowTitle(self.getFileDockTitle())
@@ -1169,6 +1244,14 @@ class MainWindow(QtWidgets.QMainWindow):
         self.labelList.clear()
         self.loadShapes(self.canvas.shapes)
         self.actions.undo.setEnabled(self.canvas.isShapeRestorable)
+        self.actions.redo.setEnabled(self.canvas.isShapeRedoable)
+
+    def redoShapeEdit(self):
+        self.canvas.redoShape()
+        self.labelList.clear()
+        self.loadShapes(self.canvas.shapes)
+        self.actions.undo.setEnabled(self.canvas.isShapeRestorable)
+        self.actions.redo.setEnabled(self.canvas.isShapeRedoable)
 
     def tutorial(self):
         url = 'https://github.com/wkentaro/labelme/tree/master/examples/tutorial'  # NOQA
@@ -1182,6 +1265,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.actions.editMode.setEnabled(not drawing)
         self.actions.undoLastPoint.setEnabled(drawing)
         self.actions.undo.setEnabled(not drawing)
+        self.actions.redo.setEnabled(
+            not drawing and self.canvas.isShapeRedoable)
         self.actions.delete.setEnabled(not drawing)
 
     def toggleDrawMode(self, edit=True, createMode='polygon'):
@@ -1321,27 +1406,20 @@ class MainWindow(QtWidgets.QMainWindow):
             self.uniqLabelList.addItem(item)
 
     def fileSearchChanged(self):
-        self.importDirImages(
-            self.lastOpenDir,
-            pattern=self.fileSearch.text(),
-            load=False,
-        )
+        self.filterFileList()
 
     def fileSelectionChanged(self):
-        items = self.fileListWidget.selectedItems()
-        if not items:
+        filenames = self.fileListWidget.selectedPaths()
+        if not filenames:
             return
-        item = items[0]
+        filename = filenames[0]
 
         if not self.mayContinue():
             return
 
-        currIndex = self.imageList.index(str(item.text()))
-        if currIndex < len(self.imageList):
-            filename = self.imageList[currIndex]
-            if filename:
-                self.loadFile(filename)
-                #cProfile.runctx(fr'self.loadFile(r"{filename}")',globals(),locals(), filename=r'c:\tmp\profile.txt')
+        if filename:
+            self.loadFile(filename)
+            #cProfile.runctx(fr'self.loadFile(r"{filename}")',globals(),locals(), filename=r'c:\tmp\profile.txt')
 
     # React to canvas signals.
     def shapeSelectionChanged(self, selected_shapes):
@@ -1473,8 +1551,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 group_id=group_id,
                 locked=locked,
             )
-            for x, y in points:
-                shape.addPoint(QtCore.QPointF(x, y))
+            shape.addPoints(points)
             shape.close()
 
             # TODO Code duplicated with getFeatures()
@@ -1505,16 +1582,21 @@ class MainWindow(QtWidgets.QMainWindow):
             self.flag_widget.addItem(item)
 
     def saveLabels(self, filename):
+        """Snapshot the labels and queue them to be written to filename.
+
+        The file is written on the label writer's thread, see
+        labelFileSavedEvent() for errors.
+        """
         lf = LabelFile()
 
         def format_shape(s):
             data = s.other_data.copy()
             data.update(dict(
                 label=s.label.encode('utf-8') if PY2 else s.label,
-                points=[(p.x(), p.y()) for p in s.points],
+                points=s.pointsArray().tolist(),
                 group_id=s.group_id,
                 shape_type=s.shape_type,
-                flags=s.flags,
+                flags=None if s.flags is None else dict(s.flags),
             ))
             return data
 
@@ -1530,39 +1612,56 @@ class MainWindow(QtWidgets.QMainWindow):
             key = item.text()
             flag = item.checkState() == Qt.Checked
             flags[key] = flag
-        try:
-            imagePath = osp.relpath(
-                self.imagePath, osp.dirname(filename))
-            imageData = self.imageData if self._config['store_data'] else None
-            if osp.dirname(filename) and not osp.exists(osp.dirname(filename)):
-                os.makedirs(osp.dirname(filename))
-            lf.save(
-                filename=filename,
-                shapes=shapes,
-                imagePath=imagePath,
-                imageData=imageData,
-                imageHeight=self.image.height(),
-                imageWidth=self.image.width(),
-                otherData=self.otherData,
-                flags=flags,
-            )
-            self.labelFile = lf
-            items = self.fileListWidget.findItems(
-                self.imagePath, Qt.MatchExactly
-            )
-            if len(items) > 0:
-                if len(items) != 1:
-                    raise RuntimeError('There are duplicate files.')
-                items[0].setCheckState(Qt.Checked)
-            # disable allows next and previous image to proceed
-            # self.filename = filename
-            return True
-        except LabelFileError as e:
-            self.errorMessage(
-                self.tr('Error saving label data'),
-                self.tr('<b>%s</b>') % e
-            )
-            return False
+        imagePath = osp.relpath(
+            self.imagePath, osp.dirname(filename))
+        imageData = self.imageData if self._config['store_data'] else None
+        self.labelWriter.save(
+            lf,
+            filename,
+            shapes=shapes,
+            imagePath=imagePath,
+            imageData=imageData,
+            imageHeight=self.image.height(),
+            imageWidth=self.image.width(),
+            otherData=dict(self.otherData or {}),
+            flags=flags,
+            compact=self._config['compact_json'],
+        )
+        lf.filename = filename
+        self.labelFile = lf
+        self._savedImagePaths[filename] = self.imagePath
+        self.updatePendingWrites()
+        # disable allows next and previous image to proceed
+        # self.filename = filename
+        return True
+
+    def labelFileSavedEvent(self, filename, error):
+        self.updatePendingWrites()
+        if self.labelWriter.pending(filename):
+            image_path = self._savedImagePaths.get(filename)
+        else:
+            image_path = self._savedImagePaths.pop(filename, None)
+        if error is None:
+            # only now is the file on disk
+            self.dirIndex.add(filename)
+            if image_path is not None:
+                self.fileListWidget.setLabeled(image_path)
+            return
+        if self.labelFile is not None and \
+                self.labelFile.filename == filename:
+            self.dirty = True
+            self.actions.save.setEnabled(True)
+        self.errorMessage(
+            self.tr('Error saving label data'),
+            self.tr('<b>%s</b>') % error
+        )
+
+    def updatePendingWrites(self):
+        pending = self.labelWriter.pending()
+        if pending:
+            self.pendingWritesLabel.setText(
+                self.tr('Saving %d label file(s)...') % pending)
+        self.pendingWritesLabel.setVisible(bool(pending))
 
     def copySelectedShape(self):
         added_shapes = self.canvas.copySelectedShapes()
@@ -1636,7 +1735,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.setDirty()
         else:
             self.canvas.undoLastLine()
-            self.canvas.shapesBackups.pop()
+            self.canvas.dropLastStoredShapes()
 
     def scrollRequest(self, delta, orientation):
         units = - delta * 0.1  # natural scroll
@@ -1700,10 +1799,9 @@ class MainWindow(QtWidgets.QMainWindow):
     def loadFile(self, filename=None):
         """Load the specified file, or the last opened file if None."""
         # changing fileListWidget loads file
-        if (filename in self.imageList and
-                self.fileListWidget.currentRow() !=
-                self.imageList.index(filename)):
-            self.fileListWidget.setCurrentRow(self.imageList.index(filename))
+        row = self.fileListWidget.findRow(filename)
+        if row >= 0 and self.fileListWidget.currentRow() != row:
+            self.fileListWidget.setCurrentRow(row)
             self.fileListWidget.repaint()
             return
 
@@ -1721,10 +1819,25 @@ class MainWindow(QtWidgets.QMainWindow):
         # assumes same name, but json extension
         self.status(self.tr("Loading %s...") % osp.basename(str(filename)))
         label_file = user_extns.imgFileToLabelFileName(filename, self.output_dir)
+        if self._autoAnnotateCancel is not None:
+            # waits if the job is writing this label file, and keeps it
+            # from writing it afterwards
+            with self._autoAnnotateLock:
+                self._autoAnnotateExclude.add(filename)
+        self.labelWriter.wait(label_file)
+        cached = self.imageCache.get(filename)
+        lazy_image = None
+        if cached is None:
+            lazy_image = open_lazy_image(
+                filename, self._config['canvas']['lazy_image_megapixels']
+            )
         if QtCore.QFile.exists(label_file) and \
                 LabelFile.is_label_file(label_file):
             try:
-                self.labelFile = LabelFile(label_file)
+                self.labelFile = LabelFile(
+                    label_file,
+                    loadImage=cached is None and lazy_image is None,
+                )
             except LabelFileError as e:
                 self.errorMessage(
                     self.tr('Error opening file'),
@@ -1742,11 +1855,22 @@ class MainWindow(QtWidgets.QMainWindow):
             )
             self.otherData = self.labelFile.otherData
         else:
-            self.imageData = LabelFile.load_image_file(filename)
-            if self.imageData:
+            if lazy_image is not None:
+                self.imageData = None
+            elif cached is None:
+                self.imageData = LabelFile.load_image_file(filename)
+            else:
+                self.imageData = cached[0]
+            if self.imageData or lazy_image is not None:
                 self.imagePath = filename
             self.labelFile = None
-        image = QtGui.QImage.fromData(self.imageData)
+        if lazy_image is not None:
+            # decoded by the canvas, one visible tile at a time
+            image = lazy_image
+        elif cached is None:
+            image = QtGui.QImage.fromData(self.imageData)
+        else:
+            self.imageData, image = cached
 
         if image.isNull():
             formats = ['*.{}'.format(fmt.data().decode())
@@ -1760,11 +1884,17 @@ class MainWindow(QtWidgets.QMainWindow):
             )
             self.status(self.tr("Error reading %s") % filename)
             return False
+        if cached is None and lazy_image is None:
+            self.imageCache.put(filename, (self.imageData, image),
+                                self.imageSize(self.imageData, image))
         self.image = image
         self.filename = filename
         if self._config['keep_prev']:
             prev_shapes = self.canvas.shapes
-        self.canvas.loadPixmap(QtGui.QPixmap.fromImage(image))
+        if lazy_image is not None:
+            self.canvas.loadPixmap(lazy_image)
+        else:
+            self.canvas.loadPixmap(QtGui.QPixmap.fromImage(image), image)
         flags = {k: False for k in self._config['flags'] or []}
         shapes = []
         if self.labelFile:
@@ -1780,14 +1910,20 @@ class MainWindow(QtWidgets.QMainWindow):
                 s['opacity'] = self.groundTruthOpacity
                 s['locked'] = False
                 s['disp_label'] = self.getShapeDisplayLabel(s)
-            gt_grp = self.dfAllImages['Ground Truth Group'].loc[filename]
-            addl_files = self.dfAllImages[(self.dfAllImages['Ground Truth Group'] == gt_grp)
-                                           & (~self.dfAllImages['Is Ground Truth'])].index
-            for filename_addl in addl_files:
-                label_file_addl = user_extns.imgFileToLabelFileName(filename_addl, self.output_dir)
-                labelFile_addl = None
-                if QtCore.QFile.exists(label_file_addl) and \
+            annotators = self.annotatorImages.get(filename, [])
+            label_files = [
+                user_extns.imgFileToLabelFileName(f, self.output_dir)
+                for f, _ in annotators
+            ]
+            # read concurrently, or not at all if cached and unchanged
+            self.annotatorCache.prefetch(label_files)
+            for (_, folder), label_file_addl in zip(annotators, label_files):
+                labelFile_addl = self.annotatorCache.get(label_file_addl)
+                if labelFile_addl is None and \
+                        QtCore.QFile.exists(label_file_addl) and \
                         LabelFile.is_label_file(label_file_addl):
+                    # failed on the worker (stale entries are reloaded by
+                    # prefetch), read it again for the error
                     try:
                         labelFile_addl = LabelFile(label_file_addl, loadImage=False)
                     except LabelFileError as e:
@@ -1802,7 +1938,9 @@ class MainWindow(QtWidgets.QMainWindow):
                         return False
                 if labelFile_addl:
                     for s in labelFile_addl.shapes:
-                        s['source'] = self.dfAllImages['Image Folder'].loc[filename_addl]
+                        # the cached shapes are shared, so copy them
+                        s = dict(s, other_data=dict(s['other_data']))
+                        s['source'] = folder
                         s['opacity'] = self.groundTruthOpacityOther
                         s['locked'] = True
                         s['disp_label'] = self.getShapeDisplayLabel(s)
@@ -1835,8 +1973,81 @@ class MainWindow(QtWidgets.QMainWindow):
         self.addRecentFile(self.filename)
         self.toggleActions(True)
         self.status(self.tr("Loaded %s") % osp.basename(str(filename)))
+        self.prefetchImages()
         return True
 
+    def imageStamp(self, filename):
+        label_file = user_extns.imgFileToLabelFileName(filename,
+                                                       self.output_dir)
+        return self.fileStamp(filename), self.fileStamp(label_file)
+
+    @staticmethod
+    def fileStamp(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime, st.st_size
+
+    @staticmethod
+    def readAnnotatorFile(label_file):
+        """Read the label file of another annotator, for annotatorCache.
+
+        Runs on the cache's worker threads, so no widgets here.
+        """
+        if not LabelFile.is_label_file(label_file) or \
+                not osp.exists(label_file):
+            return None
+        labelFile = LabelFile(label_file, loadImage=False)
+        # rough size of the parsed shapes
+        return labelFile, 4 * os.path.getsize(label_file)
+
+    @staticmethod
+    def imageSize(imageData, image):
+        return len(imageData) + image.bytesPerLine() * image.height()
+
+    def readImage(self, filename):
+        """Read and decode an image the same way loadFile does.
+
+        Runs on the image cache's worker threads, so no widgets here.
+        """
+        if open_lazy_image(
+                filename, self._config['canvas']['lazy_image_megapixels']
+        ) is not None:
+            return None  # loadFile decodes it by region instead
+        label_file = user_extns.imgFileToLabelFileName(filename,
+                                                       self.output_dir)
+        if osp.exists(label_file) and LabelFile.is_label_file(label_file):
+            imageData = LabelFile(label_file).imageData
+        else:
+            imageData = LabelFile.load_image_file(filename)
+        if not imageData:
+            return None
+        image = QtGui.QImage.fromData(imageData)
+        if image.isNull():
+            return None
+        return (imageData, image), self.imageSize(imageData, image)
+
+    def prefetchImages(self):
+        """Decode the neighbours of the current image in the background."""
+        row = self.fileListWidget.findRow(self.filename)
+        if row < 0:
+            return
+        n_next = self._config['image_cache']['prefetch_next']
+        n_prev = self._config['image_cache']['prefetch_prev']
+        rows = list(range(row + 1,
+                          min(row + 1 + n_next, self.fileListWidget.count())))
+        rows += list(range(row - 1, max(row - 1 - n_prev, -1), -1))
+        paths = [self.fileListWidget.path(r) for r in rows]
+        self.imageCache.prefetch(paths)
+        if self.isGroundTruthBuilderMode:
+            self.annotatorCache.prefetch([
+                user_extns.imgFileToLabelFileName(f, self.output_dir)
+                for path in [self.filename] + paths
+                for f, _ in self.annotatorImages.get(path, [])
+            ])
+        logger.debug('Image cache: {}'.format(self.imageCache.stats()))
+
     def resizeEvent(self, event):
         if self.canvas and not self.image.isNull()\
            and self.zoomMode != self.MANUAL_ZOOM:
@@ -1879,6 +2090,13 @@ class MainWindow(QtWidgets.QMainWindow):
     def closeEvent(self, event):
         if not self.mayContinue():
             event.ignore()
+        else:
+            self.imageCache.shutdown()
+            self.annotatorCache.shutdown()
+            self.labelWriter.shutdown()
+            if self._autoAnnotateCancel is not None:
+                self._autoAnnotateCancel.set()
+            self.ipm.shutdown()
         self.settings.setValue(
             'filename', self.filename if self.filename else '')
         self.settings.setValue('window/size', self.size())
@@ -1902,15 +2120,15 @@ class MainWindow(QtWidgets.QMainWindow):
         if not self.mayContinue():
             return
 
-        if len(self.imageList) <= 0:
+        if self.fileListWidget.count() <= 0:
             return
 
         if self.filename is None:
             return
 
-        currIndex = self.imageList.index(self.filename)
+        currIndex = self.fileListWidget.findRow(self.filename)
         if currIndex - 1 >= 0:
-            filename = self.imageList[currIndex - 1]
+            filename = self.fileListWidget.path(currIndex - 1)
             if filename:
                 self.loadFile(filename)
 
@@ -1924,18 +2142,19 @@ class MainWindow(QtWidgets.QMainWindow):
         if not self.mayContinue():
             return
 
-        if len(self.imageList) <= 0:
+        count = self.fileListWidget.count()
+        if count <= 0:
             return
 
         filename = None
         if self.filename is None:
-            filename = self.imageList[0]
+            filename = self.fileListWidget.path(0)
         else:
-            currIndex = self.imageList.index(self.filename)
-            if currIndex + 1 < len(self.imageList):
-                filename = self.imageList[currIndex + 1]
+            currIndex = self.fileListWidget.findRow(self.filename)
+            if currIndex + 1 < count:
+                filename = self.fileListWidget.path(currIndex + 1)
             else:
-                filename = self.imageList[-1]
+                filename = self.fileListWidget.path(count - 1)
         self.filename = filename
 
         if self.filename and load:
@@ -1988,10 +2207,10 @@ class MainWindow(QtWidgets.QMainWindow):
         current_filename = self.filename
         self.importDirImages(self.lastOpenDir, load=False)
 
-        if current_filename in self.imageList:
+        row = self.fileListWidget.findRow(current_filename)
+        if row >= 0:
             # retain currently selected file
-            self.fileListWidget.setCurrentRow(
-                self.imageList.index(current_filename))
+            self.fileListWidget.setCurrentRow(row)
             self.fileListWidget.repaint()
 
     def saveFile(self, _value=False, verify=False):
@@ -2077,12 +2296,13 @@ class MainWindow(QtWidgets.QMainWindow):
             return
 
         label_file = self.getLabelFile()
+        self.labelWriter.wait(label_file)
         if osp.exists(label_file):
             os.remove(label_file)
+            self.dirIndex.discard(label_file)
             logger.info('Label file is removed: {}'.format(label_file))
 
-            item = self.fileListWidget.currentItem()
-            item.setCheckState(Qt.Unchecked)
+            self.fileListWidget.setLabeled(self.filename, False)
 
             self.resetState()
             
@@ -2175,6 +2395,8 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QFileDialog.ShowDirsOnly |
             QtWidgets.QFileDialog.DontResolveSymlinks))
         self.importDirImages(targetDirPath)
+        if targetDirPath:
+            self.refreshDirIndex(targetDirPath)
 
     def refreshDirImages(self):
         #print(f'dirpath={dirpath}.  showLabeledCheckbox.isChecked()={self.showLabeledCheckbox.isChecked()}')
@@ -2182,23 +2404,21 @@ class MainWindow(QtWidgets.QMainWindow):
 
     @property
     def imageList(self):
-        lst = []
-        for i in range(self.fileListWidget.count()):
-            item = self.fileListWidget.item(i)
-            lst.append(item.text())
-        return lst
+        return self.fileListWidget.paths()
 
-    # TODO If self.scanAllImages takes too long, only perform this if needed.  E.g. if filtering, or switching GroundTruthMode, not needed.
-    def importDirImages(self, dirpath, pattern=None, load=True, all_images=None):
-        
-        def parse_img_path(file_path):
-            parts = pathlib.Path(file_path).parts
-            file_path = parts[-1]
-            gt_grp = file_path
-            for fn in self.gt_grp_transforms:
-                gt_grp = fn(gt_grp)
-            return [parts[-2], file_path, gt_grp] 
+    def filterFileList(self):
+        if not self.mayContinue():
+            return
+        self.fileListWidget.setFilter(
+            pattern=self.fileSearch.text(),
+            showLabeled=self.showLabeledCheckbox.isChecked(),
+            paths=self.groundTruthImages,
+        )
+        self.filename = None
+        self.openNextImg(load=False)
+        self.setFileDockTitle()
 
+    def importDirImages(self, dirpath, pattern=None, load=True, all_images=None):
         self.actions.openNextImg.setEnabled(True)
         self.actions.openPrevImg.setEnabled(True)
 
@@ -2207,55 +2427,139 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.lastOpenDir = dirpath
         self.filename = None
-        self.fileListWidget.clear()
         if all_images is None:
             all_images = self.scanAllImages(dirpath)
+        self.populateFileList(all_images, pattern=pattern)
+        self.openNextImg(load=load)
+        self.setFileDockTitle()
+
+    def populateFileList(self, all_images, pattern=None):
+        if self.output_dir:
+            self.indexDir(self.output_dir)
         if self.isGroundTruthBuilderMode:
-            self.dfAllImages.drop(self.dfAllImages.index, inplace=True)
-            df = self.dfAllImages
-            #TODO Find more elegant way of setting index before adding data
-            df['Image Folder'] = [None for i in range(len(all_images))]
-            df.index = all_images
-            # row.name in the apply function below is the index of the row being processed
-            df[['Image Folder','File Name', 'Ground Truth Group']] = df.apply(lambda row:parse_img_path(row.name), 
-                                                        axis = 1, result_type = 'expand')
-            df['Is Ground Truth'] = df['Image Folder'].str.upper() == self.groundTruthDirName.upper()
-            self.dfAllImages = df
+            self.indexGroundTruth(all_images)
+        else:
+            self.groundTruthImages = None
+            self.annotatorImages = {}
+        labeled = []
         for filename in all_images:
-            if pattern and pattern not in filename:
-                continue
             # TODO:  Support XML and other label file formats
             label_file = user_extns.imgFileToLabelFileName(filename, self.output_dir)
-            good_label_file = QtCore.QFile.exists(label_file) and \
-                    LabelFile.is_label_file(label_file)
-            if not self.showLabeledCheckbox.isChecked() and good_label_file:
-                continue
-            if self.isGroundTruthBuilderMode:
-                if not self.dfAllImages['Is Ground Truth'].loc[filename]:
-                    continue
-            item = QtWidgets.QListWidgetItem(filename)
-            item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            if good_label_file:
-                item.setCheckState(Qt.Checked)
-            else:
-                item.setCheckState(Qt.Unchecked)
-            self.fileListWidget.addItem(item)
-        self.openNextImg(load=load)
-        self.setFileDockTitle()
+            labeled.append(self.dirIndex.exists(label_file) and
+                           LabelFile.is_label_file(label_file))
+        self.fileListWidget.setFiles(all_images, labeled)
+        self.fileListWidget.setFilter(
+            pattern=pattern,
+            showLabeled=self.showLabeledCheckbox.isChecked(),
+            paths=self.groundTruthImages,
+        )
+
+    def indexGroundTruth(self, all_images):
+        """Group all_images by ground truth group, once per list of images.
+
+        Sets dfAllImages, groundTruthImages and annotatorImages, reusing
+        the previous result while the images are unchanged.  The folder
+        and file name are split with vectorized string operations and
+        gt_grp_transforms is applied once per distinct file name.
+        """
+        index = self._groundTruthIndex
+        if index is None or index[0] != all_images:
+            index = self._groundTruthIndex = \
+                (list(all_images),) + self._indexGroundTruth(all_images)
+        _, self.dfAllImages, self.groundTruthImages, self.annotatorImages = \
+            index
+
+    def _indexGroundTruth(self, all_images):
+        df = pd.DataFrame(index=pd.Index(all_images, name='Image Path',
+                                         dtype=object))
+        seps = re.escape(os.sep + (os.altsep or ''))
+        parts = df.index.to_series().str.extract(
+            r'(?:^|[{0}])([^{0}]*)[{0}]+([^{0}]*)$'.format(seps)
+        )
+        df['Image Folder'] = parts[0]
+        df['File Name'] = parts[1]
+        df['Ground Truth Group'] = df['File Name'].map(
+            {name: self.groundTruthGroup(name)
+             for name in df['File Name'].unique()}
+        )
+        df['Is Ground Truth'] = \
+            df['Image Folder'].str.upper() == self.groundTruthDirName.upper()
+        groups = collections.defaultdict(list)
+        others = df[~df['Is Ground Truth']]
+        for path, folder, gt_grp in zip(others.index,
+                                        others['Image Folder'],
+                                        others['Ground Truth Group']):
+            groups[gt_grp].append((path, folder))
+        annotator_images = {
+            path: groups.get(gt_grp, [])
+            for path, gt_grp in df['Ground Truth Group'].items()
+        }
+        return df, set(df.index[df['Is Ground Truth']]), annotator_images
+
+    def groundTruthGroup(self, name):
+        for fn in self.gt_grp_transforms:
+            name = fn(name)
+        return name
 
     def scanAllImages(self, folderPath):
-        extensions = ['.%s' % fmt.data().decode("ascii").lower()
-                      for fmt in QtGui.QImageReader.supportedImageFormats()]
-        images = []
-
-        for root, dirs, files in os.walk(folderPath):
-            for file in files:
-                if file.lower().endswith(tuple(extensions)):
-                    relativePath = osp.join(root, file)
-                    images.append(relativePath)
+        extensions = tuple(
+            '.%s' % fmt.data().decode("ascii").lower()
+            for fmt in QtGui.QImageReader.supportedImageFormats()
+        )
+        self.indexDir(folderPath)
+        images = [f for f in self.dirIndex.files(folderPath)
+                  if f.lower().endswith(extensions)]
         images.sort(key=lambda x: x.lower())
         return images
 
+    def indexDir(self, dirpath):
+        """Make sure dirpath is in the directory index.
+
+        A directory that was never indexed is scanned right away. One that
+        is already in the index database is used as is and rescanned in
+        the background.
+        """
+        if dirpath in self.dirIndex:
+            return
+        if self.dirIndex.load(dirpath):
+            self.refreshDirIndex(dirpath)
+        else:
+            self.status(self.tr('Indexing %s...') % dirpath)
+            self.dirIndex.refresh(dirpath)
+
+    def refreshDirIndex(self, dirpath):
+        if dirpath in self._dirIndexJobs:
+            return
+        self._dirIndexJobs.add(dirpath)
+
+        def refresh():
+            try:
+                changed = self.dirIndex.refresh(dirpath)
+            except Exception as e:
+                logger.error('Failed to index {}: {}'.format(dirpath, e))
+                changed = False
+            self.dirIndexRefreshed.emit(dirpath, changed)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def dirIndexRefreshedEvent(self, dirpath, changed):
+        self._dirIndexJobs.discard(dirpath)
+        if not changed or not self.lastOpenDir or \
+                dirpath not in [self.lastOpenDir, self.output_dir]:
+            return
+        # Update the list in place: unlike importDirImages this must not
+        # prompt for unsaved changes or switch the current image.
+        self.populateFileList(
+            self.scanAllImages(self.lastOpenDir),
+            pattern=self.fileSearch.text(),
+        )
+        row = self.fileListWidget.findRow(self.filename)
+        if row >= 0:
+            self.fileListWidget.blockSignals(True)
+            self.fileListWidget.setCurrentRow(row)
+            self.fileListWidget.blockSignals(False)
+        self.setFileDockTitle()
+
     # This routine is related to user_extns.exportAnnotationsForImage, but it is not the same:
     # The user could have unsaved annotations when they choose export
     def exportMasks(self):
@@ -2266,42 +2570,14 @@ class MainWindow(QtWidgets.QMainWindow):
             msg = 'No images exported'
             self.status(msg, print_msg=True)
             return
-        labels_to_export = set([shape['label'] for shape in self.labelFile.shapes])
-        print(f'labels_to_export={labels_to_export}')
-        for label in labels_to_export:
-            shapes_to_export = [s for s in self.labelFile.shapes if s['label'] == label]
-            print(f'shapes_to_export={shapes_to_export}')
-            #self.loadLabels(shapes_to_export)
-            # Manually draw shapes - can't seem to get a bitmap from Qt
-			
-            overlay_over_image = False
-            if overlay_over_image:
-                pixmap = self.canvas.pixmap.copy() #QtGui.QPixmap()
-            else:
-                cur_pixmap_size = self.canvas.pixmap.size()
-                pixmap = QtGui.QPixmap(cur_pixmap_size.width(), cur_pixmap_size.height())
-            p = QtGui.QPainter(pixmap)
-            for s in shapes_to_export:
-                s_obj = Shape(label=s['label'], shape_type=s['shape_type'],
-                 flags=s['flags'], group_id=s['group_id'])
-                for pt in s['points']:
-                    s_obj.addPoint(QtCore.QPointF(pt[0],pt[1]))
-                s_obj.close = True
-                s_obj.fill = True
-                s_obj.point_size = 0
-                s_obj.paint(p)
-            p.end()
-            img_to_export = pixmap.toImage()
-            img_to_export.convertTo(QtGui.QImage.Format_Indexed8)
-            basename = osp.basename(self.labelFile.filename)
-            basename = osp.splitext(basename)[0]
+        img_shape = (self.image.height(), self.image.width())
+        masks = mask_lib.label_masks(img_shape, self.labelFile.shapes)
+        print(f'labels_to_export={set(masks)}')
+        basename = osp.basename(self.labelFile.filename)
+        basename = osp.splitext(basename)[0]
+        for label, mask in masks.items():
             targ_file = osp.join(targ_dir_and_prefix,basename + f'_{label.replace("/","")}.png')
-            #TODO Move to PIL without saving to disk in order 
-            img_to_export.save(targ_file)
-                    
-            img_tmp = PIL.Image.open(targ_file)
-            img_tmp = img_tmp.convert("L")
-            img_tmp.save(targ_file)    
+            mask_lib.save_mask(targ_file, mask)
         msg = 'Image export complete'
         self.status(msg, print_msg=True)
             
@@ -2363,32 +2639,143 @@ class MainWindow(QtWidgets.QMainWindow):
 
 
     def getFeatures(self):
+        """Request the features of the image; see featuresPredictedEvent."""
         if not self.imageData:
             self.status('No image available to process')
             return
         # self.image - QImage
         # self.imageData - bytes
         
-        self.status('Getting features')
         # TODO Avoid conversions between different image formats.  Once read image using PIL, save that format (in loadFile?).
         # Per https://stackoverflow.com/questions/14759637/python-pil-bytes-to-image
         imageStream = io.BytesIO(self.imageData)
         img = Image.open(imageStream)
 
-        ipm = self.ipm
-        
+        filename = self.filename
+        self.btnGetFeatures.setEnabled(False)
         self.status('Getting features', show_time=True, print_msg=True)
-        ipm.predict_imgs([img])
+        self.ipm.predict_imgs_async(
+            [img],
+            done=lambda future: self.featuresPredicted.emit(
+                filename, future, img.size),
+        )
+
+    def autoAnnotateDir(self):
+        """Annotate the images of the file list in the background.
+
+        Clicking again cancels the job; the next run resumes from its
+        checkpoint in the label directory.
+        """
+        if self._autoAnnotateCancel is not None:
+            self._autoAnnotateCancel.set()
+            self.btnAutoAnnotate.setEnabled(False)
+            self.status(self.tr('Cancelling auto-annotation...'))
+            return
+        image_paths = self.imageList
+        if not image_paths:
+            self.status(self.tr('No images to annotate'))
+            return
+        label_dir = self.output_dir or self.lastOpenDir or \
+            osp.dirname(image_paths[0])
+        label = 'Tissue boundary'  # TODO Get from model output/config
+        flags = {}
+        if self._config['label_flags']:
+            for pattern, keys in self._config['label_flags'].items():
+                if re.match(pattern, label):
+                    for key in keys:
+                        flags[key] = False
+        annotator = user_extns.AutoAnnotator(
+            self.ipm,
+            label=label,
+            output_dir=self.output_dir,
+            min_area=self._config['prediction']['min_region_area'],
+            flags=flags,
+            compact=self._config['compact_json'],
+            checkpoint=osp.join(label_dir, '.auto_annotate_checkpoint'),
+            max_workers=self._config['auto_annotate']['max_workers'],
+            exclude=self._autoAnnotateExclude,
+            lock=self._autoAnnotateLock,
+        )
+        # the open image may be saved at any time, so leave it alone;
+        # loadFile() adds the images opened later on
+        self._autoAnnotateExclude.clear()
+        if self.imagePath:
+            self._autoAnnotateExclude.add(self.filename)
+        self.labelWriter.wait()
+        cancel = self._autoAnnotateCancel = threading.Event()
+        self.btnAutoAnnotate.setText(self.tr('Cancel Auto-annotation'))
+
+        def progress(done, total, image_path):
+            self.autoAnnotateProgress.emit(done, total)
+
+        def run():
+            try:
+                result = annotator.run(
+                    image_paths, cancel=cancel, progress=progress,
+                )
+            except Exception as e:
+                logger.error('Auto-annotation failed: {}'.format(e))
+                result = e
+            self.autoAnnotateFinished.emit(result)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def autoAnnotateProgressEvent(self, done, total):
+        self.status(self.tr('Auto-annotating: %d / %d images') %
+                    (done, total))
+
+    def autoAnnotateFinishedEvent(self, result):
+        self._autoAnnotateCancel = None
+        with self._autoAnnotateLock:
+            self._autoAnnotateExclude.clear()
+        self.btnAutoAnnotate.setText(self.tr('Auto-annotate Directory'))
+        self.btnAutoAnnotate.setEnabled(True)
+        if isinstance(result, Exception):
+            self.errorMessage(
+                self.tr('Error auto-annotating'),
+                self.tr('<b>%s</b>') % result
+            )
+            return
+        for image_path in result['annotated']:
+            self.dirIndex.add(user_extns.imgFileToLabelFileName(
+                image_path, self.output_dir))
+            self.fileListWidget.setLabeled(image_path)
+        self.status(
+            self.tr('Auto-annotation %s: %d annotated, %d skipped, '
+                    '%d failed') % (
+                self.tr('cancelled') if result['cancelled']
+                else self.tr('done'),
+                len(result['annotated']), len(result['skipped']),
+                len(result['failed'])))
+
+    def featuresPredictedEvent(self, filename, future, img_size):
+        self.btnGetFeatures.setEnabled(True)
+        try:
+            predictions = future.result()
+        except Exception as e:
+            logger.error('Failed to get features: {}'.format(e))
+            self.status('Failed to get features', show_time=True,
+                        print_msg=True)
+            self.errorMessage(
+                self.tr('Error getting features'),
+                self.tr('<b>%s</b>') % e
+            )
+            return
+        if filename != self.filename:
+            self.status('Discarded the features of {}'.format(filename))
+            return
         self.status('Processing features', show_time=True, print_msg=True)
-        m_to_p = user_extns.MaskToPolygon(targ_size = img.size)
+        m_to_p = user_extns.MaskToPolygon(
+            targ_size=img_size,
+            min_area=self._config['prediction']['min_region_area'],
+        )
         num_found = 0
-        for mask in ipm.pred_masks_np:
-            pts = m_to_p.get_polygon(mask)
+        regions = m_to_p.get_polygons_batch(self.ipm.masks_np(predictions))
+        for pts in itertools.chain.from_iterable(regions):
             # TODO Get label from model output/config files(s)
             label = 'Tissue boundary'
             s = Shape(label=label,shape_type='polygon')
-            for pt in pts:
-                s.addPoint(QtCore.QPointF(*pt))
+            s.addPoints(pts)
             s.close()
             self.addLabel(s)
 
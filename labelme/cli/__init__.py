@@ -2,5 +2,6 @@
 
 from . import draw_json
 from . import draw_label_png
+from . import export
 from . import json_to_dataset
 from . import on_docker
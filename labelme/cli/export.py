@@ -0,0 +1,502 @@
+import argparse
+import base64
+import concurrent.futures
+import datetime
+import glob
+import io
+import json
+import os
+import os.path as osp
+import shutil
+import sys
+import tempfile
+import uuid
+
+import imgviz
+import numpy as np
+import PIL.Image
+
+from labelme.logger import logger
+from labelme import utils
+
+
+MANIFEST = 'manifest.json'
+FRAGMENT_DIR = '.coco'
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _write_json(path, data):
+    # write next to the target and rename, so an interrupted run never
+    # leaves a truncated manifest or fragment behind
+    fd, tmp_file = tempfile.mkstemp(
+        dir=osp.dirname(path), prefix='.tmp_', suffix='.json'
+    )
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_file, path)
+
+
+def _image_source(data, img_file):
+    # the image embedded in the label file (store_data) wins, as in
+    # LabelFile, so the image itself may have moved or be missing
+    if data.get('imageData'):
+        return base64.b64decode(data['imageData'])
+    return img_file
+
+
+def _open_image(img_src):
+    # img_src: an image file or the bytes of one
+    if isinstance(img_src, bytes):
+        img_src = io.BytesIO(img_src)
+    return PIL.Image.open(img_src)
+
+
+def _save_image(img_src, out_img_file):
+    # JPEG sources are copied as is instead of being decoded and re-encoded
+    if isinstance(img_src, bytes):
+        img = _open_image(img_src)
+        if img.format == 'JPEG':
+            with open(out_img_file, 'wb') as f:
+                f.write(img_src)
+            return
+    elif osp.splitext(img_src)[1].lower() in ['.jpg', '.jpeg']:
+        shutil.copyfile(img_src, out_img_file)
+        return
+    else:
+        img = _open_image(img_src)
+    img.convert('RGB').save(out_img_file)
+
+
+def _read_img(img_src):
+    return np.asarray(_open_image(img_src))
+
+
+def _img_shape(img_src):
+    with _open_image(img_src) as img:
+        return img.height, img.width
+
+
+def _export_voc(data, img_src, base, output_dir, class_name_to_id,
+                class_names, noviz):
+    out_img_file = osp.join(output_dir, 'JPEGImages', base + '.jpg')
+    out_cls_file = osp.join(output_dir, 'SegmentationClass', base + '.npy')
+    out_clsp_file = osp.join(
+        output_dir, 'SegmentationClassPNG', base + '.png'
+    )
+    out_clsv_file = osp.join(
+        output_dir, 'SegmentationClassVisualization', base + '.jpg'
+    )
+    out_ins_file = osp.join(output_dir, 'SegmentationObject', base + '.npy')
+    out_insp_file = osp.join(
+        output_dir, 'SegmentationObjectPNG', base + '.png'
+    )
+    out_insv_file = osp.join(
+        output_dir, 'SegmentationObjectVisualization', base + '.jpg'
+    )
+
+    _save_image(img_src, out_img_file)
+    if noviz:
+        img_shape = _img_shape(img_src)
+    else:
+        img = _read_img(img_src)
+        img_shape = img.shape
+
+    cls, ins = utils.shapes_to_label(
+        img_shape=img_shape,
+        shapes=data['shapes'],
+        label_name_to_value=class_name_to_id,
+    )
+    ins[cls == -1] = 0  # ignore it.
+
+    utils.lblsave(out_clsp_file, cls)
+    np.save(out_cls_file, cls)
+    utils.lblsave(out_insp_file, ins)
+    np.save(out_ins_file, ins)
+    outputs = [
+        out_img_file, out_cls_file, out_clsp_file, out_ins_file, out_insp_file,
+    ]
+    if noviz:
+        return outputs
+
+    clsv = imgviz.label2rgb(
+        label=cls,
+        img=imgviz.rgb2gray(img),
+        label_names=class_names,
+        font_size=15,
+        loc='rb',
+    )
+    imgviz.io.imsave(out_clsv_file, clsv)
+    instance_names = [str(i) for i in range(ins.max() + 1)]
+    insv = imgviz.label2rgb(
+        label=ins,
+        img=imgviz.rgb2gray(img),
+        label_names=instance_names,
+        font_size=15,
+        loc='rb',
+    )
+    imgviz.io.imsave(out_insv_file, insv)
+    return outputs + [out_clsv_file, out_insv_file]
+
+
+def _export_coco(data, img_src, base, output_dir, class_name_to_id):
+    out_img_file = osp.join(output_dir, 'JPEGImages', base + '.jpg')
+    out_fragment_file = osp.join(output_dir, FRAGMENT_DIR, base + '.json')
+
+    _save_image(img_src, out_img_file)
+    height, width = _img_shape(img_src)
+
+    masks = {}
+    segmentations = {}
+    for shape in data['shapes']:
+        points = shape['points']
+        label = shape['label']
+        group_id = shape.get('group_id')
+        shape_type = shape.get('shape_type')
+        if label not in class_name_to_id:
+            continue
+        if group_id is None:
+            group_id = uuid.uuid1()
+        instance = (label, group_id)
+
+        mask = utils.shape_to_mask((height, width), points, shape_type)
+        if instance in masks:
+            masks[instance] |= mask
+        else:
+            masks[instance] = mask
+        points = np.asarray(points).flatten().tolist()
+        segmentations.setdefault(instance, []).append(points)
+
+    annotations = []
+    for instance, mask in masks.items():
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        if len(rows):
+            bbox = [
+                float(cols[0]),
+                float(rows[0]),
+                float(cols[-1] - cols[0] + 1),
+                float(rows[-1] - rows[0] + 1),
+            ]
+        else:
+            bbox = [0.0, 0.0, 0.0, 0.0]
+        annotations.append(dict(
+            category_id=class_name_to_id[instance[0]],
+            segmentation=segmentations[instance],
+            area=float(mask.sum()),
+            bbox=bbox,
+            iscrowd=0,
+        ))
+
+    fragment = dict(
+        image=dict(
+            license=0,
+            url=None,
+            file_name=osp.join('JPEGImages', base + '.jpg'),
+            height=height,
+            width=width,
+            date_captured=None,
+        ),
+        annotations=annotations,
+    )
+    _write_json(out_fragment_file, fragment)
+    return [out_img_file, out_fragment_file]
+
+
+def export_label_file(task):
+    """Export one label file; runs in a worker process.
+
+    Returns ``(label_file, img_file, outputs)``.
+    """
+    label_file = task['label_file']
+    with open(label_file) as f:
+        data = json.load(f)
+    img_file = osp.join(osp.dirname(label_file), data['imagePath'])
+    img_src = _image_source(data, img_file)
+    base = osp.splitext(osp.basename(label_file))[0]
+    if task['format'] == 'coco':
+        outputs = _export_coco(
+            data,
+            img_src,
+            base,
+            task['output_dir'],
+            task['class_name_to_id'],
+        )
+    else:
+        outputs = _export_voc(
+            data,
+            img_src,
+            base,
+            task['output_dir'],
+            task['class_name_to_id'],
+            task['class_names'],
+            task['noviz'],
+        )
+    return label_file, img_file, outputs
+
+
+def load_manifest(output_dir, options):
+    """Return the per-file entries of the last run with the same options."""
+    manifest_file = osp.join(output_dir, MANIFEST)
+    if not osp.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except ValueError:
+        logger.warning('Ignoring broken manifest: {}'.format(manifest_file))
+        return {}
+    if manifest.get('options') != options:
+        logger.info('Export options changed, exporting all files')
+        return {}
+    return manifest.get('files', {})
+
+
+def save_manifest(output_dir, options, entries):
+    _write_json(
+        osp.join(output_dir, MANIFEST), dict(options=options, files=entries)
+    )
+
+
+def write_coco_annotations(out_ann_file, fragment_files, categories):
+    """Concatenate per-image fragments into a COCO annotations file.
+
+    Fragments are read one at a time and written out as they come, so
+    memory use does not grow with the size of the dataset.
+    """
+    now = datetime.datetime.now()
+    header = dict(
+        info=dict(
+            description=None,
+            url=None,
+            version=None,
+            year=now.year,
+            contributor=None,
+            date_created=now.strftime('%Y-%m-%d %H:%M:%S.%f'),
+        ),
+        licenses=[dict(url=None, id=0, name=None)],
+        type='instances',
+        categories=categories,
+    )
+    out_dir = osp.dirname(out_ann_file)
+    fd, tmp_file = tempfile.mkstemp(dir=out_dir, prefix='.tmp_')
+    annotation_id = 0
+    with os.fdopen(fd, 'w') as f, \
+            tempfile.TemporaryFile('w+', dir=out_dir) as f_ann:
+        f.write(json.dumps(header)[:-1])
+        f.write(', "images": [')
+        for image_id, fragment_file in enumerate(fragment_files):
+            with open(fragment_file) as f_frag:
+                fragment = json.load(f_frag)
+            fragment['image']['id'] = image_id
+            if image_id:
+                f.write(', ')
+            f.write(json.dumps(fragment['image']))
+            for annotation in fragment['annotations']:
+                annotation['id'] = annotation_id
+                annotation['image_id'] = image_id
+                if annotation_id:
+                    f_ann.write(', ')
+                f_ann.write(json.dumps(annotation))
+                annotation_id += 1
+        f.write('], "annotations": [')
+        f_ann.seek(0)
+        shutil.copyfileobj(f_ann, f)
+        f.write(']}')
+    os.replace(tmp_file, out_ann_file)
+
+
+def export(input_dir, output_dir, labels_file, format='voc', noviz=False,
+           jobs=1, force=False):
+    """Export input_dir to output_dir; returns 0 on success, 1 on errors."""
+    class_names = []
+    class_name_to_id = {}
+    with open(labels_file) as f:
+        for i, line in enumerate(f.readlines()):
+            class_id = i - 1  # starts with -1
+            class_name = line.strip()
+            class_name_to_id[class_name] = class_id
+            if class_id == -1:
+                assert class_name == '__ignore__'
+                continue
+            elif class_id == 0 and format == 'voc':
+                assert class_name == '_background_'
+            class_names.append(class_name)
+    if format == 'coco':
+        # __ignore__ is not a category
+        class_name_to_id.pop('__ignore__')
+
+    subdirs = ['JPEGImages']
+    if format == 'coco':
+        subdirs.append(FRAGMENT_DIR)
+    else:
+        subdirs += [
+            'SegmentationClass',
+            'SegmentationClassPNG',
+            'SegmentationObject',
+            'SegmentationObjectPNG',
+        ]
+        if not noviz:
+            subdirs += [
+                'SegmentationClassVisualization',
+                'SegmentationObjectVisualization',
+            ]
+    for subdir in subdirs:
+        os.makedirs(osp.join(output_dir, subdir), exist_ok=True)
+    logger.info('Exporting dataset: {}'.format(output_dir))
+
+    options = dict(format=format, labels=class_names, noviz=noviz)
+    entries = {} if force else load_manifest(output_dir, options)
+
+    label_files = sorted(glob.glob(osp.join(input_dir, '*.json')))
+    tasks = []
+    for label_file in label_files:
+        entry = entries.get(osp.basename(label_file))
+        if entry is not None \
+                and entry['label_stamp'] == _stamp(label_file) \
+                and entry['img_stamp'] == _stamp(entry['img_file']) \
+                and all(
+                    osp.exists(osp.join(output_dir, p))
+                    for p in entry['outputs']
+                ):
+            continue
+        entries.pop(osp.basename(label_file), None)
+        tasks.append(dict(
+            label_file=label_file,
+            output_dir=output_dir,
+            format=format,
+            class_name_to_id=class_name_to_id,
+            class_names=tuple(class_names),
+            noviz=noviz,
+        ))
+
+    # outputs of label files removed since the last run
+    removed = set(entries) - {osp.basename(f) for f in label_files}
+    for key in removed:
+        for path in entries.pop(key)['outputs']:
+            path = osp.join(output_dir, path)
+            if osp.exists(path):
+                os.remove(path)
+
+    logger.info(
+        'Exporting {} files, {} unchanged, {} removed'.format(
+            len(tasks), len(label_files) - len(tasks), len(removed)
+        )
+    )
+
+    def done(result):
+        label_file, img_file, outputs = result
+        # keyed by file name and relative to output_dir, so the manifest
+        # stays valid when the directories are moved together
+        entries[osp.basename(label_file)] = dict(
+            label_stamp=_stamp(label_file),
+            img_file=osp.abspath(img_file),
+            img_stamp=_stamp(img_file),
+            outputs=[osp.relpath(p, output_dir) for p in outputs],
+        )
+
+    n_failed = 0
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            try:
+                done(export_label_file(task))
+            except Exception as e:
+                logger.error(
+                    'Failed to export {}: {}'.format(task['label_file'], e)
+                )
+                n_failed += 1
+    else:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            futures = {
+                executor.submit(export_label_file, task): task
+                for task in tasks
+            }
+            for i, future in enumerate(
+                concurrent.futures.as_completed(futures)
+            ):
+                try:
+                    done(future.result())
+                except Exception as e:
+                    logger.error('Failed to export {}: {}'.format(
+                        futures[future]['label_file'], e
+                    ))
+                    n_failed += 1
+                if (i + 1) % 1000 == 0:
+                    # progress survives an interrupted run
+                    save_manifest(output_dir, options, entries)
+                    logger.info('Exported {}/{}'.format(i + 1, len(tasks)))
+    save_manifest(output_dir, options, entries)
+
+    if format == 'coco':
+        fragment_files = []
+        for label_file in label_files:
+            entry = entries.get(osp.basename(label_file))
+            if entry is not None:
+                fragment_files.append(
+                    osp.join(output_dir, entry['outputs'][1])
+                )
+        write_coco_annotations(
+            osp.join(output_dir, 'annotations.json'),
+            fragment_files,
+            [
+                dict(supercategory=None, id=class_id, name=class_name)
+                for class_name, class_id in class_name_to_id.items()
+            ],
+        )
+    else:
+        with open(osp.join(output_dir, 'class_names.txt'), 'w') as f:
+            f.writelines('\n'.join(class_names))
+
+    if n_failed:
+        logger.error('Failed to export {} files'.format(n_failed))
+        return 1
+    logger.info('Saved dataset: {}'.format(output_dir))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export a directory of label files to a VOC or COCO '
+        'format dataset. Files that did not change since the last export '
+        'to the same output directory are skipped.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument('input_dir', help='input annotated directory')
+    parser.add_argument('output_dir', help='output dataset directory')
+    parser.add_argument('--labels', help='labels file', required=True)
+    parser.add_argument(
+        '--format', choices=['voc', 'coco'], default='voc',
+        help='dataset format',
+    )
+    parser.add_argument(
+        '--noviz', help='no visualization (voc)', action='store_true'
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=os.cpu_count(),
+        help='number of worker processes',
+    )
+    parser.add_argument(
+        '--force', action='store_true',
+        help='export all files even if they did not change',
+    )
+    args = parser.parse_args()
+
+    sys.exit(export(
+        args.input_dir,
+        args.output_dir,
+        args.labels,
+        format=args.format,
+        noviz=args.noviz,
+        jobs=args.jobs,
+        force=args.force,
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import contextlib
+import os
+import os.path as osp
+import sqlite3
+import threading
+
+from labelme.logger import logger
+
+
+class DirIndex(object):
+
+    """Persistent index of the files below one or more directories.
+
+    Paths, mtimes and sizes are kept in a SQLite database so that reopening
+    a large directory (e.g. on a network share) does not walk it again.
+    refresh() only lists the directories whose mtime changed since the last
+    scan, which catches added, removed and renamed files. Lookups (files(),
+    exists()) are answered from memory and never touch the filesystem.
+    """
+
+    def __init__(self, db_file=None):
+        if db_file is None:
+            db_file = osp.join(osp.expanduser('~'), '.labelme_index.db3')
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._roots = {}  # absolute root: sorted absolute file paths
+        self._paths = set()
+        self._added = set()  # see add()
+        self._prefixes = ()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS dirs '
+                '(path TEXT PRIMARY KEY, parent TEXT, mtime REAL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS files '
+                '(path TEXT PRIMARY KEY, dir TEXT, mtime REAL, size INTEGER)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS files_dir ON files (dir)')
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # one connection per call, so refresh() can run on another thread
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def __contains__(self, root):
+        return osp.abspath(root) in self._roots
+
+    def load(self, root):
+        """Load root from the database; return False if it was never indexed.
+        """
+        absroot = osp.abspath(root)
+        if absroot in self._roots:
+            return True
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT 1 FROM dirs WHERE path = ?', (absroot,)
+            ).fetchone()
+            if row is None:
+                return False
+            paths = self._query(conn, absroot)
+        self._set(absroot, paths)
+        return True
+
+    def refresh(self, root):
+        """Rescan the directories below root that changed on disk.
+
+        Returns True if the list of files below root changed.
+        """
+        absroot = osp.abspath(root)
+        with self._lock:
+            # the scan may miss files added while it runs, so only these are
+            # left to it
+            added = set(self._added)
+        with self._connect() as conn:
+            self._scan(conn, absroot)
+            paths = self._query(conn, absroot)
+        changed = self._roots.get(absroot) != paths
+        self._set(absroot, paths, scanned=added)
+        return changed
+
+    def files(self, root):
+        """Return the indexed files below root, joined like os.walk does."""
+        absroot = osp.abspath(root)
+        with self._lock:
+            paths = self._roots.get(absroot, [])
+        n = len(osp.join(absroot, ''))
+        return [osp.join(root, p[n:]) for p in paths]
+
+    def exists(self, path):
+        path = osp.abspath(path)
+        if path in self._paths:
+            return True
+        if path.startswith(self._prefixes):
+            return False
+        # not below any indexed root
+        return osp.exists(path)
+
+    def add(self, path):
+        """Record a file created by labelme until the next refresh.
+
+        The file is kept until a refresh of its root that started after it
+        was added, so a refresh running in the meantime does not drop it.
+        """
+        path = osp.abspath(path)
+        with self._lock:
+            self._added.add(path)
+            self._paths.add(path)
+
+    def discard(self, path):
+        path = osp.abspath(path)
+        with self._lock:
+            self._added.discard(path)
+            self._paths.discard(path)
+
+    def _set(self, absroot, paths, scanned=()):
+        # scanned: the added files the scan of absroot has seen
+        prefix = osp.join(absroot, '')
+        with self._lock:
+            self._roots[absroot] = paths
+            self._prefixes = tuple(osp.join(r, '') for r in self._roots)
+            self._added -= {p for p in scanned if p.startswith(prefix)}
+            self._paths = set(self._added)
+            for root_paths in self._roots.values():
+                self._paths.update(root_paths)
+
+    @staticmethod
+    def _query(conn, absroot):
+        prefix = osp.join(absroot, '')
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        rows = conn.execute(
+            'SELECT path FROM files WHERE path >= ? AND path < ? '
+            'ORDER BY path',
+            (prefix, upper),
+        )
+        return [row[0] for row in rows]
+
+    def _scan(self, conn, absroot):
+        stack = [absroot]
+        while stack:
+            dirpath = stack.pop()
+            try:
+                mtime = os.stat(dirpath).st_mtime
+            except OSError:
+                self._forget(conn, dirpath)
+                continue
+            row = conn.execute(
+                'SELECT mtime FROM dirs WHERE path = ?', (dirpath,)
+            ).fetchone()
+            old_subdirs = {r[0] for r in conn.execute(
+                'SELECT path FROM dirs WHERE parent = ?', (dirpath,)
+            )}
+            if row is not None and row[0] == mtime:
+                stack.extend(old_subdirs)
+                continue
+
+            subdirs = []
+            files = []
+            try:
+                entries = list(os.scandir(dirpath))
+            except OSError as e:
+                logger.warn('Failed to list {}: {}'.format(dirpath, e))
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        st = entry.stat()
+                        files.append(
+                            (entry.path, dirpath, st.st_mtime, st.st_size)
+                        )
+                except OSError:
+                    continue
+            conn.execute('DELETE FROM files WHERE dir = ?', (dirpath,))
+            conn.executemany('INSERT INTO files VALUES (?, ?, ?, ?)', files)
+            for subdir in old_subdirs - set(subdirs):
+                self._forget(conn, subdir)
+            conn.execute(
+                'INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)',
+                (dirpath, osp.dirname(dirpath), mtime),
+            )
+            stack.extend(subdirs)
+
+    def _forget(self, conn, dirpath):
+        subdirs = [r[0] for r in conn.execute(
+            'SELECT path FROM dirs WHERE parent = ?', (dirpath,)
+        )]
+        for subdir in subdirs:
+            self._forget(conn, subdir)
+        conn.execute('DELETE FROM files WHERE dir = ?', (dirpath,))
+        conn.execute('DELETE FROM dirs WHERE path = ?', (dirpath,))
@@ -0,0 +1,148 @@
+import collections
+import concurrent.futures
+import threading
+
+from labelme.logger import logger
+
+
+class ImageCache(object):
+
+    """LRU cache of decoded images (or other files) filled on worker threads.
+
+    ``loader(key)`` does the actual work (read + decode) and returns
+    ``(value, nbytes)`` or ``None`` if the key cannot be cached.
+    ``stamp(key)`` returns a hashable snapshot (e.g. mtime/size) used to
+    detect entries that went stale after they were cached.
+    """
+
+    def __init__(self, loader, stamp=None, max_bytes=512 * 2 ** 20,
+                 max_workers=2):
+        self._loader = loader
+        self._stamp = stamp or (lambda key: None)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # key: (stamp, value, size)
+        self._futures = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _load(self, key):
+        try:
+            stamp = self._stamp(key)
+            result = self._loader(key)
+        except Exception as e:
+            logger.debug('Failed to prefetch {}: {}'.format(key, e))
+            result = None
+        with self._lock:
+            self._futures.pop(key, None)
+            if result is None:
+                return None
+            value, size = result
+            self._put(key, stamp, value, size)
+        return value
+
+    def _put(self, key, stamp, value, size):
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[2]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (stamp, value, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.nbytes -= evicted
+            self.evictions += 1
+
+    def get(self, key, wait=True):
+        """Return the cached value for key or None on a miss.
+
+        If the key is being prefetched, wait for it instead of decoding
+        the same image a second time (unless wait is False).
+        """
+        with self._lock:
+            future = self._futures.get(key)
+        if future is not None and wait:
+            try:
+                future.result()
+            except concurrent.futures.CancelledError:
+                pass
+        stamp = self._stamp(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                if entry is not None:
+                    self.nbytes -= self._entries.pop(key)[2]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, size):
+        stamp = self._stamp(key)
+        with self._lock:
+            self._put(key, stamp, value, size)
+
+    def prefetch(self, keys):
+        """Schedule keys for background loading.
+
+        Queued jobs for keys that are no longer wanted are cancelled so
+        fast navigation does not pile up stale work.  Cached entries that
+        went stale are dropped and loaded again.
+        """
+        keys = [k for k in keys if k is not None]
+        stamps = {k: self._stamp(k) for k in keys if k in self._entries}
+        with self._lock:
+            for key, future in list(self._futures.items()):
+                if key not in keys and future.cancel():
+                    del self._futures[key]
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if key in stamps and entry[0] == stamps[key]:
+                        self._entries.move_to_end(key)
+                        continue
+                    self.nbytes -= self._entries.pop(key)[2]
+                if key in self._futures:
+                    continue
+                self._futures[key] = self._executor.submit(self._load, key)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.nbytes = 0
+            elif key in self._entries:
+                self.nbytes -= self._entries.pop(key)[2]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                hit_rate=self.hits / lookups if lookups else 0.0,
+                evictions=self.evictions,
+                entries=len(self._entries),
+                nbytes=self.nbytes,
+                max_bytes=self.max_bytes,
+                pending=len(self._futures),
+            )
+
+    def shutdown(self):
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+        self._executor.shutdown(wait=False)
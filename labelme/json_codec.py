@@ -0,0 +1,162 @@
+"""JSON encoding and decoding of label files.
+
+orjson or ujson is used when installed, else the json module.  All of them
+read and write the same documents: UTF-8, non-ASCII characters unescaped.
+"""
+
+import json
+import locale
+
+from labelme.logger import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+if orjson is not None:
+    backend = 'orjson'
+elif ujson is not None:
+    backend = 'ujson'
+else:
+    backend = 'json'
+
+
+def _decode(data):
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        # written in the locale encoding by older versions
+        return data.decode(locale.getpreferredencoding(False))
+
+
+def loads(data):
+    """Parse the JSON document data (bytes or str)."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            if not isinstance(data, bytes):
+                raise
+            # e.g. not UTF-8, see _decode()
+    if isinstance(data, bytes):
+        data = _decode(data)
+    if ujson is not None:
+        return ujson.loads(data)
+    return json.loads(data)
+
+
+def dumps(data, compact=False):
+    """Return data as UTF-8 JSON bytes, indented by 2 unless compact."""
+    if orjson is not None:
+        try:
+            option = 0 if compact else orjson.OPT_INDENT_2
+            return orjson.dumps(data, option=option)
+        except TypeError as e:
+            # e.g. numpy scalars or non-str keys, which json converts
+            logger.debug('orjson cannot encode, using json: {}'.format(e))
+    elif ujson is not None:
+        return ujson.dumps(
+            data, ensure_ascii=False, escape_forward_slashes=False,
+            indent=0 if compact else 2,
+        ).encode('utf-8')
+    if compact:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    return text.encode('utf-8')
+
+
+# Stands in for a value that was not decoded, see loads_skipping().
+_SKIPPED = '\x00labelme: skipped value\x00'
+
+
+def _string_end(data, start):
+    """Return the index after the JSON string that starts at data[start]."""
+    end = start
+    while True:
+        end = data.index(b'"', end + 1)
+        backslashes = 0
+        while data[end - 1 - backslashes] == ord('\\'):
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return end + 1
+
+
+def _value_start(data, position):
+    """Return the index of the value of the key that ends at position."""
+    while data[position:position + 1].isspace():
+        position += 1
+    if data[position:position + 1] != b':':
+        return None  # e.g. a string value equal to the key
+    position += 1
+    while data[position:position + 1].isspace():
+        position += 1
+    return position
+
+
+def _cut_arrays(data, key):
+    """Replace the arrays without strings of key (e.g. points) by null."""
+    needle = b'"' + key.encode('utf-8') + b'"'
+    chunks = []
+    done = 0
+    position = data.find(needle)
+    while position != -1:
+        start = _value_start(data, position + len(needle))
+        position = data.find(needle, position + len(needle))
+        if start is None or data[start:start + 1] != b'[':
+            continue
+        # the array ends before the next string, at the last ']' where the
+        # brackets are balanced
+        stop = data.find(b'"', start)
+        if stop == -1:
+            stop = len(data)
+        end = data.rfind(b']', start, stop)
+        while end > start and data.count(b'[', start, end) != \
+                data.count(b']', start, end + 1):
+            end = data.rfind(b']', start, end)
+        if end <= start:
+            continue
+        chunks += [data[done:start], b'null']
+        done = end + 1
+    if not chunks:
+        return data
+    chunks.append(data[done:])
+    return b''.join(chunks)
+
+
+def loads_skipping(data, key, arrays=()):
+    """Parse the JSON object data (bytes) without the string value of key.
+
+    The value of the top-level key (e.g. a large base64 imageData) is cut
+    out before parsing and is None in the result.  Documents where the key
+    cannot be found that way are parsed entirely.  The arrays of numbers
+    of the keys in arrays (e.g. 'points') are also None, at any depth.
+    """
+    for array_key in arrays:
+        data = _cut_arrays(data, array_key)
+
+    needle = b'"' + key.encode('utf-8') + b'"'
+    position = data.find(needle)
+    while position != -1:
+        start = _value_start(data, position + len(needle))
+        position = data.find(needle, position + len(needle))
+        if start is None or data[start:start + 1] != b'"':
+            continue
+        try:
+            end = _string_end(data, start)
+        except (ValueError, IndexError):
+            break
+        result = loads(
+            data[:start] + json.dumps(_SKIPPED).encode() + data[end:]
+        )
+        if isinstance(result, dict) and result.get(key) == _SKIPPED:
+            result[key] = None
+            return result
+        # the key was inside a nested object, try the next one
+    return loads(data)
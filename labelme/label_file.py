@@ -1,11 +1,13 @@
 import base64
+import functools
 import io
-import json
+import os
 import os.path as osp
 
 import PIL.Image
 
 from labelme import __version__
+from labelme import json_codec
 from labelme.logger import logger
 from labelme import PY2
 from labelme import QT4
@@ -83,8 +85,13 @@ class LabelFile(object):
             'flags',
         ]
         try:
-            with open(filename, 'rb' if PY2 else 'r') as f:
-                data = json.load(f)
+            with open(filename, 'rb') as f:
+                data = f.read()
+            if self.loadImage:
+                data = json_codec.loads(data)
+            else:
+                # the base64 image data is not even parsed
+                data = json_codec.loads_skipping(data, 'imageData')
             version = data.get('version')
             if version is None:
                 logger.warn(
@@ -111,7 +118,7 @@ class LabelFile(object):
                     imagePath = osp.join(osp.dirname(filename), data['imagePath'])
                     imageData = self.load_image_file(imagePath)
                 self._check_image_height_and_width(
-                        base64.b64encode(imageData).decode('utf-8'),
+                        imageData,
                         data.get('imageHeight'),
                         data.get('imageWidth'),
                     )
@@ -148,21 +155,38 @@ class LabelFile(object):
         self.filename = filename
         self.otherData = otherData
 
+    @staticmethod
+    def load_metadata(filename):
+        """Return the flags, image attributes and shapes without points.
+
+        Only label, group_id, shape_type and flags are read for each shape;
+        points and imageData are skipped without being parsed.  Results are
+        cached by (path, mtime, size) and shared, so do not modify them.
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError as e:
+            raise LabelFileError(e)
+        return _load_metadata(
+            osp.abspath(filename), stat.st_mtime_ns, stat.st_size
+        )
+
     @staticmethod
     def _check_image_height_and_width(imageData, imageHeight, imageWidth):
-        img_arr = utils.img_b64_to_arr(imageData)
-        if imageHeight is not None and img_arr.shape[0] != imageHeight:
+        # only the image header is read, pixels are decoded by the caller
+        height, width = utils.img_data_to_shape(imageData)
+        if imageHeight is not None and height != imageHeight:
             logger.error(
                 'imageHeight does not match with imageData or imagePath, '
                 'so getting imageHeight from actual image.'
             )
-            imageHeight = img_arr.shape[0]
-        if imageWidth is not None and img_arr.shape[1] != imageWidth:
+            imageHeight = height
+        if imageWidth is not None and width != imageWidth:
             logger.error(
                 'imageWidth does not match with imageData or imagePath, '
                 'so getting imageWidth from actual image.'
             )
-            imageWidth = img_arr.shape[1]
+            imageWidth = width
         return imageHeight, imageWidth
 
     def save(
@@ -175,12 +199,13 @@ class LabelFile(object):
         imageData=None,
         otherData=None,
         flags=None,
+        compact=False,
     ):
         if imageData is not None:
-            imageData = base64.b64encode(imageData).decode('utf-8')
             imageHeight, imageWidth = self._check_image_height_and_width(
                 imageData, imageHeight, imageWidth
             )
+            imageData = base64.b64encode(imageData).decode('utf-8')
         if otherData is None:
             otherData = {}
         if flags is None:
@@ -198,12 +223,54 @@ class LabelFile(object):
             assert key not in data
             data[key] = value
         try:
-            with open(filename, 'wb' if PY2 else 'w') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            data = json_codec.dumps(data, compact=compact)
+            self._write_atomic(filename, data)
             self.filename = filename
         except Exception as e:
             raise LabelFileError(e)
 
+    @staticmethod
+    def _write_atomic(filename, data):
+        # readers see either the old or the new file, never a partial one
+        tmp_filename = '{}.{}.tmp'.format(filename, os.getpid())
+        try:
+            with open(tmp_filename, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_filename, filename)
+        except Exception:
+            if osp.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+
     @staticmethod
     def is_label_file(filename):
         return osp.splitext(filename)[1].lower() == LabelFile.suffix
+
+
+@functools.lru_cache(maxsize=2 ** 16)
+def _load_metadata(filename, mtime, size):
+    try:
+        with open(filename, 'rb') as f:
+            data = json_codec.loads_skipping(
+                f.read(), 'imageData', arrays=['points']
+            )
+        return dict(
+            version=data.get('version'),
+            flags=data.get('flags') or {},
+            imagePath=data['imagePath'],
+            imageHeight=data.get('imageHeight'),
+            imageWidth=data.get('imageWidth'),
+            shapes=[
+                dict(
+                    label=s['label'],
+                    group_id=s.get('group_id'),
+                    shape_type=s.get('shape_type', 'polygon'),
+                    flags=s.get('flags', {}),
+                )
+                for s in data['shapes']
+            ],
+        )
+    except Exception as e:
+        raise LabelFileError(e)
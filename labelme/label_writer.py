@@ -0,0 +1,92 @@
+import collections
+import os
+import os.path as osp
+import threading
+
+from labelme.logger import logger
+
+
+class LabelFileWriter(object):
+
+    """Writes label files on a worker thread.
+
+    save() only queues the data, which must not be modified afterwards
+    (snapshot it first).  Files are written in the order they were first
+    queued; saving a file again before it was written replaces the queued
+    data, so rapid successive saves are coalesced into one write.
+    ``done(filename, error)`` is called on the worker thread after each
+    write, with the exception or None.
+    """
+
+    def __init__(self, done=None):
+        self._done = done
+        self._cond = threading.Condition()
+        self._queue = collections.OrderedDict()  # filename: (lf, kwargs)
+        self._writing = None
+        self._closed = False
+        self.written = 0
+        self.coalesced = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def save(self, label_file, filename, **kwargs):
+        """Queue label_file.save(filename, **kwargs)."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('LabelFileWriter is shut down')
+            if filename in self._queue:
+                self.coalesced += 1
+            self._queue[filename] = (label_file, kwargs)
+            self._cond.notify_all()
+
+    def pending(self, filename=None):
+        """Return the number of queued or running writes (of filename)."""
+        with self._cond:
+            return self._pending(filename)
+
+    def _pending(self, filename):
+        if filename is None:
+            return len(self._queue) + (self._writing is not None)
+        return int(filename in self._queue or filename == self._writing)
+
+    def wait(self, filename=None, timeout=None):
+        """Wait until filename (or all files) is written.
+
+        Returns False if timeout (seconds) expired first.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending(filename), timeout
+            )
+
+    def shutdown(self, timeout=None):
+        """Write the queued files and stop the worker thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                filename, (label_file, kwargs) = \
+                    self._queue.popitem(last=False)
+                self._writing = filename
+            error = None
+            try:
+                dirname = osp.dirname(filename)
+                if dirname and not osp.exists(dirname):
+                    os.makedirs(dirname)
+                label_file.save(filename, **kwargs)
+            except Exception as e:
+                logger.error('Failed to save {}: {}'.format(filename, e))
+                error = e
+            with self._cond:
+                self._writing = None
+                self.written += 1
+                self._cond.notify_all()
+            if self._done is not None:
+                self._done(filename, error)
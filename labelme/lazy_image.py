@@ -0,0 +1,81 @@
+from qtpy import QtCore
+from qtpy import QtGui
+
+from labelme.logger import logger
+
+
+class LazyImage(object):
+
+    """Image file that is decoded region by region instead of at once.
+
+    Only the header is read when opened.  region() decodes a clip rectangle
+    at a reduced size, which image formats with native clip rect support
+    (e.g. JPEG) do without decoding the whole image.  The size accessors
+    mirror QImage/QPixmap, so a LazyImage can stand in for them wherever
+    only the geometry is used; coordinates are always full resolution.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        reader = QtGui.QImageReader(filename)
+        self._size = reader.size()
+        self.format = bytes(reader.format()).decode()
+        self.transformation = reader.transformation()
+        self.clipSupported = reader.supportsOption(
+            QtGui.QImageIOHandler.ClipRect
+        ) and reader.supportsOption(QtGui.QImageIOHandler.ScaledSize)
+
+    def isNull(self):
+        return not self._size.isValid() or self._size.isEmpty()
+
+    def __bool__(self):
+        return not self.isNull()
+
+    def width(self):
+        return self._size.width()
+
+    def height(self):
+        return self._size.height()
+
+    def size(self):
+        return QtCore.QSize(self._size)
+
+    def rect(self):
+        return QtCore.QRect(QtCore.QPoint(0, 0), self._size)
+
+    def region(self, rect, size=None):
+        """Decode rect (QRect) of the image, scaled to size (QSize)."""
+        reader = QtGui.QImageReader(self.filename)
+        reader.setAutoTransform(False)
+        reader.setClipRect(rect)
+        if size is not None:
+            reader.setScaledSize(size)
+        image = reader.read()
+        if image.isNull():
+            logger.warn('Failed to decode {} of {}: {}'.format(
+                rect, self.filename, reader.errorString()))
+        return image
+
+
+def open_lazy_image(filename, min_megapixels):
+    """Return a LazyImage if filename should not be decoded at once.
+
+    That is, if it has at least min_megapixels and its format can decode
+    regions.  Returns None for other files, which are loaded as before.
+    """
+    if min_megapixels is None:
+        return None
+    image = LazyImage(filename)
+    if image.isNull() or \
+            image.width() * image.height() < min_megapixels * 10 ** 6:
+        return None
+    if not image.clipSupported:
+        logger.warn(
+            'Loading {} at once: {} images cannot be decoded by region'
+            .format(filename, image.format or 'these')
+        )
+        return None
+    if image.transformation != QtGui.QImageIOHandler.TransformationNone:
+        # keep the EXIF orientation handling of the full decode
+        return None
+    return image
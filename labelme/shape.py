@@ -1,15 +1,11 @@
+import collections
 import copy
 import math
 
+import numpy as np
 from qtpy import QtCore
 from qtpy import QtGui
 
-import labelme.utils
-
-
-# TODO(unknown):
-# - [opt] Store paths instead of creating new ones at each paint.
-
 
 R, G, B = SHAPE_COLOR = 0, 255, 0  # green
 DEFAULT_LINE_COLOR = QtGui.QColor(R, G, B, 128)                # bf hovering
@@ -20,6 +16,32 @@ DEFAULT_VERTEX_FILL_COLOR = QtGui.QColor(R, G, B, 255)         # hovering
 DEFAULT_HVERTEX_FILL_COLOR = QtGui.QColor(255, 255, 255, 255)  # hovering
 
 
+def _xy(point):
+    if isinstance(point, (QtCore.QPointF, QtCore.QPoint)):
+        return point.x(), point.y()
+    x, y = point
+    return x, y
+
+
+def _toArray(points):
+    """Return points (QPointF or (x, y) sequence, or array) as (N, 2)."""
+    if not isinstance(points, np.ndarray):
+        points = [_xy(p) for p in points]
+    return np.array(points, dtype=float).reshape(-1, 2)
+
+
+def _fuzzyEqual(points, point):
+    """Same as QPointF == QPointF, for each row of points."""
+    point = np.asarray(point, dtype=float)
+    diff = np.abs(points - point)
+    equal = np.where(
+        (points == 0) | (point == 0),
+        diff <= 1e-12,
+        diff * 1e12 <= np.minimum(np.abs(points), np.abs(point)),
+    )
+    return equal.all(axis=-1)
+
+
 class Shape(object):
 
     P_SQUARE, P_ROUND = 0, 1
@@ -37,11 +59,41 @@ class Shape(object):
     point_size = 8
     scale = 1.0
 
+    _highlightSettings = {
+        NEAR_VERTEX: (4, P_ROUND),
+        MOVE_VERTEX: (1.5, P_SQUARE),
+    }
+
+    # Caches derived from the points, dropped when copying or pickling.
+    _CACHE_ATTRS = ('_path', '_bbox', '_linePath', '_vertexPath')
+
+    # Attributes that are not part of the annotation, see getState().
+    _TRANSIENT_ATTRS = _CACHE_ATTRS + (
+        'version', 'selected', 'fill', '_highlightIndex', '_highlightMode',
+        '_vertex_fill_color',
+    )
+
+    # The points are a (N, 2) float array instead of a list of QPointF, and
+    # the attributes of every shape are slots.  __dict__ is kept for the
+    # attributes set from outside, e.g. the colors, source and opacity.
+    __slots__ = (
+        'locked', 'label', 'group_id', 'version', '_points', 'fill',
+        'selected', '_shape_type', 'flags', 'other_data', '_closed',
+        '_highlightIndex', '_highlightMode', '_vertex_fill_color',
+    ) + _CACHE_ATTRS + ('__dict__',)
+
+    # Hits and misses of the paint path caches of all shapes, see paint().
+    path_cache_stats = collections.Counter()
+
     def __init__(self, label=None, line_color=None, shape_type=None,
                  flags=None, group_id=None, locked=False):
         self.locked = locked
         self.label = label
         self.group_id = group_id
+        # Incremented whenever the geometry changes; used to invalidate the
+        # caches below and by the canvas' spatial index.
+        self.version = 0
+        self._clearCache()
         self.points = []
         self.fill = False
         self.selected = False
@@ -51,10 +103,7 @@ class Shape(object):
 
         self._highlightIndex = None
         self._highlightMode = self.NEAR_VERTEX
-        self._highlightSettings = {
-            self.NEAR_VERTEX: (4, self.P_ROUND),
-            self.MOVE_VERTEX: (1.5, self.P_SQUARE),
-        }
+        self._vertex_fill_color = None
 
         self._closed = False
 
@@ -66,6 +115,71 @@ class Shape(object):
 
         self.shape_type = shape_type
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attr in self.__slots__:
+            if attr in self._CACHE_ATTRS or attr == '__dict__':
+                continue
+            if hasattr(self, attr):
+                state[attr] = getattr(self, attr)
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+        self._clearCache()
+
+    def getState(self, points=True):
+        """Return a copy of the annotation data of the shape, for undo.
+
+        With points=False the points are left out, which is enough to
+        compare the other attributes.
+        """
+        state = {
+            k: copy.copy(v) for k, v in self.__getstate__().items()
+            if k not in self._TRANSIENT_ATTRS and k != '_points'
+        }
+        if points:
+            state['_points'] = self._points.copy()
+        return state
+
+    def setState(self, state):
+        for k, v in state.items():
+            setattr(self, k, copy.copy(v))
+        self._changed()
+
+    def _clearCache(self):
+        self._path = None
+        self._bbox = None
+        self._linePath = None  # (key, path)
+        self._vertexPath = None  # (key, path)
+
+    def _changed(self):
+        self.version += 1
+        self._clearCache()
+
+    @property
+    def points(self):
+        """The points as a new list of QPointF.
+
+        Changing the list does not change the shape; assign it back, or
+        use the point methods and indexing of the shape instead.
+        """
+        return [QtCore.QPointF(x, y) for x, y in self._points.tolist()]
+
+    @points.setter
+    def points(self, value):
+        # QPointF, (x, y) pairs or a (N, 2) array
+        self._points = _toArray(value)
+        self._changed()
+
+    def pointsArray(self):
+        """Return the points as a (N, 2) float array.
+
+        This is the storage of the shape, not a copy: do not modify it.
+        """
+        return self._points
+
     @property
     def shape_type(self):
         return self._shape_type
@@ -78,35 +192,62 @@ class Shape(object):
            'line', 'circle', 'linestrip']:
             raise ValueError('Unexpected shape_type: {}'.format(value))
         self._shape_type = value
+        self._changed()
 
     def close(self):
         self._closed = True
 
     def addPoint(self, point):
-        if self.points and point == self.points[0]:
+        if len(self._points) and \
+                QtCore.QPointF(*_xy(point)) == self[0]:
             self.close()
         else:
-            self.points.append(point)
+            self._points = np.concatenate([self._points, [_xy(point)]])
+            self._changed()
+
+    def addPoints(self, points):
+        """Same as addPoint() for each of points, in one step."""
+        points = _toArray(points)
+        if not len(points):
+            return
+        if len(self._points):
+            first = self._points[0]
+            is_first = _fuzzyEqual(points, first)
+        else:
+            first = points[0]
+            is_first = _fuzzyEqual(points, first)
+            is_first[0] = False
+        if is_first.any():
+            self.close()
+            points = points[~is_first]
+        if len(points):
+            self._points = np.concatenate([self._points, points])
+            self._changed()
 
     def canAddPoint(self):
         return self.shape_type in ['polygon', 'linestrip']
 
     def popPoint(self):
-        if self.points:
-            return self.points.pop()
+        if len(self._points):
+            point = self[-1]
+            self._points = self._points[:-1]
+            self._changed()
+            return point
         return None
 
     def insertPoint(self, i, point):
-        self.points.insert(i, point)
+        self._points = np.insert(self._points, i, _xy(point), axis=0)
+        self._changed()
 
     def removePoint(self, i):
         if i is None:
-            print(f'ERROR (removePoint):   No point index specified.  Shape label={self.label}, group ID={self.group_id}, type={self.shape_type}, flags={self.flags}, # points={len(self.points)}')
+            print(f'ERROR (removePoint):   No point index specified.  Shape label={self.label}, group ID={self.group_id}, type={self.shape_type}, flags={self.flags}, # points={len(self)}')
             return
-        if i >= len(self.points):
-            print(f'ERROR (removePoint):   Point index {i} out of range.  Shape label={self.label}, group ID={self.group_id}, type={self.shape_type}, flags={self.flags}, # points={len(self.points)}')
+        if i >= len(self):
+            print(f'ERROR (removePoint):   Point index {i} out of range.  Shape label={self.label}, group ID={self.group_id}, type={self.shape_type}, flags={self.flags}, # points={len(self)}')
             return
-        self.points.pop(i)
+        self._points = np.delete(self._points, i, axis=0)
+        self._changed()
 
     def isClosed(self):
         return self._closed
@@ -120,7 +261,7 @@ class Shape(object):
         return QtCore.QRectF(x1, y1, x2 - x1, y2 - y1)
 
     def paint(self, painter):
-        if self.points:
+        if len(self._points):
             color = self.select_line_color \
                 if self.selected else self.line_color
             pen = QtGui.QPen(color)
@@ -128,40 +269,8 @@ class Shape(object):
             pen.setWidth(max(1, int(round(2.0 / self.scale))))
             painter.setPen(pen)
 
-            line_path = QtGui.QPainterPath()
-            vrtx_path = QtGui.QPainterPath()
-
-            if self.shape_type == 'rectangle':
-                assert len(self.points) in [1, 2]
-                if len(self.points) == 2:
-                    rectangle = self.getRectFromLine(*self.points)
-                    line_path.addRect(rectangle)
-                for i in range(len(self.points)):
-                    self.drawVertex(vrtx_path, i)
-            elif self.shape_type == "circle":
-                assert len(self.points) in [1, 2]
-                if len(self.points) == 2:
-                    rectangle = self.getCircleRectFromLine(self.points)
-                    line_path.addEllipse(rectangle)
-                for i in range(len(self.points)):
-                    self.drawVertex(vrtx_path, i)
-            elif self.shape_type == "linestrip":
-                line_path.moveTo(self.points[0])
-                for i, p in enumerate(self.points):
-                    line_path.lineTo(p)
-                    self.drawVertex(vrtx_path, i)
-            else:
-                line_path.moveTo(self.points[0])
-                # Uncommenting the following line will draw 2 paths
-                # for the 1st vertex, and make it non-filled, which
-                # may be desirable.
-                # self.drawVertex(vrtx_path, 0)
-
-                for i, p in enumerate(self.points):
-                    line_path.lineTo(p)
-                    self.drawVertex(vrtx_path, i)
-                if self.isClosed():
-                    line_path.lineTo(self.points[0])
+            line_path = self.linePath()
+            vrtx_path = self.vertexPath()
 
             painter.drawPath(line_path)
             painter.drawPath(vrtx_path)
@@ -171,45 +280,135 @@ class Shape(object):
                     if self.selected else self.fill_color
                 painter.fillPath(line_path, color)
 
+    def _cached(self, attr, key, make):
+        cached = getattr(self, attr)
+        if cached is not None and cached[0] == key:
+            self.path_cache_stats['hits'] += 1
+            return cached[1]
+        self.path_cache_stats['misses'] += 1
+        path = make()
+        setattr(self, attr, (key, path))
+        return path
+
+    def linePath(self):
+        """Return the outline (and fill area) painted for the shape."""
+        key = (self.version, self._closed)
+        return self._cached('_linePath', key, self._makeLinePath)
+
+    def vertexPath(self):
+        """Return the vertex markers painted for the shape."""
+        if self._highlightIndex is not None:
+            self._vertex_fill_color = self.hvertex_fill_color
+        else:
+            self._vertex_fill_color = self.vertex_fill_color
+        key = (
+            self.version, self.scale, self.point_size, self.point_type,
+            self.locked, self._highlightIndex, self._highlightMode,
+        )
+        return self._cached('_vertexPath', key, self._makeVertexPath)
+
+    def _polygon(self, close=False):
+        """Return the points as a QPolygonF, closed back to the first one."""
+        points = self._points
+        if close and len(points):
+            points = np.concatenate([points, points[:1]])
+        polygon = QtGui.QPolygonF(len(points))
+        try:
+            # fill the QPointF array of the polygon in place (PyQt5)
+            data = polygon.data()
+            data.setsize(points.size * points.itemsize)
+            np.frombuffer(data, dtype=np.float64)[:] = points.ravel()
+        except (AttributeError, TypeError, ValueError):
+            for i, (x, y) in enumerate(points.tolist()):
+                polygon[i] = QtCore.QPointF(x, y)
+        return polygon
+
+    def _makeLinePath(self):
+        line_path = QtGui.QPainterPath()
+        if self.shape_type == 'rectangle':
+            assert len(self) in [1, 2]
+            if len(self) == 2:
+                rectangle = self.getRectFromLine(*self.points)
+                line_path.addRect(rectangle)
+        elif self.shape_type == "circle":
+            assert len(self) in [1, 2]
+            if len(self) == 2:
+                rectangle = self.getCircleRectFromLine(self.points)
+                line_path.addEllipse(rectangle)
+        else:
+            close = self.shape_type != "linestrip" and self.isClosed()
+            line_path.addPolygon(self._polygon(close))
+        return line_path
+
+    def _makeVertexPath(self):
+        vrtx_path = QtGui.QPainterPath()
+        if self.locked:
+            return vrtx_path
+        # Drawing a vertex path for the 1st vertex twice would make it
+        # non-filled, which may be desirable.
+        for i, (x, y) in enumerate(self._points.tolist()):
+            self._addVertex(vrtx_path, i, x, y)
+        return vrtx_path
+
     def drawVertex(self, path, i):
+        if self._highlightIndex is not None:
+            self._vertex_fill_color = self.hvertex_fill_color
+        else:
+            self._vertex_fill_color = self.vertex_fill_color
+        if not self.locked:
+            x, y = self._points[i].tolist()
+            self._addVertex(path, i, x, y)
+
+    def _addVertex(self, path, i, x, y):
         d = self.point_size / self.scale
         shape = self.point_type
-        point = self.points[i]
         if i == self._highlightIndex:
             size, shape = self._highlightSettings[self._highlightMode]
             d *= size
-        if self._highlightIndex is not None:
-            self._vertex_fill_color = self.hvertex_fill_color
+        if shape == self.P_SQUARE:
+            path.addRect(x - d / 2, y - d / 2, d, d)
+        elif shape == self.P_ROUND:
+            path.addEllipse(QtCore.QPointF(x, y), d / 2.0, d / 2.0)
         else:
-            self._vertex_fill_color = self.vertex_fill_color
-        if not self.locked:
-            if shape == self.P_SQUARE:
-                path.addRect(point.x() - d / 2, point.y() - d / 2, d, d)
-            elif shape == self.P_ROUND:
-                path.addEllipse(point, d / 2.0, d / 2.0)
-            else:
-                assert False, "unsupported vertex shape"
+            assert False, "unsupported vertex shape"
 
     def nearestVertex(self, point, epsilon):
-        min_distance = float('inf')
-        min_i = None
-        for i, p in enumerate(self.points):
-            dist = labelme.utils.distance(p - point)
-            if dist <= epsilon and dist < min_distance:
-                min_distance = dist
-                min_i = i
-        return min_i
+        points = self._points
+        if not len(points):
+            return None
+        dist = np.hypot(points[:, 0] - point.x(), points[:, 1] - point.y())
+        i = int(np.argmin(dist))
+        if dist[i] <= epsilon:
+            return i
+        return None
 
     def nearestEdge(self, point, epsilon):
-        min_distance = float('inf')
-        post_i = None
-        for i in range(len(self.points)):
-            line = [self.points[i - 1], self.points[i]]
-            dist = labelme.utils.distancetoline(point, line)
-            if dist <= epsilon and dist < min_distance:
-                min_distance = dist
-                post_i = i
-        return post_i
+        # Same as utils.distancetoline for the edges (points[i - 1], points[i])
+        points = self._points
+        if not len(points):
+            return None
+        p3 = np.array([point.x(), point.y()])
+        p2 = points
+        p1 = np.roll(points, 1, axis=0)
+        d21 = p2 - p1
+        length = np.hypot(d21[:, 0], d21[:, 1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dist = np.abs(
+                d21[:, 0] * (p1[:, 1] - p3[1]) -
+                d21[:, 1] * (p1[:, 0] - p3[0])
+            ) / length
+        before_p1 = ((p3 - p1) * d21).sum(axis=1) < 0
+        after_p2 = ((p3 - p2) * -d21).sum(axis=1) < 0
+        dist = np.where(
+            before_p1, np.hypot(*(p3 - p1).T),
+            np.where(after_p2, np.hypot(*(p3 - p2).T), dist)
+        )
+        # degenerate edges never match, as with distancetoline (nan)
+        dist[np.isnan(dist)] = np.inf
+        i = int(np.argmin(dist))
+        if dist[i] <= epsilon:
+            return i
+        return None
 
     def containsPoint(self, point):
         return self.makePath().contains(point)
@@ -225,30 +424,46 @@ class Shape(object):
         return rectangle
 
     def makePath(self):
+        if self._path is None:
+            self._path = self._makePath()
+        return self._path
+
+    def _makePath(self):
+        path = QtGui.QPainterPath()
         if self.shape_type == 'rectangle':
-            path = QtGui.QPainterPath()
-            if len(self.points) == 2:
+            if len(self) == 2:
                 rectangle = self.getRectFromLine(*self.points)
                 path.addRect(rectangle)
         elif self.shape_type == "circle":
-            path = QtGui.QPainterPath()
-            if len(self.points) == 2:
+            if len(self) == 2:
                 rectangle = self.getCircleRectFromLine(self.points)
                 path.addEllipse(rectangle)
         else:
-            path = QtGui.QPainterPath(self.points[0])
-            for p in self.points[1:]:
-                path.lineTo(p)
+            path.addPolygon(self._polygon())
         return path
 
     def boundingRect(self):
         return self.makePath().boundingRect()
 
+    def boundingBox(self):
+        """Return (x1, y1, x2, y2) of the shape, or None if it is empty."""
+        if self._bbox is None and len(self._points):
+            points = self._points
+            if self.shape_type == 'circle' and len(points) == 2:
+                r = np.hypot(*(points[1] - points[0]))
+                (x1, y1), (x2, y2) = points[0] - r, points[0] + r
+            else:
+                (x1, y1), (x2, y2) = points.min(axis=0), points.max(axis=0)
+            self._bbox = (float(x1), float(y1), float(x2), float(y2))
+        return self._bbox
+
     def moveBy(self, offset):
-        self.points = [p + offset for p in self.points]
+        self._points = self._points + _xy(offset)
+        self._changed()
 
     def moveVertexBy(self, i, offset):
-        self.points[i] = self.points[i] + offset
+        self._points[i] += _xy(offset)
+        self._changed()
 
     def highlightVertex(self, i, action):
         self._highlightIndex = i
@@ -261,10 +476,16 @@ class Shape(object):
         return copy.deepcopy(self)
 
     def __len__(self):
-        return len(self.points)
+        return len(self._points)
 
     def __getitem__(self, key):
-        return self.points[key]
+        if isinstance(key, slice):
+            return self.points[key]
+        return QtCore.QPointF(*self._points[key].tolist())
 
     def __setitem__(self, key, value):
-        self.points[key] = value
+        if isinstance(key, slice):
+            self._points[key] = _toArray(value)
+        else:
+            self._points[key] = _xy(value)
+        self._changed()
@@ -0,0 +1,203 @@
+import collections
+
+import numpy as np
+
+
+# Rough memory use, for the history budget
+_POINT_BYTES = 16
+_STATE_BYTES = 512
+_REF_BYTES = 8
+
+
+class _Step(object):
+
+    __slots__ = ('changes', 'old_order', 'new_order', 'nbytes')
+
+    def __init__(self, changes, old_order, new_order):
+        # changes: [(shape, old state or None, new state or None)]
+        self.changes = changes
+        self.old_order = old_order
+        self.new_order = new_order
+        nbytes = 0
+        for _, old, new in changes:
+            for state in (old, new):
+                if state is not None:
+                    nbytes += _STATE_BYTES + \
+                        _POINT_BYTES * len(state['_points'])
+        if new_order is not None:
+            nbytes += _REF_BYTES * (len(old_order) + len(new_order))
+        self.nbytes = nbytes
+
+
+class ShapeHistory(object):
+
+    """Undo/redo history of a list of shapes, stored as deltas.
+
+    commit() compares the shapes with the last committed state and records
+    only the shapes that were added, removed or modified (and the order of
+    the list if it changed).  Unchanged shapes are shared by all steps.
+    Points are compared through Shape.version, so detecting changes does
+    not touch the points of unchanged shapes.  Undo and redo apply one
+    step in place, and old steps are dropped to stay within max_bytes.
+    """
+
+    def __init__(self, max_bytes=64 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.clear()
+
+    def clear(self):
+        self._undo = collections.deque()
+        self._redo = []
+        self._states = None  # shape: (version, state) as last committed
+        self._order = ()
+        self.nbytes = 0
+
+    def canUndo(self):
+        return bool(self._undo)
+
+    def canRedo(self):
+        return bool(self._redo)
+
+    def __len__(self):
+        return len(self._undo)
+
+    def isModified(self, shape):
+        """Return True if shape changed since the last commit."""
+        entry = self._states.get(shape) if self._states is not None else None
+        if entry is None:
+            return True
+        version, state = entry
+        if version == shape.version:
+            return False
+        return not np.array_equal(state['_points'], shape.pointsArray()) or \
+            self._attrs(state) != shape.getState(points=False)
+
+    @staticmethod
+    def _attrs(state):
+        return {k: v for k, v in state.items() if k != '_points'}
+
+    def commit(self, shapes, amend=False):
+        """Record the changes of shapes since the last commit.
+
+        With amend=True the changes are merged into the last step, e.g.
+        to add the label of a shape that was just created.
+        Returns True if a step was recorded.
+        """
+        if self._states is None:
+            # first commit after clear() is the initial state
+            self._states = {s: (s.version, s.getState()) for s in shapes}
+            self._order = tuple(shapes)
+            return False
+
+        changes = []
+        seen = set()
+        for shape in shapes:
+            seen.add(shape)
+            entry = self._states.get(shape)
+            if entry is None:
+                changes.append((shape, None, shape.getState()))
+                continue
+            version, state = entry
+            if version == shape.version:
+                if self._attrs(state) == shape.getState(points=False):
+                    continue
+            elif np.array_equal(state['_points'], shape.pointsArray()) and \
+                    self._attrs(state) == shape.getState(points=False):
+                self._states[shape] = (shape.version, state)
+                continue
+            changes.append((shape, state, shape.getState()))
+        if len(seen) != len(self._states):
+            for shape, (_, state) in self._states.items():
+                if shape not in seen:
+                    changes.append((shape, state, None))
+        order = tuple(shapes)
+        order_changed = len(order) != len(self._order) or any(
+            a is not b for a, b in zip(order, self._order)
+        )
+        if not changes and not order_changed:
+            return False
+
+        old_order = self._order if order_changed else None
+        new_order = order if order_changed else None
+        if amend and self._undo:
+            last = self._undo.pop()
+            self.nbytes -= last.nbytes
+            changes = self._merge(last.changes, changes)
+            if last.new_order is not None:
+                old_order = last.old_order
+                new_order = order
+        step = _Step(changes, old_order, new_order)
+
+        for shape, _, new in changes:
+            if new is None:
+                del self._states[shape]
+            else:
+                self._states[shape] = (shape.version, new)
+        self._order = order
+        self._redo = []
+        self._push(step)
+        return True
+
+    @staticmethod
+    def _merge(first, second):
+        merged = collections.OrderedDict(
+            (shape, [old, new]) for shape, old, new in first
+        )
+        for shape, old, new in second:
+            if shape in merged:
+                merged[shape][1] = new
+            else:
+                merged[shape] = [old, new]
+        return [(shape, old, new) for shape, (old, new) in merged.items()
+                if old is not None or new is not None]
+
+    def _push(self, step):
+        self._undo.append(step)
+        self.nbytes += step.nbytes
+        while self.nbytes > self.max_bytes and len(self._undo) > 1:
+            self.nbytes -= self._undo.popleft().nbytes
+
+    def dropLast(self):
+        """Forget the last step after its changes were reverted by hand."""
+        if not self._undo:
+            return
+        step = self._undo.pop()
+        self.nbytes -= step.nbytes
+        self._apply(None, step, undo=True, restore=False)
+
+    def undo(self, shapes):
+        """Revert the last step in the list shapes (in place)."""
+        if not self._undo:
+            return False
+        step = self._undo.pop()
+        self.nbytes -= step.nbytes
+        self._apply(shapes, step, undo=True)
+        self._redo.append(step)
+        return True
+
+    def redo(self, shapes):
+        if not self._redo:
+            return False
+        step = self._redo.pop()
+        self._apply(shapes, step, undo=False)
+        self._undo.append(step)
+        self.nbytes += step.nbytes
+        return True
+
+    def _apply(self, shapes, step, undo, restore=True):
+        for shape, old, new in step.changes:
+            state = old if undo else new
+            if state is None:
+                self._states.pop(shape, None)
+                continue
+            if restore:
+                shape.setState(state)
+                self._states[shape] = (shape.version, state)
+            else:
+                # compared by value on the next commit
+                self._states[shape] = (None, state)
+        order = step.old_order if undo else step.new_order
+        if order is not None:
+            self._order = order
+            if restore:
+                shapes[:] = order
@@ -0,0 +1,133 @@
+import math
+
+from qtpy import QtCore
+from qtpy import QtGui
+
+from labelme.image_cache import ImageCache
+from labelme.lazy_image import LazyImage
+from labelme.logger import logger
+
+
+class TilePyramid(object):
+
+    """Downscaled tiles of a large QImage at power-of-two levels.
+
+    Level 0 is the image itself.  A tile of level k covers
+    tile_size * 2 ** k image pixels and is at most tile_size pixels large.
+    Tiles are rendered from the four tiles of the level below, on the worker
+    threads of an ImageCache which also keeps them within max_bytes.
+
+    image may also be a LazyImage, in which case every tile, including
+    those of level 0, is decoded directly from the file.
+    """
+
+    def __init__(self, image, tile_size=512, max_bytes=256 * 2 ** 20,
+                 max_workers=2):
+        self.image = image
+        self.lazy = isinstance(image, LazyImage)
+        self.tile_size = tile_size
+        self.width = image.width()
+        self.height = image.height()
+        self.num_levels = 1
+        while max(self.width, self.height) > \
+                tile_size * 2 ** (self.num_levels - 1):
+            self.num_levels += 1
+        self.cache = ImageCache(
+            self._render, max_bytes=max_bytes, max_workers=max_workers
+        )
+
+    def level(self, scale):
+        """Return the level to draw at scale (0 means the image itself)."""
+        if scale >= 1:
+            return 0
+        level = int(math.floor(math.log(1.0 / scale, 2)))
+        return min(level, self.num_levels - 1)
+
+    def tileRect(self, key):
+        """Return the image area covered by the tile as a QRect."""
+        level, tx, ty = key
+        size = self.tile_size * 2 ** level
+        return QtCore.QRect(tx * size, ty * size, size, size).intersected(
+            QtCore.QRect(0, 0, self.width, self.height)
+        )
+
+    def tiles(self, level, rect):
+        """Return the keys of the tiles of level intersecting rect (QRect)."""
+        size = self.tile_size * 2 ** level
+        rect = rect.intersected(QtCore.QRect(0, 0, self.width, self.height))
+        if rect.isEmpty():
+            return []
+        return [
+            (level, tx, ty)
+            for ty in range(rect.top() // size, rect.bottom() // size + 1)
+            for tx in range(rect.left() // size, rect.right() // size + 1)
+        ]
+
+    def tile(self, key, wait=False):
+        """Return the tile as a QImage, or None if it is not rendered yet."""
+        return self.cache.get(key, wait=wait)
+
+    def prefetch(self, keys):
+        self.cache.prefetch(keys)
+
+    def build(self):
+        """Render the top level in the background (and so all levels
+        below it, unless the image is lazy)."""
+        rect = QtCore.QRect(0, 0, self.width, self.height)
+        self.prefetch(self.tiles(self.num_levels - 1, rect))
+
+    def _tileImage(self, key):
+        # Used while rendering a parent tile on a worker thread, so never
+        # wait for a pending tile here: render it instead.
+        image = self.cache.get(key, wait=False)
+        if image is None:
+            image, size = self._render(key)
+            self.cache.put(key, image, size)
+        return image
+
+    def _render(self, key):
+        level, tx, ty = key
+        rect = self.tileRect(key)
+        factor = 2 ** level
+        width = int(math.ceil(rect.width() / factor))
+        height = int(math.ceil(rect.height() / factor))
+        if self.lazy:
+            image = self.image.region(rect, QtCore.QSize(width, height))
+            if image.isNull():
+                # keep the failure from being retried on every paint
+                logger.debug('Using an empty tile for {}'.format(key))
+                image = QtGui.QImage(
+                    width, height, QtGui.QImage.Format_ARGB32_Premultiplied
+                )
+                image.fill(QtCore.Qt.transparent)
+            return image, image.bytesPerLine() * image.height()
+        if level == 1:
+            source = self.image.copy(rect)
+        else:
+            child_factor = factor // 2
+            source = QtGui.QImage(
+                int(math.ceil(rect.width() / child_factor)),
+                int(math.ceil(rect.height() / child_factor)),
+                QtGui.QImage.Format_ARGB32_Premultiplied,
+            )
+            source.fill(QtCore.Qt.transparent)
+            painter = QtGui.QPainter(source)
+            for child in self.tiles(level - 1, rect):
+                _, cx, cy = child
+                painter.drawImage(
+                    (cx - 2 * tx) * self.tile_size,
+                    (cy - 2 * ty) * self.tile_size,
+                    self._tileImage(child),
+                )
+            painter.end()
+        image = source.scaled(
+            width, height,
+            QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation,
+        )
+        return image, image.bytesPerLine() * image.height()
+
+    def stats(self):
+        return self.cache.stats()
+
+    def shutdown(self):
+        self.cache.shutdown()
@@ -13,4 +13,8 @@ from .tools import get_colormap
 from .tools import AnnotDf
 from .tools import shape_dict_to_obj
 from .gcp_lib import ImgPredMgr
-from .img_ml_lib import MaskToPolygon
\ No newline at end of file
+from .gcp_lib import ModelBackend
+from .gcp_lib import OnnxBackend
+from .gcp_lib import RemoteBackend
+from .img_ml_lib import MaskToPolygon
+from .auto_annotate import AutoAnnotator
@@ -35,17 +35,12 @@ from os import path as osp
 import glob
 import os
 
-from labelme import user_extns
 from labelme import LabelFile
-from labelme.shape import Shape
+from labelme.user_extns import mask_lib
 from labelme.user_extns.annot_export.dir_name_mgr import DirNameMgr
 
-from qtpy import QtCore
-from qtpy import QtGui
-from qtpy import QtWidgets
 from PIL import Image
 
-import sys
 import numpy as np
 import datetime
 import json
@@ -55,16 +50,14 @@ from matplotlib import pyplot as plt
 def get_defect_intensity(group_id):
     return str(group_id) if not group_id == float('nan') else 'None'
 
-def save_subfolder(pixmap, dir_names):
-    targ_dir = osp.dirname(dir_names['path'])
-    if not osp.exists(targ_dir):
-        try:
-            os.mkdir(targ_dir)
-        except Exception as e:
-            print(f'ERROR:  Unable to create directory={targ_dir}')
-            traceback.print_exc()
-            raise e
-    pixmap.save(dir_names['path'])
+def save_subfolder(mask, dir_names):
+    try:
+        # RGB, like the masks that used to be painted on a QPixmap
+        mask_lib.save_mask(dir_names['path'], mask, mode='RGB')
+    except Exception as e:
+        print(f'ERROR:  Unable to save {dir_names["path"]}')
+        traceback.print_exc()
+        raise e
 
 def disp_imgs(images):
     plt.figure(figsize=(15, 15))
@@ -78,17 +71,6 @@ def disp_imgs(images):
         plt.axis('off')
     plt.show()
 
-def pixmap2np(pixmap):
-    # https://stackoverflow.com/questions/45020672/convert-pyqt5-qpixmap-to-numpy-ndarray
-    image = pixmap.toImage()
-    w,h = image.width(), image.height()
-    num_bytes = image.byteCount()
-    num_channels = 4
-    assert num_channels == (num_bytes / w / h)
-    s = image.bits().asstring(w * h * num_channels)
-    arr = np.frombuffer(s, dtype=np.uint8).reshape((h, w, num_channels))
-    return arr
-
 #------------------------------------------
 # Settings
 run_mode = ['DEV','PROD'][1]
@@ -111,9 +93,6 @@ export_folder_path = osp.join(export_root, export_folder_name)  # Masks will be
 num_to_disp = 0   # Set to 0 or less to disable
 #------------------------------------------
 
-# Needed to paint shapes
-app = QtWidgets.QApplication(sys.argv)
-    
 dnm = DirNameMgr(label_dir, export_root=export_folder_path)
 #if not osp.exists(export_root):
 #    os.mkdir(export_root)
@@ -142,12 +121,13 @@ for file_stat in os.scandir(label_dir):
         continue
     
     label_file_path = file_stat.path
-    label_file = LabelFile(label_file_path, loadImage=False) 
-    
-    label_list = [s['label'] for s in label_file.shapes]
+    metadata = LabelFile.load_metadata(label_file_path)
+    label_list = [s['label'] for s in metadata['shapes']]
     
     if not label_of_interest in label_list:
         continue
+
+    label_file = LabelFile(label_file_path, loadImage=False) 
     
     dnm.set_img_basename(label_file_path)
     img_basename = dnm.img_basename
@@ -172,81 +152,41 @@ for file_stat in os.scandir(label_dir):
         img_path = osp.join(osp.dirname(label_file_path),img_path)
     if not osp.exists(img_path):
         print(f'Error:  unable to get image {img_path} from {label_file_path} and {label_file.imagePath}.')
-    img_pixmap = QtGui.QPixmap(img_path)
-    #img_pixmap_orig = img_pixmap.copy()
-    img_size = img_pixmap.size()
+    img_shape = mask_lib.get_img_shape(img_path)
    
     # ----------------------------------------- 
-    # Paint and save entire tissue images
+    # Create and save masks of entire tissue images
     #
     # Process in groups by label for masks
     #
     # Note:  This loop is not strictly needed as we are only processing one label.
     #        However, leave it in case we want to process more than one label in the future
     # ----------------------------------------- 
-    #masks = {}
-    for label in label_list:
+    for label in set(label_list):
         
         if not label == label_of_interest:
             continue
         
-        img_pixmap_mask = QtGui.QPixmap(img_size)   # Empty -- all pixels have value (0,0,0)
-        p_img_mask = QtGui.QPainter(img_pixmap_mask)
-
         dnm.label_name = label
         
-        #p_img = QtGui.QPainter(img_pixmap)
-        class_color_value = int(label_to_class[label])
-        color = QtGui.QColor(*([class_color_value] * 3))
-
-        for s_dict in label_file.shapes:
-            
-            s_obj = user_extns.shape_dict_to_obj(s_dict)
-            
-            if not hasattr(s_obj,'label'):
-                continue
-            
-            first_pt_q = None
-            for pt in s_obj.points:
-                if not first_pt_q:
-                    first_pt_q = pt
-            s_obj.addPoint(first_pt_q)
-            #s_obj.close = True
-            s_obj.fill = False
-            s_obj.point_size = 0
-            # TODO - draw text label and shape # of annotation next to shape
-            # TODO Get the scale value more intelligently?  canvas.scale -> widget scale factor via canvas.update?
-            s_obj.scale = 1 / 2
-            s_obj.line_color = color
-            #s_obj.paint(p_img)
-            
-            s_obj.fill = True
-            s_obj.line_color = color
-            s_obj.fill_color = color
-            #print(f'Painting {row["image_basename"]}, label={row["label"]}, label_instance={row["label_instance"]}, color={color.getRgb()}')
-            s_obj.paint(p_img_mask)
-        p_img_mask.end()
-            
         if label in label_to_class:
             mask_path = dnm.export_img_mask['path']
             if create_img_masks == 'new':
                 create_image_mask = not osp.exists(mask_path)
             if create_image_mask:
-                save_subfolder(img_pixmap_mask, dnm.export_img_mask)
-        #masks[label] = img_pixmap_mask
+                class_color_value = int(label_to_class[label])
+                mask_np = mask_lib.shapes_to_mask(
+                    img_shape,
+                    [s for s in label_file.shapes if s['label'] == label],
+                    value=class_color_value)
+                save_subfolder(mask_np, dnm.export_img_mask)
         
-    # TODO Not clear if need to end painters
-    #p_img.end()
-    
     if num_displayed < num_to_disp:
         num_displayed += 1
-        # https://stackoverflow.com/questions/45020672/convert-pyqt5-qpixmap-to-numpy-ndarray
-        #img_np = pixmap2np(img_pixmap_orig)
-        #mask_np = pixmap2np(img_pixmap_mask)
         img = Image.open(img_path)
         img_np = np.asarray(img)
-        mask = Image.open(mask_path)
-        mask_np = np.asarray(mask)
+        if not create_image_mask:
+            mask_np = np.asarray(Image.open(mask_path))
         mask_s = set(mask_np.ravel())
         mask_np_norm = (mask_np == max(mask_s)).astype(np.float32)
         print(f'Image {img_num}.  Mask values={mask_s}')
@@ -254,6 +194,4 @@ for file_stat in os.scandir(label_dir):
 
 
 print('Process complete.  Deploy images to Drive.')
-# TODO Process does not release memory    
-del app
 del plt
@@ -8,25 +8,32 @@ Create a report for browsing annotation details.
 
 - For each image, generate an image with the annotations on it.
 
-- For each annotation on an image, generates a .png image 
+- For each annotation on an image, generates a .png image
   and a .json file for that annotation
 
-- Generate HTML file which displays an image of each annotation, with the ability to view
-  an image of the entire piece of tissue, with or without annotations
+- Generate HTML file which displays an image of each annotation, with the
+  ability to view an image of the entire piece of tissue, with or without
+  annotations
 
 
 Assumptions
-1.  Images are in a single folder, or the list of images is unique by image basename
+1.  Images are in a single folder, or the list of images is unique by image
+    basename
 2.  .json file for images (if it exists), is in the same folder as the image
 
 TODO *** Scan entire list below for priority tasks
-1. Improve performance of report generation - save to a different format than .png
+1. Improve performance of report generation - save to a different format than
+   .png
 1.1 Improve performance/cleanthliness of HTML
 - Use styles, not object-level HTML (e.g. onclick)
 - Break into separate files
-1.2 * Don't output full paths for each entry in tissue and annot arrays.  Instead, place the folder names in arrays/vars and use JavaScript to construct a path to the image.
+1.2 * Don't output full paths for each entry in tissue and annot arrays.
+    Instead, place the folder names in arrays/vars and use JavaScript to
+    construct a path to the image.
 2. If click on image text, select whole image name
-3. **Display of defects, ensure some value is shown.  E.g. 20200306-154951-Img.bmp, Annot #7 - center and point on circle are the same:
+3. **Display of defects, ensure some value is shown.  E.g.
+   20200306-154951-Img.bmp, Annot #7 - center and point on circle are the
+   same:
         {
       "label": "Residual Epi",
       "points": [
@@ -49,442 +56,515 @@ TODO *** Scan entire list below for priority tasks
       }
     },
 4.  Compute and display area of each annotation
-5.  Create map for each image - hover over each annotation and see different values
+5.  Create map for each image - hover over each annotation and see different
+    values
 6.  Double click on defect and launch LabelMe for that image
-7.  * In last section, images with no defects are not displayed.  nan is shown instead.
+7.  * In last section, images with no defects are not displayed.  nan is shown
+    instead.
 8.  Change name from /util to /reports
-10.  Display lot number.  Requires using database -- centralize annotations with data set?
+10.  Display lot number.  Requires using database -- centralize annotations
+     with data set?
 11. Comments
 12. Rename 'annotation_regions_single' to 'annotation_regions'
-13.  Use file_suffix in classes.json instead of calculating label_clean in DirNameMgr
+13.  Use file_suffix in classes.json instead of calculating label_clean in
+     DirNameMgr
 """
 
 
+import argparse
+import concurrent.futures
+import functools
 from os import path as osp
 import glob
-import labelme
 import os
 from labelme import user_extns
-from labelme.shape import Shape
-from labelme.user_extns.dir_name_mgr import DirNameMgr
-from qtpy import QtCore
-from qtpy import QtGui
-from qtpy import QtWidgets
+from labelme.user_extns import mask_lib
+from labelme.user_extns.annot_export.dir_name_mgr import DirNameMgr
 from PIL import Image
-import sys
-import imgviz
 import numpy as np
 import string
-import shutil
 import datetime
 import pandas as pd
 import json
 import traceback
 
-def get_defect_intensity(group_id):
-    return str(group_id) if not group_id == float('nan') else 'None'
-
-def save_subfolder(pixmap, dir_names):
-    targ_dir = osp.dirname(dir_names['path'])
-    if not osp.exists(targ_dir):
-        try:
-            os.mkdir(targ_dir)
-        except Exception as e:
-            print(f'ERROR:  Unable to create directory={targ_dir}')
-            traceback.print_exc()
-            raise e
-    pixmap.save(dir_names['path'])
-
-
-#------------------------------------------
-# Settings
-run_mode = ['DEV','PROD'][1]
-create_img_exports = ['all','new','none'][1]  
-create_annot_exports = [ 'all','new','none'][1]
-create_img_masks = ['all','new','none'][1]  
-create_annot_masks = [ 'all','new','none'][1]
-selection_margin = 100  # Number of pixels that surround the selected area of the image
+EXPORT_MODES = ['all', 'new', 'none']
+
+# ------------------------------------------
+# Default settings
+run_mode = ['DEV', 'PROD'][1]
 if run_mode == 'PROD':
-    label_dir = r'\\ussomgensvm00.allergan.com\lifecell\Depts\Tissue Services\Tmp\MSA\Annot\Ground Truth'
-    classes_file_path = r'\\ussomgensvm00.allergan.com\lifecell\Depts\Tissue Services\Tmp\MSA\cfg\classes.json'
+    LABEL_DIR = (r'\\ussomgensvm00.allergan.com\lifecell\Depts'
+                 r'\Tissue Services\Tmp\MSA\Annot\Ground Truth')
+    CLASSES_FILE_PATH = (r'\\ussomgensvm00.allergan.com\lifecell\Depts'
+                         r'\Tissue Services\Tmp\MSA\cfg\classes.json')
 else:
-    label_dir = r'C:\Users\mherzo\Box Sync\Herzog_Michael - Personal Folder\2020\Machine Vision Misc\Image Annotation\Annot\Ground Truth'
-    classes_file_path = r'C:\Users\mherzo\Box Sync\Herzog_Michael - Personal Folder\2020\Machine Vision Misc\Image Annotation\classes.json'
-
-rpt_basename = 'rpt01.html'
-run_rpt = [True,False][0]
-
-min_intensity = 5
-#------------------------------------------
-    
-dnm = DirNameMgr(label_dir)
-template_path = osp.join(dnm.module_folder,'rpt01_template.html')
-
-if create_img_masks != 'none' or create_annot_masks != 'none':
-    if not osp.exists(classes_file_path):
-        print(f'ERROR:  Need to create masks, but can\'t find classes file {classes_file_path}')
-        raise ValueError
-    else:
-        with open(classes_file_path,'r') as f:
-            classes = json.load(f)
-            label_to_class = {classes[c]['name']:c for c in classes}
-
-# The report depends on current state of image annotations, so prior versions may not have integrity
-#rpt_stem = 'rpt01'
-#rpt_name = f'{rpt_stem}_{datetime.datetime.now():%Y%M%D_%h%m%s}.html'
-rpt_path = osp.join(dnm.export_root, rpt_basename)
-
-LABEL_COLORMAP = user_extns.get_colormap()
-num_colors = len(LABEL_COLORMAP)
-
+    LABEL_DIR = (r'C:\Users\mherzo\Box Sync'
+                 r'\Herzog_Michael - Personal Folder\2020'
+                 r'\Machine Vision Misc\Image Annotation\Annot\Ground Truth')
+    CLASSES_FILE_PATH = (r'C:\Users\mherzo\Box Sync'
+                         r'\Herzog_Michael - Personal Folder\2020'
+                         r'\Machine Vision Misc\Image Annotation'
+                         r'\classes.json')
+# ------------------------------------------
 
-image_dict = {} # Xref images of entire tissue with and without annotations
-annot_dict = {} # Xref images of individual annotations with and without annotation boundaries displayed
 
-obj_annots = user_extns.AnnotDf()
-df_annot = obj_annots.df_annot
-df_annot['divs'] = ''
-df_annot['label_instance'] = None
-df_annot['label_instance'].astype(int)
-
-# Needed to paint shapes
-app = QtWidgets.QApplication(sys.argv)
-
-# Quick and dirty cleanup of painters
-try:
-    p_img.end()
-    p_img_mask.end()
-except NameError:
-    pass
-
-
-label_colors = {}
-img_num = -1
-for img_path in glob.glob(osp.join(label_dir,"*.bmp")):
-    
-    img_num += 1
-
-    obj_annots.load_files(img_path)
-    img_basename = obj_annots.cur_image_basename
-    print(f'{datetime.datetime.now():%Y-%m-%d %H:%M:%S} Image={img_num}: {img_basename}')
-    
+def get_defect_intensity(group_id):
+    return 'None' if group_id is None or pd.isna(group_id) else str(group_id)
+
+
+def save_subfolder(img, dir_names):
+    # img is a PIL image or a mask array
+    try:
+        if isinstance(img, np.ndarray):
+            # RGB, like the masks that used to be painted on a QPixmap
+            mask_lib.save_mask(dir_names['path'], img, mode='RGB')
+            return
+        targ_dir = osp.dirname(dir_names['path'])
+        if not osp.exists(targ_dir):
+            os.makedirs(targ_dir, exist_ok=True)
+        img.save(dir_names['path'])
+    except Exception as e:
+        print(f'ERROR:  Unable to save {dir_names["path"]}')
+        traceback.print_exc()
+        raise e
+
+
+def _remove_exports(export_dir, export):
+    pattern = osp.join(export_dir, '**', export['basestem'] + '*.png')
+    for file in glob.glob(pattern, recursive=True):
+        os.remove(file)
+
+
+def get_annotations(img_paths, max_workers=8):
+    """Return df_annot of img_paths, with label_instance.
+
+    label_instance numbers the instances of a label on an image, in the
+    order of the label file.
+    """
+    obj_annots = user_extns.AnnotDf(max_workers=max_workers)
+    obj_annots.load_files(img_paths)
+    df_annot = obj_annots.df_annot
+    has_shape = df_annot['shape_obj'].notna()
+    # https://stackoverflow.com/questions/37997668
+    df_annot['label_instance'] = pd.Series(dtype=object)
+    df_annot.loc[has_shape, 'label_instance'] = df_annot[has_shape].groupby(
+        ['image_path', 'label'], sort=False).cumcount() + 1
+    return df_annot
+
+
+def _image_task(img_num, img_path, df_shapes):
+    # The data render_image needs, picklable for the process pool
+    df_shapes = df_shapes.sort_values(
+        ['label', 'image_basename', 'label_instance'])
+    rows = []
+    for idx, annot_num, group_id, label_instance, s_obj in zip(
+            df_shapes.index, df_shapes['annot_num'], df_shapes['group_id'],
+            df_shapes['label_instance'], df_shapes['shape_obj']):
+        shape = dict(label=s_obj.label, points=s_obj.pointsArray(),
+                     shape_type=s_obj.shape_type)
+        rows.append((idx, annot_num, group_id, label_instance,
+                     s_obj.group_id, dict(s_obj.flags or {}), shape))
+    return img_num, img_path, rows
+
+
+def render_image(task, settings):
+    """Export the images and masks of one image; return its report entries.
+
+    Returns (img_num, image_dict entry, annot_dict entries, divs by
+    df_annot index).
+    """
+    img_num, img_path, rows = task
+    create_img_exports = settings['create_img_exports']
+    create_annot_exports = settings['create_annot_exports']
+    create_img_masks = settings['create_img_masks']
+    create_annot_masks = settings['create_annot_masks']
+    label_to_class = settings['label_to_class']
+    label_colors = settings['label_colors']
+    selection_margin = settings['selection_margin']
+    min_intensity = settings['min_intensity']
+
+    dnm = DirNameMgr(settings['label_dir'],
+                     export_root=settings['export_root'])
+    img_basename = osp.basename(img_path)
+    print(f'{datetime.datetime.now():%Y-%m-%d %H:%M:%S} '
+          f'Image={img_num}: {img_basename}')
     dnm.img_basename = img_basename
-    
-    if not obj_annots.cur_image_shapes:
-        continue
-    
+
     if create_img_exports == 'all':
         create_image = True
     elif create_img_exports == 'none':
         create_image = False
-    elif create_img_exports == 'new':
-        create_image = not osp.exists(dnm.export_img['path'])        
     else:
-        print(f'Invalid value for create_img_exports={create_img_exports}')
+        create_image = not osp.exists(dnm.export_img['path'])
 
     if create_img_masks == 'all':
-        for file in glob.glob(osp.join(dnm.export_img_mask_dir,'**',dnm.export_img_mask['basestem'] + '*.png'), recursive=True):
-            os.remove(file)
+        _remove_exports(dnm.export_img_mask_dir, dnm.export_img_mask)
         create_image_mask = True
     elif create_img_masks == 'none':
         create_image_mask = False
-    elif create_img_masks == 'new':
-        create_image_mask = None
     else:
-        print(f'Invalid value for create_img_masks={create_img_masks}')
+        create_image_mask = None
+
+    image_entry = [img_path, dnm.export_img['path']]
 
-    image_dict[img_num] = [img_path, dnm.export_img['path']]
-    
     # Delete files one at a time to allow updates of individual files
     if create_image and osp.exists(dnm.export_img['path']):
         os.remove(dnm.export_img['path'])
-    
-    img_pixmap = QtGui.QPixmap(img_path)
-    img_pixmap_orig = img_pixmap.copy()
-    img_size = img_pixmap.size()
-
-    # Organize images by label/annotation instance
-    # To avoid dealing with different representations of path separators, use the base name
-    query_str = f'`image_basename` == "{img_basename}"'
-    df_shapes = df_annot.query(query_str)
-    # https://stackoverflow.com/questions/37997668/pandas-number-rows-within-group-in-increasing-order
-    df_grp = df_shapes.groupby('label').cumcount()+1
-    for idx in df_grp.index:
-        df_annot.loc[idx,'label_instance'] = df_grp.loc[idx]
-    # Requery -- df_shapes may not be a view
-    df_shapes = df_annot.query(query_str).sort_values(['label','image_basename','label_instance'])
-    
-    # Paint annotations
-    # TODO Centralize annotation painting logic -- it exists here and several other places (app.exportMasks, etc.).  Use util/shape_to_mask or examples/.../draw_json.py
-    # TODO don't paint if 'create_image' == False and 'create_annot' == False.  However, if create_annot_exports == 'new', 'create_annot' is set below 
-
-    p_img = QtGui.QPainter(img_pixmap)
-   
-    # ----------------------------------------- 
-    # Paint and save entire tissue images
+
+    img_orig = Image.open(img_path)
+    img_shape = (img_orig.height, img_orig.width)
+
+    # -----------------------------------------
+    # Draw and save entire tissue images
     #
     # Process in groups by label for masks
-    # ----------------------------------------- 
-    label_list = set(df_shapes['label'])
+    # -----------------------------------------
+    shapes_by_label = {}
+    for row in rows:
+        shapes_by_label.setdefault(row[-1]['label'], []).append(row[-1])
     masks = {}
-    for label in label_list:
-        img_pixmap_mask = QtGui.QPixmap(img_size)   # Empty -- all pixels have value (0,0,0)
-        p_img_mask = QtGui.QPainter(img_pixmap_mask)
-
+    outlines = []
+    for label, label_shapes in shapes_by_label.items():
         dnm.label_name = label
+        outlines += label_shapes
 
-        for idx in df_shapes.query(f'`label` == "{label}"').index:
-            row = df_shapes.loc[idx]
-            s_obj = row['shape_obj']  
-            if not hasattr(s_obj,'label'):
-                continue
-            
-            dnm.label_instance = row['label_instance']
-    
-            # TODO *Make colors consistent with labelMe
-            if label and not label in label_colors:
-                label_colors[s_obj.label] = QtGui.QColor(*LABEL_COLORMAP[len(label_colors) % num_colors])
-            
-            first_pt_q = None
-            for pt in s_obj.points:
-                if not first_pt_q:
-                    first_pt_q = pt
-            s_obj.addPoint(first_pt_q)
-            #s_obj.close = True
-            s_obj.fill = False
-            s_obj.point_size = 0
-            # TODO - draw text label and shape # of annotation next to shape
-            # TODO Get the scale value more intelligently?  canvas.scale -> widget scale factor via canvas.update?
-            s_obj.scale = 1 / 2
-            s_obj.line_color = label_colors[s_obj.label]
-            s_obj.paint(p_img)
-            
-            s_obj.fill = True
-            class_color_value = label_to_class[s_obj.label]
-            color = QtGui.QColor(*[int(class_color_value)]*3)
-            s_obj.line_color = color
-            s_obj.fill_color = color
-            #print(f'Painting {row["image_basename"]}, label={row["label"]}, label_instance={row["label_instance"]}, color={color.getRgb()}')
-            s_obj.paint(p_img_mask)
-        p_img_mask.end()
-            
-        if label in label_to_class:
-            if create_img_masks == 'new':
-                create_image_mask = not osp.exists(dnm.export_img_mask['path'])
-            if create_image_mask:
-                save_subfolder(img_pixmap_mask, dnm.export_img_mask)
-        masks[label] = img_pixmap_mask
-        
-    # TODO Not clear if need to end painters
-    p_img.end()
+        if label not in label_to_class:
+            continue
+        if create_img_masks == 'new':
+            create_image_mask = not osp.exists(dnm.export_img_mask['path'])
+        if create_image_mask or create_annot_masks != 'none':
+            masks[label] = mask_lib.shapes_to_mask(
+                img_shape, label_shapes, value=int(label_to_class[label]))
+        if create_image_mask:
+            save_subfolder(masks[label], dnm.export_img_mask)
+
+    # TODO - draw text label and shape # of annotation next to shape
+    img_annotated = None
+    if create_image or create_annot_exports != 'none':
+        img_annotated = mask_lib.draw_outlines(img_orig, outlines,
+                                               label_colors)
     if create_image:
-        img_pixmap.save(dnm.export_img['path'])
-
+        save_subfolder(img_annotated, dnm.export_img)
 
-    # ----------------------------------------- 
+    # -----------------------------------------
     # Create annotation-level images
     #
-    # Do so after creating tissue-level images, so annotation exports get all annotations in the regions being exported
-    # ----------------------------------------- 
-    # Delete all annotations of the image along with the tissue region export, if desired
+    # Do so after creating tissue-level images, so annotation exports get all
+    # annotations in the regions being exported
+    # -----------------------------------------
+    # Delete all annotations of the image along with the tissue region
+    # export, if desired
     if create_annot_exports == 'all':
-        for file in glob.glob(osp.join(dnm.export_annot_dir,'**',dnm.export_annot['basestem'] + '*.png'), recursive=True):
-            os.remove(file)
-        for file in glob.glob(osp.join(dnm.export_annot_region_dir,'**',dnm.export_annot_region['basestem'] + '*.png'), recursive=True):
-            os.remove(file)
+        _remove_exports(dnm.export_annot_dir, dnm.export_annot)
+        _remove_exports(dnm.export_annot_region_dir, dnm.export_annot_region)
         create_annot_images = True
     elif create_annot_exports == 'none':
         create_annot_images = False
-    elif create_annot_exports == 'new':
+    else:
         # create_annot_images will be set in logic below for each annotation
         create_annot_images = None
-    else:
-        print(f'Invalid value for create_annot_exports={create_annot_exports}')
 
     if create_annot_masks == 'all':
-        for file in glob.glob(osp.join(dnm.export_annot_mask_dir,'**',dnm.export_annot_mask['basestem'] + '*.png'), recursive=True):
-            os.remove(file)
+        _remove_exports(dnm.export_annot_mask_dir, dnm.export_annot_mask)
         create_annot_mask = True
     elif create_annot_masks == 'none':
         create_annot_mask = False
-    elif create_annot_masks == 'new':
+    else:
         # create_annot_mask will be set in logic below for each annotation
         create_annot_mask = None
-    else:
-        print(f'Invalid value for create_annot_masks={create_annot_masks}')
 
+    annot_entries = {}
+    divs = {}
     # For each tissue region, export needed annotations/regions
-    for idx in df_shapes.index:
-        row = df_shapes.loc[idx]
-        annot_num = row['annot_num']  # Unique within an image
-        annot_id = row.name # Unique identifier across all annotations in report
-        s_obj = row['shape_obj']  
-        if not hasattr(s_obj,'label'):
-            continue
-        if not row['group_id'] is None and row['group_id'] < min_intensity:
+    for (annot_id, annot_num, group_id, label_instance, intensity, flags,
+         shape) in rows:
+        # annot_num is unique within an image, annot_id across all
+        # annotations in report
+        if group_id is not None and group_id < min_intensity:
             continue
-        label = s_obj.label
+        label = shape['label']
         dnm.label_name = label
-        dnm.label_instance = row['label_instance']
-
-        # TODO More pythonic way of handing min/max x/y
-        min_w, max_w, min_h, max_h = (img_size.width(),0,img_size.height(),0)
-        for pt in s_obj.points:
-            #pt_q = QtCore.QPointF(pt[0],pt[1])
-            #pt_q_list += [pt_q]
-            min_w = min(min_w, pt.x())
-            max_w = max(max_w, pt.x())
-            min_h = min(min_h, pt.y())
-            max_h = max(max_h, pt.y())
-        
+        dnm.label_instance = label_instance
+
+        points = np.asarray(shape['points'])
+        min_w, min_h = points.min(axis=0)
+        max_w, max_h = points.max(axis=0)
+
         # Get bounding region of image.  ll = Lower Left, ur = Upper Right
-        roi_ll = (max(0,min_w - selection_margin), min(img_size.height(),max_h + selection_margin))
-        roi_ur = (min(img_size.width(),max_w + selection_margin), max(0,min_h - selection_margin))
-        
+        roi_ll = (int(max(0, min_w - selection_margin)),
+                  int(min(img_shape[0], max_h + selection_margin)))
+        roi_ur = (int(min(img_shape[1], max_w + selection_margin)),
+                  int(max(0, min_h - selection_margin)))
+
         # Add to image_divs
         img_div_width = roi_ur[0] - roi_ll[0]
         img_div_height = roi_ll[1] - roi_ur[1]
-        
+
         margin_top = roi_ur[1]
         margin_left = roi_ll[0]
-        
+
         # ------------------
         # Create images for the annotation
         # ------------------
         if create_annot_exports == 'new':
-            if osp.exists(dnm.export_annot['path']) and osp.exists(dnm.export_annot_region['path']):
+            if osp.exists(dnm.export_annot['path']) and \
+                    osp.exists(dnm.export_annot_region['path']):
                 create_annot_images = False
             else:
-                create_annot_images = True            
-                
+                create_annot_images = True
+
         if create_annot_masks == 'new':
             if osp.exists(dnm.export_annot_mask['path']):
                 create_annot_mask = False
             else:
-                create_annot_mask = True            
-                
-        roi_ll_q = QtCore.QPoint(margin_left,margin_top)
-        roi_q = QtCore.QRect(roi_ll_q,QtCore.QSize(img_div_width,img_div_height))
+                create_annot_mask = True
 
-        if create_annot_images:
-            # https://stackoverflow.com/questions/25795380/how-to-crop-a-image-and-save
+        roi_box = (margin_left, margin_top, margin_left + img_div_width,
+                   margin_top + img_div_height)
 
+        if create_annot_images:
             # Unannotated image
-            annot_pixmap = img_pixmap_orig.copy(roi_q)
-            save_subfolder(annot_pixmap, dnm.export_annot_region)
-
-            # Annotated image
-            annot_pixmap_a = img_pixmap.copy(roi_q)
-            
-            # No need to annotate again.  Already done on tissue image.
-            # disp_annot_on_img = True
-            # if disp_annot_on_img:
-            #     points_tmp = []
-            #     for pt_q in s_obj.points:
-            #         points_tmp += [pt_q - roi_ll_q]
-            #     s_obj.points = points_tmp
-            #     p_annot = QtGui.QPainter(annot_pixmap)
-            #     s_obj.paint(p_annot)
-            #     p_annot.end()
-            save_subfolder(annot_pixmap_a, dnm.export_annot)
-            
-        if s_obj.label in label_to_class and create_annot_mask:
-            img_pixmap_mask = masks[s_obj.label]
-            annot_pixmap_mask = img_pixmap_mask.copy(roi_q)
-            save_subfolder(annot_pixmap_mask, dnm.export_annot_mask)
-            
-
-        annot_dict[annot_id] = [dnm.export_annot_region['path'], dnm.export_annot['path']]
-        
+            save_subfolder(img_orig.crop(roi_box), dnm.export_annot_region)
+
+            # Annotated image.  No need to annotate again.  Already done on
+            # tissue image.
+            save_subfolder(img_annotated.crop(roi_box), dnm.export_annot)
+
+        if label in label_to_class and create_annot_mask:
+            annot_mask = masks[label][margin_top:margin_top + img_div_height,
+                                      margin_left:margin_left + img_div_width]
+            save_subfolder(annot_mask, dnm.export_annot_mask)
+
+        annot_entries[annot_id] = [dnm.export_annot_region['path'],
+                                   dnm.export_annot['path']]
+
         # ------------------
         # Construct and store the HTML for the divs
         # ------------------
 
         img_id = f'annot_{annot_id}'
-        
+        disp_intensity = get_defect_intensity(intensity)
+
         image_divs = ''
-        image_divs += f'<div class="disp_img">\n'
-        image_divs += f'  <div '
+        image_divs += '<div class="disp_img">\n'
+        image_divs += '  <div '
         image_divs += f'       onclick="getimage(\'{img_id}\',{annot_id})"'
-        image_divs += f'       title="{s_obj.label}, Intensity: {get_defect_intensity(s_obj.group_id)}, {img_basename}">\n'
-        image_divs +=  '    <img id="{2}" src="{0}" alt="{0} {1}">\n'.format(dnm.export_annot['path'],s_obj.label,img_id)
-        image_divs += f'  </div>\n'
-        image_divs += f'  <div style="height:5"></div>\n'
+        image_divs += (f'       title="{label}, Intensity: {disp_intensity}, '
+                       f'{img_basename}">\n')
+        image_divs += '    <img id="{2}" src="{0}" alt="{0} {1}">\n'.format(
+            dnm.export_annot['path'], label, img_id)
+        image_divs += '  </div>\n'
+        image_divs += '  <div style="height:5"></div>\n'
         image_divs += f'  <div style="width:{img_div_width}">\n'
-        image_divs += f'    {img_basename}, {annot_num} <a onclick="show_tissue_img(\'{img_id}\',{annot_id},{img_num})" href="javascript:void">Show</a>\n'
-        if any(s_obj.flags.values()):
-            image_divs += f'    <br>{", ".join([key for key in s_obj.flags if s_obj.flags[key]])}\n'
-        image_divs += f'    <div style="height:10"></div>\n'
-        image_divs += f' </div>\n'
-        image_divs += f' </div>\n'
-
-        df_annot.loc[idx,'divs'] = image_divs
-    
-
-# ------------------------------------------------
-# Set up variables for Template substitution
-# ------------------------------------------------
-if run_rpt:
-    df_annot_sort = df_annot.sort_values(['label','group_id','image_basename','annot_num'])
-    
+        image_divs += (f'    {img_basename}, {annot_num} <a onclick='
+                       f'"show_tissue_img(\'{img_id}\',{annot_id},{img_num})"'
+                       f' href="javascript:void">Show</a>\n')
+        if any(flags.values()):
+            flag_names = ', '.join([key for key in flags if flags[key]])
+            image_divs += f'    <br>{flag_names}\n'
+        image_divs += '    <div style="height:10"></div>\n'
+        image_divs += ' </div>\n'
+        image_divs += ' </div>\n'
+
+        divs[annot_id] = image_divs
+
+    img_orig.close()
+    return img_num, image_entry, annot_entries, divs
+
+
+def get_image_divs(df_annot):
+    """Return the table of contents and the divs of the report."""
+    df_annot_sort = df_annot.sort_values(
+        ['label', 'group_id', 'image_basename', 'annot_num'])
+
     # Table of contents (by label)
     toc = ''
     for cur_label in df_annot_sort['label'].unique():
-        toc += f'<div style="margin-left:20px"><a href="#{cur_label}">{cur_label}</a></div>\n'
-    
-    # Divs
-    image_divs = ''
-    prev_label = None
-    prev_grp = None
-    first_label = True
-    for idx in df_annot_sort.index:
-        row = df_annot_sort.loc[idx]
-        cur_label = row['label']
-        cur_grp = row['group_id']
-        if not prev_label or prev_label != cur_label:
-            image_divs += f'<h2 id="{cur_label}">{cur_label}</h2>\n'
-            if first_label:
-                first_label = False
-            else:
-                image_divs += f'<a href="#top">Top</a>\n'
-            prev_label = cur_label
-            prev_grp = None
-            new_label = True
-        else:
-            new_label = False
-        if new_label or prev_grp != cur_grp:
-            image_divs += f'<h3>Defect Intensity: {get_defect_intensity(cur_grp) }</h3>\n'
-            prev_grp = cur_grp
-        image_div = df_annot.loc[idx,'divs']
-        # If image_div is empty, it will be float('nan').  Unfortunately, image_div == float('nan') does not seem to work.
-        if isinstance(image_div,str):
-            image_divs += image_div
-            
-    #TODO Move to PIL without saving to disk in order 
-    #img_tmp = Image.open(targ_f.ile)
-    #img_tmp = img_tmp.convert("L")
-    #img_tmp.save(targ_file)    
-    
-    if osp.exists(rpt_path):
-        os.remove(rpt_path)
-    
-    # TODO Set variables for various directories, so don't have to store full path names in arrays and src of images
-    # TODO Put carriage returns between entries in dicts
-    xref = {'image_dict':image_dict,    # In javascript, the Python list is an array
-            'image_divs':image_divs,
-            'annot_dict':annot_dict,
-            'toc':toc}
-    with open(rpt_path,'w') as f_o:
-        with open(template_path) as f_t:
-            for in_line in f_t:
-                out_line = in_line
-                # Escape $
-                out_line = out_line.replace('$','$$')
-                # Substitute % for $
-                out_line = out_line.replace('%','$')
-                template = string.Template(out_line)
-                out_line = template.substitute(xref)
-                f_o.write(out_line)
-
-# TODO * Handle errors - clean up painter 
+        toc += (f'<div style="margin-left:20px">'
+                f'<a href="#{cur_label}">{cur_label}</a></div>\n')
 
+    # Divs
+    image_divs = []
+    for label_num, (cur_label, df_label) in enumerate(
+            df_annot_sort.groupby('label', sort=False, dropna=False)):
+        image_divs.append(f'<h2 id="{cur_label}">{cur_label}</h2>\n')
+        if label_num:
+            image_divs.append('<a href="#top">Top</a>\n')
+        for cur_grp, df_grp in df_label.groupby('group_id', sort=False,
+                                                dropna=False):
+            intensity = get_defect_intensity(cur_grp)
+            image_divs.append(f'<h3>Defect Intensity: {intensity}</h3>\n')
+            # Annotations without a div (e.g. images with no defects) are nan
+            image_divs.extend(d for d in df_grp['divs'] if isinstance(d, str))
+    return toc, ''.join(image_divs)
+
+
+def generate_report(label_dir,
+                    classes_file_path=None,
+                    export_root=None,
+                    rpt_basename='rpt01.html',
+                    create_img_exports='new',
+                    create_annot_exports='new',
+                    create_img_masks='new',
+                    create_annot_masks='new',
+                    # pixels that surround the selected area of the image
+                    selection_margin=100,
+                    min_intensity=5,
+                    run_rpt=True,
+                    max_workers=None):
+    """Export the images of the annotations in label_dir and the report.
+
+    The images are rendered in a pool of max_workers processes (0: in this
+    process).  Returns df_annot, with the divs of the report.
+    """
+    for mode in [create_img_exports, create_annot_exports,
+                 create_img_masks, create_annot_masks]:
+        if mode not in EXPORT_MODES:
+            raise ValueError(f'Invalid export mode {mode}')
+
+    dnm = DirNameMgr(label_dir, export_root=export_root)
+    template_path = osp.join(dnm.module_folder, 'rpt01_template.html')
+
+    label_to_class = {}
+    if create_img_masks != 'none' or create_annot_masks != 'none':
+        if not classes_file_path or not osp.exists(classes_file_path):
+            print(f'ERROR:  Need to create masks, but can\'t find classes '
+                  f'file {classes_file_path}')
+            raise ValueError
+        with open(classes_file_path, 'r') as f:
+            classes = json.load(f)
+            label_to_class = {classes[c]['name']: c for c in classes}
+
+    # The report depends on current state of image annotations, so prior
+    # versions may not have integrity
+    rpt_path = osp.join(dnm.export_root, rpt_basename)
+
+    img_paths = glob.glob(osp.join(label_dir, "*.bmp"))
+    df_annot = get_annotations(img_paths)
+    df_shapes = df_annot[df_annot['shape_obj'].notna()]
+
+    # TODO *Make colors consistent with labelMe
+    LABEL_COLORMAP = user_extns.get_colormap()
+    label_colors = {
+        label: LABEL_COLORMAP[i % len(LABEL_COLORMAP)]
+        for i, label in enumerate(df_shapes['label'].unique()) if label
+    }
+
+    img_nums = {img_path: img_num
+                for img_num, img_path in enumerate(img_paths)}
+    tasks = [
+        _image_task(img_nums[img_path], img_path, df_img)
+        for img_path, df_img in df_shapes.groupby('image_path', sort=False)
+    ]
+    settings = dict(
+        label_dir=label_dir,
+        export_root=dnm.export_root,
+        create_img_exports=create_img_exports,
+        create_annot_exports=create_annot_exports,
+        create_img_masks=create_img_masks,
+        create_annot_masks=create_annot_masks,
+        label_to_class=label_to_class,
+        label_colors=label_colors,
+        selection_margin=selection_margin,
+        min_intensity=min_intensity,
+    )
+    render = functools.partial(render_image, settings=settings)
+
+    # Xref images of entire tissue with and without annotations
+    image_dict = {}
+    # Xref images of individual annotations with and without annotation
+    # boundaries displayed
+    annot_dict = {}
+    divs = {}
+    if max_workers == 0:
+        results = map(render, tasks)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers)
+        results = executor.map(render, tasks, chunksize=8)
+    try:
+        for img_num, image_entry, annot_entries, img_divs in results:
+            image_dict[img_num] = image_entry
+            annot_dict.update(annot_entries)
+            divs.update(img_divs)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    image_dict = dict(sorted(image_dict.items()))
+    df_annot['divs'] = pd.Series(divs, dtype=object)
+
+    # ------------------------------------------------
+    # Set up variables for Template substitution
+    # ------------------------------------------------
+    if run_rpt:
+        toc, image_divs = get_image_divs(df_annot)
+
+        if osp.exists(rpt_path):
+            os.remove(rpt_path)
+
+        # TODO Set variables for various directories, so don't have to store
+        # full path names in arrays and src of images
+        # TODO Put carriage returns between entries in dicts
+        # In javascript, the Python list is an array
+        xref = {'image_dict': image_dict,
+                'image_divs': image_divs,
+                'annot_dict': annot_dict,
+                'toc': toc}
+        with open(rpt_path, 'w') as f_o:
+            with open(template_path) as f_t:
+                for in_line in f_t:
+                    out_line = in_line
+                    # Escape $
+                    out_line = out_line.replace('$', '$$')
+                    # Substitute % for $
+                    out_line = out_line.replace('%', '$')
+                    template = string.Template(out_line)
+                    out_line = template.substitute(xref)
+                    f_o.write(out_line)
+
+    # TODO * Handle errors
+    return df_annot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Create a report for browsing annotation details.'
+    )
+    parser.add_argument('label_dir', nargs='?', default=LABEL_DIR,
+                        help='folder of the images and label files')
+    parser.add_argument('--classes-file', default=CLASSES_FILE_PATH,
+                        help='classes.json, needed to create masks')
+    parser.add_argument('--export-root', default=None,
+                        help='default: <label_dir>/../../util/export_images')
+    parser.add_argument('--rpt-name', default='rpt01.html')
+    for name in ['img-exports', 'annot-exports', 'img-masks', 'annot-masks']:
+        parser.add_argument('--' + name, choices=EXPORT_MODES, default='new',
+                            help='images to create (default: %(default)s)')
+    parser.add_argument('--selection-margin', type=int, default=100,
+                        help='pixels around an annotation in its image')
+    parser.add_argument('--min-intensity', type=int, default=5)
+    parser.add_argument('--no-rpt', action='store_true',
+                        help='only create the images')
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='processes rendering images (0: none)')
+    args = parser.parse_args(argv)
+
+    generate_report(
+        args.label_dir,
+        classes_file_path=args.classes_file,
+        export_root=args.export_root,
+        rpt_basename=args.rpt_name,
+        create_img_exports=args.img_exports,
+        create_annot_exports=args.annot_exports,
+        create_img_masks=args.img_masks,
+        create_annot_masks=args.annot_masks,
+        selection_margin=args.selection_margin,
+        min_intensity=args.min_intensity,
+        run_rpt=not args.no_rpt,
+        max_workers=args.max_workers,
+    )
+
+
+if __name__ == '__main__':
+    main()
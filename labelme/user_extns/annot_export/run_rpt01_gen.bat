@@ -37,9 +37,9 @@ call C:\ProgramData\Anaconda3\condabin\activate.bat GUIAutomation
 set PYTHONPATH=\\Allergan.com\VDI\Users\MHerzo\my documents\github\labelme\labelme;\\Allergan.com\VDI\Users\MHerzo\my documents\github\labelme\labelme\user_extns
 set PYTHONPATH
 
-set PGM=//Allergan.com/VDI/Users/MHerzo/my documents/github/labelme/labelme/user_extns/rpt01_gen.py
+set PGM=//Allergan.com/VDI/Users/MHerzo/my documents/github/labelme/labelme/user_extns/annot_export/rpt01_gen.py
 echo Running python %PGM%
-call python "%PGM%"
+call python "%PGM%" "%IMGROOT%"
 
 :EndStartup
 echo Process ends.  Return code=%ERRORLEVEL% 
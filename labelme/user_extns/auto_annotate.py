@@ -0,0 +1,231 @@
+import base64
+import concurrent.futures
+import os
+import os.path as osp
+import threading
+
+from PIL import Image
+
+from labelme import json_codec
+from labelme.label_file import LabelFile
+from labelme.logger import logger
+from labelme.user_extns.img_ml_lib import MaskToPolygon
+from labelme.user_extns.tools import imgFileToLabelFileName
+
+
+def _get_polygons(mask, targ_size, min_area):
+    # In the worker processes: module level, so that it can be pickled
+    m_to_p = MaskToPolygon(targ_size=targ_size, min_area=min_area)
+    return [points.tolist() for points in m_to_p.get_polygons(mask)]
+
+
+class AutoAnnotator(object):
+
+    """Annotates a list of images with the predictions of ImgPredMgr.
+
+    Images are read and predicted batch_size at a time (the next batch is
+    predicted on the ImgPredMgr worker while the previous one is written),
+    masks are converted to polygons in a process pool (max_workers
+    processes, 0: in this thread) and the shapes are added to the label
+    file of each image, which is created if needed.  Images whose label
+    file already has a shape labelled ``label`` are skipped, as are those
+    listed in ``checkpoint``: the file the annotated and skipped images are
+    appended to, removed once a run completes.
+
+    Images in ``exclude`` (e.g. opened in the GUI, which may save them) are
+    skipped too.  The set is checked under ``lock`` right before each label
+    file is written, so other threads can add to it while a run goes on.
+    """
+
+    def __init__(self, ipm, label='Tissue boundary', output_dir=None,
+                 min_area=0, flags=None, compact=False, checkpoint=None,
+                 max_workers=None, exclude=None, lock=None):
+        self.ipm = ipm
+        self.label = label
+        self.output_dir = output_dir
+        self.min_area = min_area
+        self.flags = flags or {}
+        self.compact = compact
+        self.checkpoint = checkpoint
+        self.max_workers = max_workers
+        self.exclude = set() if exclude is None else exclude
+        self.lock = lock or threading.Lock()
+
+    def run(self, image_paths, cancel=None, progress=None):
+        """Annotate image_paths; return the results as a dict.
+
+        ``cancel`` is a threading.Event checked between batches and
+        ``progress(done, total, image_path)`` is called after each image.
+        The results are lists of image paths: annotated (at least one
+        shape added), skipped and failed, plus cancelled (bool).
+        """
+        result = dict(annotated=[], skipped=[], failed=[], cancelled=False)
+        done = self._read_checkpoint()
+        todo = []
+        for image_path in image_paths:
+            if image_path in done or self._is_excluded(image_path) or \
+                    self._is_annotated(image_path):
+                result['skipped'].append(image_path)
+            else:
+                todo.append(image_path)
+        count = [len(result['skipped'])]
+
+        def advance(image_path):
+            count[0] += 1
+            if progress is not None:
+                progress(count[0], len(image_paths), image_path)
+
+        if progress is not None and count[0]:
+            progress(count[0], len(image_paths), None)
+
+        pool = None
+        if self.max_workers != 0:
+            pool = concurrent.futures.ProcessPoolExecutor(self.max_workers)
+        try:
+            pending = None
+            batch_size = self.ipm.batch_size
+            for i in range(0, len(todo), batch_size):
+                if cancel is not None and cancel.is_set():
+                    result['cancelled'] = True
+                    break
+                batch = self._open_images(todo[i:i + batch_size], result,
+                                          advance)
+                future = None
+                if batch:
+                    future = self.ipm.predict_imgs_async(
+                        [img for _, img in batch]
+                    )
+                if pending is not None:
+                    self._write_batch(pool, *pending, result, advance)
+                pending = (batch, future) if batch else None
+            if pending is not None:
+                self._write_batch(pool, *pending, result, advance)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        if not result['cancelled'] and self.checkpoint and \
+                osp.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        return result
+
+    def _read_checkpoint(self):
+        if not self.checkpoint or not osp.exists(self.checkpoint):
+            return set()
+        with open(self.checkpoint, encoding='utf-8') as f:
+            return set(line.rstrip('\n') for line in f if line.strip())
+
+    def _write_checkpoint(self, image_path):
+        if not self.checkpoint:
+            return
+        with open(self.checkpoint, 'a', encoding='utf-8') as f:
+            f.write(image_path + '\n')
+
+    def _is_excluded(self, image_path):
+        with self.lock:
+            return image_path in self.exclude
+
+    def _label_file(self, image_path):
+        return imgFileToLabelFileName(image_path, self.output_dir)
+
+    def _is_annotated(self, image_path):
+        label_file = self._label_file(image_path)
+        if not osp.exists(label_file):
+            return False
+        try:
+            shapes = LabelFile.load_metadata(label_file)['shapes']
+        except Exception:
+            return False
+        return any(s['label'] == self.label for s in shapes)
+
+    def _open_images(self, image_paths, result, advance):
+        batch = []
+        for image_path in image_paths:
+            try:
+                img = Image.open(image_path)
+                img.load()
+            except Exception as e:
+                logger.error('Failed to read {}: {}'.format(image_path, e))
+                result['failed'].append(image_path)
+                advance(image_path)
+                continue
+            batch.append((image_path, img))
+        return batch
+
+    def _write_batch(self, pool, batch, future, result, advance):
+        image_paths = [image_path for image_path, _ in batch]
+        sizes = [img.size for _, img in batch]
+        try:
+            masks = self.ipm.masks_np(future.result())
+        except Exception as e:
+            logger.error('Failed to predict {}: {}'.format(image_paths, e))
+            result['failed'].extend(image_paths)
+            for image_path in image_paths:
+                advance(image_path)
+            return
+        finally:
+            for _, img in batch:
+                img.close()
+
+        args = (masks, sizes, [self.min_area] * len(masks))
+        if pool is None:
+            polygons = map(_get_polygons, *args)
+        else:
+            polygons = pool.map(_get_polygons, *args)
+        for image_path, size, points_list in zip(image_paths, sizes,
+                                                 polygons):
+            try:
+                with self.lock:
+                    excluded = image_path in self.exclude
+                    if points_list and not excluded:
+                        self._add_shapes(image_path, size, points_list)
+                if points_list and not excluded:
+                    result['annotated'].append(image_path)
+                else:
+                    result['skipped'].append(image_path)
+                if not excluded:
+                    # excluded images are annotated by the next run
+                    self._write_checkpoint(image_path)
+            except Exception as e:
+                logger.error('Failed to annotate {}: {}'.format(
+                    image_path, e))
+                result['failed'].append(image_path)
+            advance(image_path)
+
+    def _add_shapes(self, image_path, size, points_list):
+        label_file = self._label_file(image_path)
+        shapes = [
+            dict(label=self.label, points=points, group_id=None,
+                 shape_type='polygon', flags=dict(self.flags))
+            for points in points_list
+        ]
+        if osp.exists(label_file):
+            # merge into the file as is, keeping any embedded image data
+            with open(label_file, 'rb') as f:
+                data = json_codec.loads(f.read())
+            data.pop('version', None)
+            image_data = data.pop('imageData', None)
+            if image_data is not None:
+                image_data = base64.b64decode(image_data)
+            LabelFile().save(
+                label_file,
+                shapes=data.pop('shapes') + shapes,
+                imagePath=data.pop('imagePath'),
+                imageHeight=data.pop('imageHeight', None),
+                imageWidth=data.pop('imageWidth', None),
+                imageData=image_data,
+                flags=data.pop('flags', None),
+                otherData=data,
+                compact=self.compact,
+            )
+            return
+        dirname = osp.dirname(label_file)
+        if dirname and not osp.exists(dirname):
+            os.makedirs(dirname)
+        LabelFile().save(
+            label_file,
+            shapes=shapes,
+            imagePath=osp.relpath(image_path, dirname),
+            imageHeight=size[1],
+            imageWidth=size[0],
+            compact=self.compact,
+        )
@@ -5,32 +5,191 @@ Created on Wed Sep  2 11:02:17 2020
 @author: MHerzo
 """
 
+import base64
+import concurrent.futures
+import io
 import numpy as np
 import os
 from PIL import Image
 
-import googleapiclient.discovery
-
 from matplotlib import pyplot as plt
 
+from labelme import json_codec
 from labelme.user_extns import img_ml_util
 
 
+class RemoteBackend():
 
-class ImgPredMgr():
+    """Prediction endpoint of the segmentation model.
 
-    def __init__(self):
-        # Globals for automation (machine learning)
+    One HTTP session is kept for all requests, so connections are reused;
+    the default session authenticates with the Google application
+    credentials, ``session`` may be any requests.Session instead.
+    ``endpoint`` overrides the URL of the model (e.g. a local server).
+    Each batch is one request, with the images sent as:
+
+    - ``'list'``: nested lists of floats in [0, 1] (what the deployed model
+      accepts),
+    - ``'png'``: ``{'b64': <PNG of the resized image>}``,
+    - ``'float16'``: ``{'b64': <float16 array bytes>}``.
+    """
+
+    PAYLOADS = ('list', 'png', 'float16')
+
+    def __init__(self, endpoint=None, session=None, payload='list',
+                 timeout=60):
         # TODO Make parameters, or get from a config file/module
         self.CLOUD_PROJECT = 'tissue-defect-ui'
         self.MODEL = 'tissue_boundary'
         self.MODEL_VERSION = None
-        self.model_img_size = (224,224)
-        self.GOOGLE_APPLICATION_CREDENTIALS = r'm:\msa\cfg\cred\Tissue Defect UI-ML Svc Acct.json'
+        self.output_name = 'conv2d_transpose_output'
+        if payload not in self.PAYLOADS:
+            raise ValueError('Unsupported payload: {}'.format(payload))
+        self.endpoint = endpoint
+        self.payload = payload
+        self.timeout = timeout
+        self._session = session
+
+    @property
+    def url(self):
+        if self.endpoint:
+            return self.endpoint
+        name = 'projects/{}/models/{}'.format(self.CLOUD_PROJECT, self.MODEL)
+        if self.MODEL_VERSION is not None:
+            name += '/versions/{}'.format(self.MODEL_VERSION)
+        return 'https://ml.googleapis.com/v1/{}:predict'.format(name)
+
+    @property
+    def session(self):
+        if self._session is None:
+            import google.auth
+            from google.auth.transport.requests import AuthorizedSession
+
+            credentials, _ = google.auth.default(
+                scopes=['https://www.googleapis.com/auth/cloud-platform']
+            )
+            self._session = AuthorizedSession(credentials)
+        return self._session
+
+    # TODO Add logging and error handling - status messages
+    def predict_json(self, instances):
+        response = self.session.post(
+            self.url,
+            data=json_codec.dumps({'instances': instances}, compact=True),
+            headers={'Content-Type': 'application/json'},
+            timeout=self.timeout,
+        )
+        try:
+            response = json_codec.loads(response.content)
+        except ValueError:
+            response.raise_for_status()
+            raise
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+
+        return response['predictions']
+
+    def encode(self, batch):
+        """Return the instances of a float32 (N, H, W, C) batch."""
+        if self.payload == 'png':
+            instances = []
+            for img in np.rint(batch * 255).astype(np.uint8):
+                with io.BytesIO() as f:
+                    Image.fromarray(img.squeeze(-1) if img.shape[-1] == 1
+                                    else img).save(f, format='PNG')
+                    instances.append(
+                        {'b64': base64.b64encode(f.getvalue()).decode()})
+            return instances
+        if self.payload == 'float16':
+            return [{'b64': base64.b64encode(img.tobytes()).decode()}
+                    for img in batch.astype('<f2')]
+        # Without rounding, the .tolist() method creates a payload that
+        # is too large.  The array rounded must be float64, not float32.
+        # https://stackoverflow.com/questions/20454332/precision-of-numpy-array-lost-after-tolist
+        return np.around(batch.astype(np.float64), 4).tolist()
+
+    def predict(self, batch):
+        predictions = self.predict_json(self.encode(batch))
+        return np.asarray([p[self.output_name] for p in predictions],
+                          dtype=np.float32)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+class ModelBackend():
+
+    """In-process model, e.g. a Keras model loaded once.
+
+    ``model`` is called with the float32 (N, H, W, C) batch, or its
+    ``predict`` method is if it has one, and returns the class scores of
+    each pixel as (N, H', W', classes).
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, batch):
+        predict = getattr(self.model, 'predict', self.model)
+        return np.asarray(predict(batch))
+
+    def close(self):
+        pass
+
+
+class OnnxBackend(ModelBackend):
+
+    """ONNX model run on the CPU with ONNX Runtime.
+
+    The session is created on first use and kept for later predictions;
+    see ImgPredMgr.warmup().
+    """
+
+    def __init__(self, model_path, providers=('CPUExecutionProvider',)):
+        super(OnnxBackend, self).__init__(model=None)
+        self.model_path = model_path
+        self.providers = list(providers)
+
+    def predict(self, batch):
+        if self.model is None:
+            import onnxruntime
+
+            self.model = onnxruntime.InferenceSession(
+                self.model_path, providers=self.providers
+            )
+            self.input_name = self.model.get_inputs()[0].name
+        return self.model.run(None, {self.input_name: batch})[0]
+
+
+class ImgPredMgr():
+
+    """Predicts the masks of images with a backend (RemoteBackend default).
+
+    Images are resized to model_img_size and stacked into float32
+    (N, H, W, C) batches of at most ``batch_size`` images, each passed to
+    ``backend.predict``.  predict_imgs_async() runs on a worker thread.
+    """
+
+    def __init__(self, backend=None, batch_size=8):
+        # Globals for automation (machine learning)
+        self.model_img_size = (224, 224)
+        self.model_img_mode = 'RGB'
+        self.GOOGLE_APPLICATION_CREDENTIALS = \
+            r'm:\msa\cfg\cred\Tissue Defect UI-ML Svc Acct.json'
         self.cred_set = False
-        
+        if backend is None:
+            backend = RemoteBackend()
+        self.backend = backend
+        self.batch_size = batch_size
+        self.resized_images = []
+        self.predictions = []
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='ImgPredMgr'
+        )
+
         self.set_cred()
-        
+
     def set_cred(self, cred_path=None):
         if cred_path is None:
             cred_path = self.GOOGLE_APPLICATION_CREDENTIALS
@@ -38,55 +197,62 @@ class ImgPredMgr():
             os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = cred_path
             self.cred_set = True
 
-    
-    # TODO Add logging and error handling - status messages
-    def predict_json(self, instances):
-    
-        project=self.CLOUD_PROJECT
-        model=self.MODEL
-        version=self.MODEL_VERSION
-        
-        self.service = googleapiclient.discovery.build('ml', 'v1', cache_discovery=False, )
-        self.model_version_string = 'projects/{}/models/{}'.format(project, model)
-    
-        if version is not None:
-            self.model_version_string += '/versions/{}'.format(version)
-    
-        response = self.service.projects().predict(
-            name=self.model_version_string,
-            body={'instances': instances}
-        ).execute()
-    
-        if 'error' in response:
-            raise RuntimeError(response['error'])
-    
-        return response['predictions']
-    
-    
+    def preprocess(self, img_list):
+        """Return PIL images as a float32 (N, H, W, C) batch in [0, 1]."""
+        batch = np.stack([
+            np.asarray(
+                img.convert(self.model_img_mode)
+                .resize(self.model_img_size, Image.LANCZOS)
+            )
+            for img in img_list
+        ])
+        if batch.ndim == 3:
+            batch = batch[..., np.newaxis]
+        return np.multiply(batch, np.float32(1 / 255), dtype=np.float32)
+
     # Assume images in a PIL format
     def predict_imgs(self, img_list):
-        instances = []
-        self.resized_images = []
-        self.predictions = []
-        for img in img_list:
-            
-            img_resized = img.resize(self.model_img_size, Image.ANTIALIAS)        
-            img_resized_np = np.asarray(img_resized, dtype=np.float) 
-            
-            img_resized_np = img_resized_np / 255
-            self.resized_images.append(img_resized_np)
-            #display_img(img_resized_np)
-        
-            # Without rounding (or the equivalent), the .tolist() method creates a 
-            # payload that is too large.  However, the dtype of the array being 
-            # rounded must be float, not float32.
-            # https://stackoverflow.com/questions/20454332/precision-of-numpy-array-lost-after-tolist
-            img_rounded = np.around(img_resized_np, 4)
-            instances.append(img_rounded.tolist())
-        
-        # TODO Add logging and error handling
-        self.predictions = self.predict_json(instances)
-        return self.predictions    
+        self.resized_images, self.predictions = self._predict_imgs(img_list)
+        return self.predictions
+
+    def predict_imgs_async(self, img_list, done=None):
+        """Run predict_imgs(img_list) on the worker thread.
+
+        Returns a concurrent.futures.Future of the predictions.  When it is
+        done, resized_images and predictions are set and ``done(future)``
+        is called (on the worker thread).
+        """
+
+        def predict():
+            resized, predictions = self._predict_imgs(img_list)
+            self.resized_images, self.predictions = resized, predictions
+            return predictions
+
+        future = self._executor.submit(predict)
+        if done is not None:
+            future.add_done_callback(done)
+        return future
+
+    def warmup(self):
+        """Load the model on the worker thread with a blank batch."""
+        width, height = self.model_img_size
+        return self._executor.submit(self.backend.predict, self.preprocess(
+            [Image.new(self.model_img_mode, (width, height))]))
+
+    def _predict_imgs(self, img_list):
+        resized_images = []
+        predictions = []
+        for i in range(0, len(img_list), self.batch_size):
+            batch = self.preprocess(img_list[i:i + self.batch_size])
+            resized_images.extend(batch)
+            predictions.append(self.backend.predict(batch))
+        if not predictions:
+            return [], np.empty((0,), dtype=np.float32)
+        return resized_images, np.concatenate(predictions)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+        self.backend.close()
     
     
     # Utility functions
@@ -94,21 +260,19 @@ class ImgPredMgr():
         pred_np = np.argmax(pred_mask, axis=-1)
         #pred_np = pred_np[..., np.newaxis]  
         return pred_np 
-  
+
+    def masks_np(self, predictions):
+        if not len(predictions):
+            return []
+        return list(self.create_mask_np(predictions))
+
     @property
     def pred_masks(self):
-        pred_mask_list = []
-        for p in self.predictions:
-            pred_mask = np.array(p['conv2d_transpose_output'])
-            pred_mask_list.append(pred_mask)
-        return pred_mask_list
+        return list(self.predictions)
 
     @property
     def pred_masks_np(self):
-        pred_mask_np_list = []
-        for p in self.pred_masks:
-            pred_mask_np_list.append(self.create_mask_np(p))
-        return pred_mask_np_list
+        return self.masks_np(self.predictions)
 
 
 if __name__ == '__main__':
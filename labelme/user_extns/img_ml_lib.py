@@ -7,7 +7,6 @@ Created on Thu Sep  3 15:50:53 2020
 
 import cv2
 import numpy as np
-from shapely.geometry import Polygon
 
 # For testing
 from labelme import user_extns
@@ -95,58 +94,86 @@ def set_limits(ax, x0, xN, y0, yN):
 #---------------------------
 # Get polygon
 #
-# Use a class to store intermediate data such as edges and contours
+# Use a class to store intermediate data such as the cleaned mask and contours
 class MaskToPolygon():
-    def __init__(self, targ_size : (int,int) = None):
-        self.targ_size=targ_size
-        self.kernel = np.ones((10,10),np.uint8)
-        #self.simplification_limits = (1,2)
-        #self.simlification_len = 25  # Desired number of pixels between points of polygon
+
+    """Polygons of the regions of predicted masks.
+
+    The mask (nonzero: foreground) is closed and opened with an 11x11
+    kernel, then the external contours are ranked by cv2.contourArea.
+    get_polygon() returns the largest one; get_polygons() returns every
+    region of at least ``min_area`` pixels (of the mask).  Contours are
+    simplified with a tolerance of ``tolerance_ratio`` times their
+    perimeter, clipped to ``tolerance_limits``.  Points are (x, y) scaled
+    to targ_size (width, height), without repeating the first point.
+    """
+
+    def __init__(self, targ_size: (int, int) = None, min_area=0,
+                 tolerance_ratio=0.005, tolerance_limits=(1.0, 3.0)):
+        self.targ_size = targ_size
+        # odd, so that closing and opening do not shift the mask
+        self.kernel = np.ones((11, 11), np.uint8)
+        self.min_area = min_area
+        self.tolerance_ratio = tolerance_ratio
+        self.tolerance_limits = tolerance_limits
         
     def get_polygon(self, pred_mask, scale_points=True):
-      
+        polygons = self._get_polygons(pred_mask, scale_points, largest=True)
+        if not polygons:
+            return None
+        return polygons[0]
+
+    def get_polygons(self, pred_mask, scale_points=True):
+        return self._get_polygons(pred_mask, scale_points, largest=False)
+
+    def get_polygons_batch(self, pred_masks, scale_points=True):
+        """get_polygons() of each of pred_masks, e.g. of (N, H, W)."""
+        return [self.get_polygons(m, scale_points) for m in pred_masks]
+
+    def _get_polygons(self, pred_mask, scale_points, largest):
         if scale_points and self.targ_size is None:
-            print('ERROR:  point scaling was requested but no target size was provided')
-            raise ValueError
-            
+            raise ValueError(
+                'point scaling was requested but no target size was provided'
+            )
+
         self.pred_mask = pred_mask
-        
-        pred_mask_img = pred_mask.astype(np.uint8)
-        pred_closed = cv2.morphologyEx(pred_mask_img, cv2.MORPH_CLOSE, self.kernel)
-        pred_closed = cv2.morphologyEx(pred_closed, cv2.MORPH_OPEN, self.kernel)
-        # TODO Use hierarchy of Canny edges to get rid of interior edges:  https://stackoverflow.com/a/15867297/11262633
-        self.edges = cv2.Canny(pred_closed,0,1,L2gradient=True)
-      
-        # Convert to polygon, and simplify
-        # https://docs.opencv.org/trunk/d4/d73/tutorial_py_contours_begin.html
-        self.contours, self.hierarchy = cv2.findContours(self.edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-      
-        # Using cv2.RETR_EXTERNAL, take contour with the largest area.  E.g. 20200211-151331-Img.bmp
-        max_area = 0
-        self.polygon = None
-        for c in self.contours:
-            p = Polygon(c[:,0])
-            if p.area > max_area:
-                max_area = p.area
-                self.polygon = p
-                self.contour = c
-      
-        # Simplify
-        # TODO Set tolerance based on polygon length, with a min and max ratio
-        #polygon_len = self.polygon.length
-        #orig_num_pts = len(self.polygon.boundary.coords)
-        self.polygon_s = self.polygon.simplify(1.5)
-      
-        if scale_points:
-            scale_x = self.targ_size[0] / pred_mask.shape[0]
-            scale_y = self.targ_size[1] / pred_mask.shape[1]
-            self.scale_factor = (scale_x, scale_y)
-            self.polygon_s = affinity.scale(self.polygon_s, xfact=scale_x, yfact=scale_y, origin=(0,0))
-            #TODO Scale self.polygon and self.contour?
+        pred_mask_img = (np.asarray(pred_mask) != 0).astype(np.uint8)
+        pred_closed = cv2.morphologyEx(pred_mask_img, cv2.MORPH_CLOSE,
+                                       self.kernel)
+        self.pred_closed = cv2.morphologyEx(pred_closed, cv2.MORPH_OPEN,
+                                            self.kernel)
 
-        self.boundary_pts = self.polygon_s.boundary.coords
+        # https://docs.opencv.org/trunk/d4/d73/tutorial_py_contours_begin.html
+        self.contours, self.hierarchy = cv2.findContours(
+            self.pred_closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+        areas = np.array([cv2.contourArea(c) for c in self.contours])
+        # Largest first.  E.g. 20200211-151331-Img.bmp
+        order = np.argsort(-areas, kind='stable')
+        order = order[areas[order] >= max(self.min_area, 1e-9)]
+        if largest:
+            order = order[:1]
+        self.contour = self.contours[order[0]] if len(order) else None
 
-        return self.boundary_pts
+        if scale_points:
+            height, width = pred_mask_img.shape
+            self.scale_factor = np.array([self.targ_size[0] / width,
+                                          self.targ_size[1] / height])
+        polygons = []
+        for i in order:
+            contour = self.contours[i]
+            tolerance = np.clip(
+                self.tolerance_ratio * cv2.arcLength(contour, True),
+                *self.tolerance_limits
+            )
+            points = cv2.approxPolyDP(contour, tolerance, True)[:, 0]
+            points = points.astype(np.float64)
+            if scale_points:
+                points *= self.scale_factor
+            polygons.append(points)
+        self.boundary_pts = polygons[0] if polygons else None
+
+        return polygons
 
 
     def disp_imgs(self, in_img=None):
@@ -154,25 +181,24 @@ class MaskToPolygon():
         img_list = []
         if not in_img is None:
             # TODO Consolidate add_overlay and other utilities (also in gcp_lib.py)
-            img_with_edges = img_ml_util.add_overlay(in_img, self.edges)
-            img_list.append(img_with_edges)
+            img_with_mask = img_ml_util.add_overlay(in_img, self.pred_closed)
+            img_list.append(img_with_mask)
 
-        img = np.zeros(self.edges.shape)
+        img = np.zeros(self.pred_closed.shape)
         img = cv2.drawContours(img,[self.contour],0,1,1)
-        print(set(img.ravel()))
         img_list.append(img)
         
         img_ml_util.display(img_list)        
         
         fig = plt.figure(1, figsize=SIZE, dpi=90)
         ax = fig.add_subplot(121)
-        plot_coords(ax, self.polygon.boundary.coords)
+        ax.plot(*self.contour[:, 0].T, 'o', color=GRAY)
         plt.show()
-        print(f'# points in original polygon len={len(self.polygon.boundary.coords)}')
+        print(f'# points in original polygon len={len(self.contour)}')
 
         fig = plt.figure(1, figsize=SIZE, dpi=90)
         ax = fig.add_subplot(121)
-        plot_coords(ax, self.boundary_pts)
+        ax.plot(*self.boundary_pts.T, 'o', color=GRAY)
         plt.show()
         print(f'# points in final polygon len={len(self.boundary_pts)}')
     
@@ -0,0 +1,110 @@
+"""Render annotation masks and outlines without Qt.
+
+Shapes are the dicts stored in label files (LabelFile.shapes).  Masks are
+returned as numpy arrays, so the annot_export scripts can run without a
+QApplication, e.g. in worker processes on a Linux batch server.
+"""
+
+import os
+from os import path as osp
+
+import numpy as np
+from PIL import Image
+from PIL import ImageDraw
+
+from labelme import utils
+
+
+def get_img_shape(img_path):
+    # Only reads the header of the image
+    with Image.open(img_path) as img:
+        return img.height, img.width
+
+
+def shapes_to_mask(img_shape, shapes, value=255, mask=None):
+    """Fill shapes into a uint8 mask of size img_shape[:2].
+
+    Pixels covered by a shape are set to value.  If mask is given, shapes are
+    drawn into it instead of a new array.
+    """
+    if mask is None:
+        mask = np.zeros(img_shape[:2], dtype=np.uint8)
+    for shape in shapes:
+        roi = utils.shape_to_mask_roi(
+            mask.shape, shape['points'], shape.get('shape_type')
+        )
+        if roi is None:
+            continue
+        (y1, y2, x1, x2), roi_mask = roi
+        mask[y1:y2, x1:x2][roi_mask] = value
+    return mask
+
+
+def label_masks(img_shape, shapes, label_to_value=None, default_value=255):
+    """Return {label: mask} with all instances of a label in one mask.
+
+    The mask value of a label is label_to_value[label], or default_value
+    for labels that are not in label_to_value.
+    """
+    if label_to_value is None:
+        label_to_value = {}
+    shapes_by_label = {}
+    for shape in shapes:
+        shapes_by_label.setdefault(shape['label'], []).append(shape)
+    masks = {}
+    for label, label_shapes in shapes_by_label.items():
+        value = label_to_value.get(label, default_value)
+        masks[label] = shapes_to_mask(img_shape, label_shapes, value=value)
+    return masks
+
+
+def draw_outlines(img, shapes, colors, line_width=4):
+    """Return a copy of img (PIL image) with the outlines of shapes drawn.
+
+    colors maps a label to an RGB tuple.
+    """
+    img = img.convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for shape in shapes:
+        color = tuple(int(c) for c in colors[shape['label']])
+        xy = [tuple(pt) for pt in shape['points']]
+        shape_type = shape.get('shape_type')
+        if not xy:
+            continue
+        if shape_type in ['circle', 'point']:
+            cx, cy = xy[0]
+            if shape_type == 'circle' and len(xy) == 2:
+                px, py = xy[1]
+                r = max(((cx - px) ** 2 + (cy - py) ** 2) ** 0.5, 1)
+            else:
+                r = line_width
+            draw.ellipse(
+                [cx - r, cy - r, cx + r, cy + r],
+                outline=color, width=line_width,
+            )
+        elif shape_type == 'rectangle' and len(xy) == 2:
+            (x1, y1), (x2, y2) = xy
+            draw.rectangle(
+                [min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)],
+                outline=color, width=line_width,
+            )
+        else:
+            if shape_type not in ['line', 'linestrip']:
+                xy = xy + xy[:1]
+            draw.line(xy, fill=color, width=line_width, joint='curve')
+    return img
+
+
+def save_mask(path, mask, mode='L'):
+    """Save mask once as a PNG, creating the folder if needed.
+
+    mode='RGB' writes the value to all 3 channels, as masks painted on a
+    QPixmap were saved.
+    """
+    targ_dir = osp.dirname(path)
+    if targ_dir and not osp.exists(targ_dir):
+        os.makedirs(targ_dir, exist_ok=True)
+    img = Image.fromarray(mask)
+    if mode != img.mode:
+        img = img.convert(mode)
+    img.save(path)
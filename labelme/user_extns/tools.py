@@ -7,6 +7,7 @@ Created on Tue Feb 18 10:44:36 2020
 
 import labelme
 from labelme import user_extns
+from labelme.user_extns import mask_lib
 from labelme.shape import Shape
 from labelme import LabelFile
 
@@ -30,6 +31,8 @@ import numpy as np
 
 import tempfile
 import shutil
+import collections
+import concurrent.futures
 
 # https://www.sqlitetutorial.net/sqlite-python/sqlite-python-select/
 import sqlite3
@@ -187,44 +190,17 @@ def exportAnnotationsForImage(img_file, label_dir, export_folder):
         print(f'ERROR:  Label file {label_file} does not exist')
         return
     
-    labelFile = labelme.LabelFile(label_file)    
-    labels_to_export = set([shape['label'] for shape in labelFile.shapes])
-    print(f'labels_to_export={labels_to_export}')
-
-
-    pixmap_orig = QtGui.QPixmap(img_file)
-    pixmap_empty = QtGui.QPixmap(pixmap_orig.size())   # empty -- each point has value (0,0,0)
-    for label in labels_to_export:
-        shapes_to_export = [s for s in labelFile.shapes if s['label'] == label]
-        #print(f'shapes_to_export={shapes_to_export}')
-        print(f'# shapes_to_export for {label}={len(shapes_to_export)}')
-
-        pixmap = pixmap_empty.copy()
-        # Paint annotations
-        # TODO Centralize annotation painting logic -- it exists here and several other places (app.exportMasks, etc.).  Use util/shape_to_mask or examples/.../draw_json.py
-        p = QtGui.QPainter(pixmap)
-        for s in shapes_to_export:
-            s_obj = Shape(label=s['label'], shape_type=s['shape_type'],
-             flags=s['flags'], group_id=s['group_id'])
-            for pt in s['points']:
-                s_obj.addPoint(QtCore.QPointF(pt[0],pt[1]))
-            #s_obj.close = True
-            s_obj.fill = True
-            s_obj.point_size = 0
-            s_obj.paint(p)
-        p.end()
-        img_to_export = pixmap.toImage()
-        img_to_export.convertToFormat(QtGui.QImage.Format_Indexed8)
-        
+    labelFile = labelme.LabelFile(label_file, loadImage=False)
+    img_shape = mask_lib.get_img_shape(img_file)
+    masks = mask_lib.label_masks(img_shape, labelFile.shapes)
+    print(f'labels_to_export={set(masks)}')
+
+    for label, mask in masks.items():
         targ_file = export_basepath + f'_{label.replace("/","")}.png'
-        #TODO Move to PIL without saving to disk in order 
-        retcode = img_to_export.save(targ_file)
-        if not retcode:
-            print(f'ERROR Unable to export {targ_file}')
-            continue
-        img_tmp = PIL.Image.open(targ_file)
-        img_tmp = img_tmp.convert("L")
-        img_tmp.save(targ_file)    
+        try:
+            mask_lib.save_mask(targ_file, mask)
+        except OSError as e:
+            print(f'ERROR Unable to export {targ_file}: {e}')
 
     
     
@@ -284,28 +260,37 @@ def getAnnotDf(file_list, status_callback=None):
 
 class AnnotDf():
 
+    # Columns in the order of df_annot.  Flag columns are added after these.
+    COLUMNS = ['image_path',
+               'image_basename',
+               'annot_num',
+               'label',
+               'group_id',
+               'shape_obj']
+
     def __init__(self,
-                 status_callback=None):
+                 status_callback=None,
+                 max_workers=8):
         # Assume:
         #   - .json are in same directory as files in file_list
-        self.df_annot = pd.DataFrame(columns=['image_path',
-                                              'image_basename',
-                                              'annot_num',
-                                              'label',
-                                              'group_id',
-                                              'shape_obj'])
-        self.df_annot.astype({'image_path':str,
-                              'image_basename':str,
-                              'annot_num':int,
-                              'label':str,
-                              'group_id':int,
-                              'shape_obj':object})
+        #
+        # Rows are accumulated in one list per column and df_annot is built
+        # once, when it is first accessed after loading.  Growing a DataFrame
+        # with .loc[key, col] = ... copies it for each new row.
+        self._columns = {c: [] for c in self.COLUMNS}
+        self._num_rows = 0
+        # Index of the first row in self._columns (see iter_images(keep=False))
+        self._first_row = 0
+        self._df_annot = None
         # By default, run silently.
         # If status_callback = 'print', print the file name
         # Otherwise, pass a function that takes a string as a parameter
         #   e.g. def cb(msg):
         #           print(f'In callback.  msg={msg}')
         self.status_callback = status_callback
+        # Label files are read on a thread pool -- mostly waiting on the
+        # (network) file system
+        self.max_workers = max_workers
         
         # -------------------
         # Public data
@@ -325,9 +310,15 @@ class AnnotDf():
         else:
             return None
 
-    #def get_flag_value(self, flag_dict, flag_key):
-    #    return (flag_key in flag_dict and flag_dict[flag_key])
-    
+    @property
+    def df_annot(self):
+        if self._df_annot is None:
+            self._df_annot = self._get_df(self._first_row, self._num_rows)
+        return self._df_annot
+
+    def __len__(self):
+        return self._num_rows - self._first_row
+
     def stat_msg(self, msg):
         if self.status_callback and isinstance(self.status_callback, types.FunctionType):
             self.status_callback(msg)
@@ -335,49 +326,126 @@ class AnnotDf():
             print(msg)
 
     def load_files(self, files):
+        for _ in self._load_files(files):
+            pass
+
+    def iter_images(self, files, keep=True):
+        """Load files and yield (img_file, label_file, df) for each image.
+
+        df has the rows of the image, indexed like df_annot.  label_file is
+        the LabelFile, or None if the image has no label file.  With keep=False
+        rows are dropped after they are yielded, so memory use does not grow
+        with the number of images.
+        """
+        for img_file, label_file, start in self._load_files(files):
+            df = self._get_df(start, self._num_rows)
+            if not keep:
+                self._clear()
+            yield img_file, label_file, df
+
+    def _load_files(self, files):
         
         if isinstance(files,list):
             file_list = files
         else:
             file_list = [files]
-        
-        for img_file in file_list:
-            
-            #img_date = datetime.datetime.strptime(row[0].split(' ')[0],'%Y-%m-%d')
+
+        for img_file, label_file, records in self._read_files(file_list):
             self.stat_msg(f'File {img_file}.')
+            start = self._num_rows
             self.cur_image_path = img_file
-            label_file = user_extns.imgFileToLabelFileName(img_file, osp.dirname(img_file))
-            if not osp.exists(label_file):
-                self.load_shape(img_file)
-                #stat_msg(f'No label file {label_file} found for image file {img_file}.')
-                continue
-            self.cur_LabelFile = LabelFile(label_file, loadImage=False)    
-            #img_unique_labels = set([shape['label'] for shape in labelFile.shapes])
-            #print(f'File {img_file}.  img_unique_labels={img_unique_labels}')
-            self.load_shapes(img_file, self.cur_LabelFile.shapes)
+            self.cur_LabelFile = label_file
+            self._add_records(records)
+            yield img_file, label_file, start
+
+    def _read_files(self, file_list):
+        # Read ahead a limited number of files, so results are returned in
+        # order without holding all of them in memory
+        read_ahead = 4 * self.max_workers
+        with concurrent.futures.ThreadPoolExecutor(
+                self.max_workers) as executor:
+            futures = collections.deque()
+            for img_file in file_list:
+                futures.append(executor.submit(self._read_file, img_file))
+                if len(futures) > read_ahead:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+
+    @staticmethod
+    def _read_file(img_file):
+        label_file = user_extns.imgFileToLabelFileName(img_file,
+                                                       osp.dirname(img_file))
+        if not osp.exists(label_file):
+            return img_file, None, [AnnotDf._record(img_file)]
+        labelFile = LabelFile(label_file, loadImage=False)
+        records = [AnnotDf._record(img_file,
+                                   annot_num,
+                                   shape['label'],
+                                   shape['group_id'],
+                                   shape['flags'],
+                                   shape)
+                   for annot_num, shape in enumerate(labelFile.shapes, 1)]
+        if not records:
+            records = [AnnotDf._record(img_file)]
+        return img_file, labelFile, records
+
+    @staticmethod
+    def _record(img_file,
+                annot_num=0,
+                label=None,
+                group_id=None,
+                flag_dict=None,
+                shape_dict=None):
+        record = {'image_path': img_file,
+                  'image_basename': osp.basename(img_file),
+                  'annot_num': annot_num,
+                  'label': label,
+                  'group_id': group_id}
+        if flag_dict:
+            for flag in flag_dict:
+                # TODO Handle conflicts with existing columns - add a suffix?
+                record[flag.replace(' ', '_')] = flag_dict[flag]
+        record['shape_obj'] = shape_dict_to_obj(shape_dict)
+        return record
+
+    def _add_records(self, records):
+        for record in records:
+            num_rows = self._num_rows - self._first_row
+            for col, value in record.items():
+                if col not in self._columns:
+                    self._columns[col] = [None] * num_rows
+                self._columns[col].append(value)
+            self._num_rows += 1
+            for col_values in self._columns.values():
+                if len(col_values) == num_rows:
+                    col_values.append(None)
+        self.cur_key = self._num_rows - 1
+        self._df_annot = None
+
+    def _get_df(self, start, stop):
+        offset = self._first_row
+        return pd.DataFrame({col: col_values[start - offset:stop - offset]
+                             for col, col_values in self._columns.items()},
+                            index=pd.RangeIndex(start, stop))
+
+    def _clear(self):
+        self._columns = {c: [] for c in self._columns}
+        self._first_row = self._num_rows
+        self._df_annot = None
 
     def load_shapes(self,img_file, shape_list):
-        annot_num = 0
         self.cur_image_path = img_file
-        for shape in shape_list:
-            annot_num += 1 
-            flag_dict = shape['flags']
-            label = shape['label']
-            group_id = shape['group_id']
-            # not_in_picture = self.get_flag_value(flag_dict, 'Not in picture')
-            # not_in_tissue = self.get_flag_value(flag_dict, 'Not in tissue')
-            # review_recommended = self.get_flag_value(flag_dict, 'Review recommended')
-            # rework = self.get_flag_value(flag_dict, 'Rework')
-            self.load_shape(
-                       img_file,
-                       annot_num,
-                       label,
-                       group_id,
-                       flag_dict,
-                       shape)
-            #break
-        if annot_num == 0:
-            self.load_shape(img_file)
+        records = [self._record(img_file,
+                                annot_num,
+                                shape['label'],
+                                shape['group_id'],
+                                shape['flags'],
+                                shape)
+                   for annot_num, shape in enumerate(shape_list, 1)]
+        if not records:
+            records = [self._record(img_file)]
+        self._add_records(records)
 
     def load_shape(self,
                    img_file,
@@ -387,25 +455,13 @@ class AnnotDf():
                    flag_dict = None,
                    shape_dict=None):
         self.cur_image_path = img_file
-        self.cur_key = len(self.df_annot)
-        
-        key = self.cur_key
-        self.df_annot.loc[key, 'image_path'] = img_file
-        self.df_annot.loc[key, 'image_basename'] = self.cur_image_basename
-        self.df_annot.loc[key, 'annot_num'] = annot_num
-        self.df_annot.loc[key, 'label'] = label
-        self.df_annot.loc[key, 'group_id'] = group_id
-        if flag_dict:
-            for flag in flag_dict:
-                col_name = flag.replace(' ','_')
-                # No need to create columns.  Assignment via .loc[key,col] creates if needed
-                # TODO Handle conflicts with existing columns - add a suffix?
-                self.df_annot.loc[key, col_name] = flag_dict[flag]
-        shape_obj = shape_dict_to_obj(shape_dict)
-        self.df_annot.loc[key,'shape_obj'] = shape_obj
+        self._add_records([self._record(img_file, annot_num, label, group_id,
+                                        flag_dict, shape_dict)])
         
     def to_excel(self, excel_file_path):
-        self.df_annot.to_excel(excel_file_path, freeze_panes=(1,1), columns=[c for c in x.columns if not c in ['shape_obj']])
+        self.df_annot.to_excel(
+            excel_file_path, freeze_panes=(1, 1),
+            columns=[c for c in self.df_annot.columns if c != 'shape_obj'])
     
 def get_colormap():
     # TODO Make pythonic - remove hardcodes and reduce back and forth between lists and numpy arrays
@@ -432,7 +488,7 @@ def shape_dict_to_obj(shape_dict):
                   shape_type = shape_dict['shape_type'],
                   flags = shape_dict['flags'], 
                   group_id = shape_dict['group_id'])
-    s_obj.points = [QtCore.QPointF(pt[0],pt[1]) for pt in shape_dict['points']]
+    s_obj.points = shape_dict['points']
     return s_obj
 
     
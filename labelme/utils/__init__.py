@@ -7,13 +7,17 @@ from .image import img_arr_to_b64
 from .image import img_b64_to_arr
 from .image import img_data_to_arr
 from .image import img_data_to_png_data
+from .image import img_data_to_shape
 
 from .shape import labelme_shapes_to_label
 from .shape import masks_to_bboxes
 from .shape import polygons_to_mask
 from .shape import shape_to_mask
+from .shape import shape_to_mask_roi
 from .shape import shapes_to_label
 
+from .spatial_index import GridIndex
+
 from .qt import newIcon
 from .qt import newButton
 from .qt import newAction
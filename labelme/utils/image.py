@@ -14,6 +14,13 @@ def img_data_to_arr(img_data):
     return img_arr
 
 
+def img_data_to_shape(img_data):
+    """Return (height, width) of encoded image data from its header only."""
+    with io.BytesIO(img_data) as f:
+        img_pil = PIL.Image.open(f)
+        return img_pil.height, img_pil.width
+
+
 def img_b64_to_arr(img_b64):
     img_data = base64.b64decode(img_b64)
     img_arr = img_data_to_arr(img_data)
@@ -16,18 +16,30 @@ def polygons_to_mask(img_shape, polygons, shape_type=None):
     return shape_to_mask(img_shape, points=polygons, shape_type=shape_type)
 
 
-def shape_to_mask(img_shape, points, shape_type=None,
-                  line_width=10, point_size=5):
-    mask = np.zeros(img_shape[:2], dtype=np.uint8)
-    mask = PIL.Image.fromarray(mask)
-    draw = PIL.ImageDraw.Draw(mask)
-    xy = [tuple(point) for point in points]
+def _draw_shape(draw, xy, shape_type, line_width, point_size, y_offset=0):
+    # y_offset is subtracted after the geometry is computed so that the
+    # result is the same as drawing at the original position.
     if shape_type == 'circle':
         assert len(xy) == 2, 'Shape of shape_type=circle must have 2 points'
         (cx, cy), (px, py) = xy
         d = math.sqrt((cx - px) ** 2 + (cy - py) ** 2)
-        draw.ellipse([cx - d, cy - d, cx + d, cy + d], outline=1, fill=1)
-    elif shape_type == 'rectangle':
+        draw.ellipse(
+            [cx - d, cy - d - y_offset, cx + d, cy + d - y_offset],
+            outline=1, fill=1,
+        )
+        return
+    if shape_type == 'point':
+        assert len(xy) == 1, 'Shape of shape_type=point must have 1 points'
+        cx, cy = xy[0]
+        r = point_size
+        draw.ellipse(
+            [cx - r, cy - r - y_offset, cx + r, cy + r - y_offset],
+            outline=1, fill=1,
+        )
+        return
+    if y_offset:
+        xy = [(x, y - y_offset) for x, y in xy]
+    if shape_type == 'rectangle':
         assert len(xy) == 2, 'Shape of shape_type=rectangle must have 2 points'
         draw.rectangle(xy, outline=1, fill=1)
     elif shape_type == 'line':
@@ -35,22 +47,65 @@ def shape_to_mask(img_shape, points, shape_type=None,
         draw.line(xy=xy, fill=1, width=line_width)
     elif shape_type == 'linestrip':
         draw.line(xy=xy, fill=1, width=line_width)
-    elif shape_type == 'point':
-        assert len(xy) == 1, 'Shape of shape_type=point must have 1 points'
-        cx, cy = xy[0]
-        r = point_size
-        draw.ellipse([cx - r, cy - r, cx + r, cy + r], outline=1, fill=1)
     else:
         assert len(xy) > 2, 'Polygon must have points more than 2'
         draw.polygon(xy=xy, outline=1, fill=1)
-    mask = np.array(mask, dtype=bool)
+
+
+def shape_to_mask_roi(img_shape, points, shape_type=None,
+                      line_width=10, point_size=5):
+    """Rasterize a shape only around its bounding box.
+
+    Returns ``((y1, y2, x1, x2), mask)`` with mask covering
+    ``[y1:y2, x1:x2]`` of the image, or None if the shape is outside.
+    """
+    height, width = img_shape[:2]
+    xy = [tuple(point) for point in points]
+    x1 = y1 = x2 = y2 = 0
+    if xy:
+        xs = [p[0] for p in xy]
+        ys = [p[1] for p in xy]
+        if shape_type == 'circle' and len(xy) == 2:
+            (cx, cy), (px, py) = xy
+            d = math.sqrt((cx - px) ** 2 + (cy - py) ** 2)
+            xs, ys = [cx - d, cx + d], [cy - d, cy + d]
+        margin = line_width + point_size + 2
+        x1 = max(int(math.floor(min(xs) - margin)), 0)
+        y1 = max(int(math.floor(min(ys) - margin)), 0)
+        x2 = min(int(math.ceil(max(xs) + margin)) + 1, width)
+        y2 = min(int(math.ceil(max(ys) + margin)) + 1, height)
+    if x1 >= x2 or y1 >= y2:
+        # still validate the number of points like a full-size draw would
+        draw = PIL.ImageDraw.Draw(PIL.Image.new('L', (1, 1)))
+        _draw_shape(draw, xy, shape_type, line_width, point_size)
+        return None
+
+    # PIL's scanline math is not invariant to shifting x by an integer (the
+    # rounding of edge intersections depends on their magnitude), so only
+    # rows are cropped while drawing and columns are cropped afterwards.
+    mask = PIL.Image.new('L', (x2, y2 - y1))
+    draw = PIL.ImageDraw.Draw(mask)
+    _draw_shape(draw, xy, shape_type, line_width, point_size, y_offset=y1)
+    mask = np.array(mask, dtype=bool)[:, x1:]
+    return (y1, y2, x1, x2), mask
+
+
+def shape_to_mask(img_shape, points, shape_type=None,
+                  line_width=10, point_size=5):
+    mask = np.zeros(img_shape[:2], dtype=bool)
+    roi = shape_to_mask_roi(
+        img_shape, points, shape_type, line_width, point_size
+    )
+    if roi is not None:
+        (y1, y2, x1, x2), roi_mask = roi
+        mask[y1:y2, x1:x2] = roi_mask
     return mask
 
 
 def shapes_to_label(img_shape, shapes, label_name_to_value):
     cls = np.zeros(img_shape[:2], dtype=np.int32)
     ins = np.zeros_like(cls)
-    instances = []
+    instances = {}
     for shape in shapes:
         points = shape['points']
         label = shape['label']
@@ -62,14 +117,15 @@ def shapes_to_label(img_shape, shapes, label_name_to_value):
         cls_name = label
         instance = (cls_name, group_id)
 
-        if instance not in instances:
-            instances.append(instance)
-        ins_id = instances.index(instance) + 1
+        ins_id = instances.setdefault(instance, len(instances) + 1)
         cls_id = label_name_to_value[cls_name]
 
-        mask = shape_to_mask(img_shape[:2], points, shape_type)
-        cls[mask] = cls_id
-        ins[mask] = ins_id
+        roi = shape_to_mask_roi(img_shape[:2], points, shape_type)
+        if roi is None:
+            continue
+        (y1, y2, x1, x2), mask = roi
+        cls[y1:y2, x1:x2][mask] = cls_id
+        ins[y1:y2, x1:x2][mask] = ins_id
 
     return cls, ins
 
@@ -0,0 +1,97 @@
+import collections
+import math
+
+
+class GridIndex(object):
+
+    """Uniform grid over the bounding boxes (x1, y1, x2, y2) of items.
+
+    query() returns the items whose box intersects the given box by looking
+    at the few cells it covers instead of at every item.  Items covering
+    more than max_cells cells are kept in a separate list that is returned
+    by every query.
+    """
+
+    def __init__(self, cell_size=128, max_cells=1024):
+        self.cell_size = float(cell_size)
+        self.max_cells = max_cells
+        self._cells = collections.defaultdict(set)
+        self._large = set()
+        self._items = {}  # item: (bbox, cells)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def _cellRange(self, bbox):
+        x1, y1, x2, y2 = bbox
+        size = self.cell_size
+        return (
+            int(math.floor(x1 / size)), int(math.floor(y1 / size)),
+            int(math.floor(x2 / size)), int(math.floor(y2 / size)),
+        )
+
+    def _cellsOf(self, bbox):
+        i1, j1, i2, j2 = self._cellRange(bbox)
+        if (i2 - i1 + 1) * (j2 - j1 + 1) > self.max_cells:
+            return None
+        return [(i, j) for i in range(i1, i2 + 1) for j in range(j1, j2 + 1)]
+
+    def bbox(self, item):
+        return self._items[item][0]
+
+    def insert(self, item, bbox):
+        """Add item, or move it if it is already indexed."""
+        self.remove(item)
+        cells = self._cellsOf(bbox)
+        if cells is None:
+            self._large.add(item)
+        else:
+            for cell in cells:
+                self._cells[cell].add(item)
+        self._items[item] = (tuple(bbox), cells)
+
+    def remove(self, item):
+        entry = self._items.pop(item, None)
+        if entry is None:
+            return
+        cells = entry[1]
+        if cells is None:
+            self._large.discard(item)
+            return
+        for cell in cells:
+            bucket = self._cells[cell]
+            bucket.discard(item)
+            if not bucket:
+                del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._large.clear()
+        self._items.clear()
+
+    def query(self, bbox):
+        """Return the set of items whose box intersects bbox."""
+        x1, y1, x2, y2 = bbox
+        i1, j1, i2, j2 = self._cellRange(bbox)
+        candidates = set(self._large)
+        if (i2 - i1 + 1) * (j2 - j1 + 1) > len(self._cells):
+            for bucket in self._cells.values():
+                candidates.update(bucket)
+        else:
+            for i in range(i1, i2 + 1):
+                for j in range(j1, j2 + 1):
+                    bucket = self._cells.get((i, j))
+                    if bucket:
+                        candidates.update(bucket)
+        items = set()
+        for item in candidates:
+            bx1, by1, bx2, by2 = self._items[item][0]
+            if bx1 <= x2 and x1 <= bx2 and by1 <= y2 and y1 <= by2:
+                items.add(item)
+        return items
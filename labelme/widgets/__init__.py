@@ -4,6 +4,8 @@ from .canvas import Canvas
 
 from .color_dialog import ColorDialog
 
+from .file_list_widget import FileListWidget
+
 from .label_dialog import LabelDialog
 from .label_dialog import LabelQLineEdit
 
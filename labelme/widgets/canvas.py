@@ -1,9 +1,17 @@
+import collections
+import math
+import time
+
 from qtpy import QtCore
 from qtpy import QtGui
 from qtpy import QtWidgets
 
 from labelme import QT5
+from labelme.lazy_image import LazyImage
+from labelme.logger import logger
 from labelme.shape import Shape
+from labelme.shape_history import ShapeHistory
+from labelme.tile_pyramid import TilePyramid
 import labelme.utils
 
 
@@ -39,6 +47,13 @@ class Canvas(QtWidgets.QWidget):
     def __init__(self, *args, **kwargs):
         self.epsilon = kwargs.pop('epsilon', 10.0)
         self.double_click = kwargs.pop('double_click', 'close')
+        # Images with at least this many pixels are drawn from a pyramid of
+        # downscaled tiles when zoomed out.
+        self.tile_pyramid_megapixels = kwargs.pop(
+            'tile_pyramid_megapixels', 16
+        )
+        self.tile_cache_mb = kwargs.pop('tile_cache_mb', 256)
+        undo_memory_mb = kwargs.pop('undo_memory_mb', 64)
         if self.double_click not in [None, 'close']:
             raise ValueError(
                 'Unexpected value for double_click event: {}'
@@ -48,7 +63,12 @@ class Canvas(QtWidgets.QWidget):
         # Initialise local state.
         self.mode = self.EDIT
         self.shapes = []
-        self.shapesBackups = []
+        # Spatial index of self.shapes for hit-testing, see shapesAt()
+        self._shapeIndex = labelme.utils.GridIndex()
+        self._shapeVersions = {}
+        self._shapeOrder = {}
+        # Deltas of self.shapes recorded by storeShapes()
+        self.shapesHistory = ShapeHistory(max_bytes=undo_memory_mb * 2 ** 20)
         self.current = None
         self.selectedShapes = []  # save the selected shapes here
         self.selectedShapesCopy = []
@@ -63,6 +83,11 @@ class Canvas(QtWidgets.QWidget):
         self.offsets = QtCore.QPoint(), QtCore.QPoint()
         self.scale = 1.0
         self.pixmap = QtGui.QPixmap()
+        self._pyramid = None
+        self._tileTimer = QtCore.QTimer(self)
+        self._tileTimer.setSingleShot(True)
+        self._tileTimer.setInterval(50)
+        self._tileTimer.timeout.connect(self.update)
         self.visible = {}
         self._hideBackround = False
         self.hideBackround = False
@@ -74,6 +99,10 @@ class Canvas(QtWidgets.QWidget):
         self.prevhEdge = None
         self.movingShape = False
         self._painter = QtGui.QPainter()
+        # Counters updated by paintEvent, see paintStatsReport()
+        self.paintStats = collections.Counter()
+        self.paintStatsInterval = 100
+        self.lastFrameTime = 0.0
         self._cursor = CURSOR_DEFAULT
         # Menus:
         # 0: right-click without selection and dragging of shapes
@@ -100,30 +129,36 @@ class Canvas(QtWidgets.QWidget):
             raise ValueError('Unsupported createMode: %s' % value)
         self._createMode = value
 
-    def storeShapes(self):
-        shapesBackup = []
-        for shape in self.shapes:
-            shapesBackup.append(shape.copy())
-        if len(self.shapesBackups) >= 10:
-            self.shapesBackups = self.shapesBackups[-9:]
-        self.shapesBackups.append(shapesBackup)
+    def storeShapes(self, amend=False):
+        """Record the changes made to self.shapes as one undo step."""
+        self.shapesHistory.commit(self.shapes, amend=amend)
+
+    def dropLastStoredShapes(self):
+        """Forget the last undo step, whose changes were reverted."""
+        self.shapesHistory.dropLast()
 
     @property
     def isShapeRestorable(self):
-        if len(self.shapesBackups) < 2:
-            return False
-        return True
+        return self.shapesHistory.canUndo()
+
+    @property
+    def isShapeRedoable(self):
+        return self.shapesHistory.canRedo()
 
     def restoreShape(self):
-        if not self.isShapeRestorable:
-            return
-        self.shapesBackups.pop()  # latest
-        shapesBackup = self.shapesBackups.pop()
-        self.shapes = shapesBackup
+        if self.shapesHistory.undo(self.shapes):
+            self._afterHistoryChange()
+
+    def redoShape(self):
+        if self.shapesHistory.redo(self.shapes):
+            self._afterHistoryChange()
+
+    def _afterHistoryChange(self):
         self.selectedShapes = []
         for shape in self.shapes:
             shape.selected = False
-        self.repaint()
+        self.hShape = self.hVertex = self.hEdge = None
+        self.update()
 
     def enterEvent(self, ev):
         self.overrideCursor(self._cursor)
@@ -153,7 +188,7 @@ class Canvas(QtWidgets.QWidget):
     def unHighlight(self):
         if self.hShape:
             self.hShape.highlightClear()
-            self.update()
+            self.update(self.shapesRect([self.hShape]))
         self.prevhShape = self.hShape
         self.prevhVertex = self.hVertex
         self.prevhEdge = self.hEdge
@@ -186,6 +221,7 @@ class Canvas(QtWidgets.QWidget):
                 return
                 
             self.overrideCursor(CURSOR_DRAW)
+            dirty = self.shapesRect([self.current, self.line])
 
             if self.outOfPixmap(pos):
                 # Don't allow the user to draw outside the pixmap.
@@ -213,7 +249,9 @@ class Canvas(QtWidgets.QWidget):
             elif self.createMode == 'point':
                 self.line.points = [self.current[0]]
                 self.line.close()
-            self.repaint()
+            self.update(
+                dirty.united(self.shapesRect([self.current, self.line]))
+            )
             self.current.highlightClear()
             return
 
@@ -223,12 +261,14 @@ class Canvas(QtWidgets.QWidget):
                 return
             if self.selectedShapesCopy and self.prevPoint:
                 self.overrideCursor(CURSOR_MOVE)
-                self.boundedMoveShapes(self.selectedShapesCopy, pos)
-                self.repaint()
+                self.updateShapes(
+                    self.selectedShapesCopy,
+                    self.boundedMoveShapes, self.selectedShapesCopy, pos,
+                )
             elif self.selectedShapes:
                 self.selectedShapesCopy = \
                     [s.copy() for s in self.selectedShapes]
-                self.repaint()
+                self.update(self.shapesRect(self.selectedShapesCopy))
             return
 
         # Polygon/Vertex moving.
@@ -236,15 +276,18 @@ class Canvas(QtWidgets.QWidget):
             if self.selectedVertex():
                 if self.shapeIsLocked(self.hShape):
                     return
-                self.boundedMoveVertex(pos)
-                self.repaint()
+                self.updateShapes(
+                    [self.hShape], self.boundedMoveVertex, pos
+                )
                 self.movingShape = True
             elif self.selectedShapes and self.prevPoint:
                 if sum([self.shapeIsLocked(s) for s in self.selectedShapes]) > 0:
                     return
                 self.overrideCursor(CURSOR_MOVE)
-                self.boundedMoveShapes(self.selectedShapes, pos)
-                self.repaint()
+                self.updateShapes(
+                    self.selectedShapes,
+                    self.boundedMoveShapes, self.selectedShapes, pos,
+                )
                 self.movingShape = True
             return
 
@@ -253,11 +296,13 @@ class Canvas(QtWidgets.QWidget):
         # - Highlight vertex
         # Update shape/vertex fill and tooltip value accordingly.
         self.setToolTip(self.tr("Image"))
-        for shape in reversed([s for s in self.shapes if self.isVisible(s)]):
+        dirty = self.shapesRect([self.hShape])
+        epsilon = self.epsilon / self.scale
+        for shape in self.shapesAt(pos, epsilon):
             # Look for a nearby vertex to highlight. If that fails,
             # check if we happen to be inside a shape.
-            index = shape.nearestVertex(pos, self.epsilon / self.scale)
-            index_edge = shape.nearestEdge(pos, self.epsilon / self.scale)
+            index = shape.nearestVertex(pos, epsilon)
+            index_edge = shape.nearestEdge(pos, epsilon)
             if index is not None:
                 if self.selectedVertex():
                     self.hShape.highlightClear()
@@ -273,7 +318,7 @@ class Canvas(QtWidgets.QWidget):
                     tool_tip = status_tip
                 self.setToolTip(tool_tip)
                 self.setStatusTip(status_tip)
-                self.update()
+                self.update(dirty.united(self.shapesRect([shape])))
                 break
             elif shape.containsPoint(pos):
                 if self.selectedVertex():
@@ -291,7 +336,7 @@ class Canvas(QtWidgets.QWidget):
                 self.setStatusTip(status_tip)
                 if not self.shapeIsLocked(shape):
                     self.overrideCursor(CURSOR_GRAB)
-                self.update()
+                self.update(dirty.united(self.shapesRect([shape])))
                 break
         else:  # Nothing found, clear highlights, reset state.
             self.unHighlight()
@@ -386,9 +431,7 @@ class Canvas(QtWidgets.QWidget):
             self.overrideCursor(CURSOR_GRAB)
 
         if self.movingShape and self.hShape:
-            index = self.shapes.index(self.hShape)
-            if (self.shapesBackups[-1][index].points !=
-                    self.shapes[index].points):
+            if self.shapesHistory.isModified(self.hShape):
                 self.storeShapes()
                 self.shapeMoved.emit()
 
@@ -437,14 +480,84 @@ class Canvas(QtWidgets.QWidget):
         self.selectionChanged.emit(shapes)
         self.update()
 
+    def _syncShapeIndex(self):
+        # self.shapes is also modified directly by the app, so compare with
+        # the indexed versions instead of hooking every change.
+        index = self._shapeIndex
+        versions = self._shapeVersions
+        order = {}
+        for i, shape in enumerate(self.shapes):
+            order[shape] = i
+            if versions.get(shape) == shape.version:
+                continue
+            versions[shape] = shape.version
+            bbox = shape.boundingBox()
+            if bbox is None:
+                index.remove(shape)
+            else:
+                index.insert(shape, bbox)
+        if len(order) != len(versions):
+            for shape in list(versions):
+                if shape not in order:
+                    del versions[shape]
+                    index.remove(shape)
+        self._shapeOrder = order
+
+    def paintMargin(self):
+        # Widget pixels painted outside of a shape's bounding box: half of
+        # a highlighted vertex (up to 4 x point_size), the pen and
+        # antialiasing.
+        return int(math.ceil(Shape.point_size * 2)) + 4
+
+    def shapesRect(self, shapes):
+        """Return the widget area painted for shapes (None are skipped)."""
+        boxes = [s.boundingBox() for s in shapes if s is not None]
+        boxes = [b for b in boxes if b is not None]
+        if not boxes:
+            return QtCore.QRect()
+        x1 = min(b[0] for b in boxes)
+        y1 = min(b[1] for b in boxes)
+        x2 = max(b[2] for b in boxes)
+        y2 = max(b[3] for b in boxes)
+        s = self.scale
+        offset = self.offsetToCenter()
+        rect = QtCore.QRectF(
+            QtCore.QPointF((x1 + offset.x()) * s, (y1 + offset.y()) * s),
+            QtCore.QPointF((x2 + offset.x()) * s, (y2 + offset.y()) * s),
+        ).toAlignedRect()
+        margin = self.paintMargin()
+        return rect.adjusted(-margin, -margin, margin, margin)
+
+    def updateShapes(self, shapes, edit, *args):
+        """Call edit(*args) and schedule a repaint of the area covered by
+        shapes before and after the edit."""
+        dirty = self.shapesRect(shapes)
+        result = edit(*args)
+        self.update(dirty.united(self.shapesRect(shapes)))
+        return result
+
+    def shapesAt(self, point, epsilon=0):
+        """Return the visible shapes whose bounding box is within epsilon
+        of point, topmost (last drawn) first."""
+        self._syncShapeIndex()
+        x, y = point.x(), point.y()
+        shapes = self._shapeIndex.query(
+            (x - epsilon, y - epsilon, x + epsilon, y + epsilon)
+        )
+        order = self._shapeOrder
+        return [
+            s for s in sorted(shapes, key=order.get, reverse=True)
+            if self.isVisible(s)
+        ]
+
     def selectShapePoint(self, point, multiple_selection_mode):
         """Select the first shape created which contains this point."""
         if self.selectedVertex():  # A vertex is marked for selection.
             index, shape = self.hVertex, self.hShape
             shape.highlightVertex(index, shape.MOVE_VERTEX)
         else:
-            for shape in reversed(self.shapes):
-                if self.isVisible(shape) and shape.containsPoint(point):
+            for shape in self.shapesAt(point):
+                if shape.containsPoint(point):
                     self.calculateOffsets(shape, point)
                     self.setHiding()
                     if multiple_selection_mode:
@@ -532,6 +645,10 @@ class Canvas(QtWidgets.QWidget):
         if not self.pixmap:
             return super(Canvas, self).paintEvent(event)
 
+        t_start = time.perf_counter()
+        path_stats = Shape.path_cache_stats
+        hits, misses = path_stats['hits'], path_stats['misses']
+
         p = self._painter
         p.begin(self)
         p.setRenderHint(QtGui.QPainter.Antialiasing)
@@ -539,15 +656,39 @@ class Canvas(QtWidgets.QWidget):
         p.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
 
         p.scale(self.scale, self.scale)
-        p.translate(self.offsetToCenter())
-
-        p.drawPixmap(0, 0, self.pixmap)
+        offset = self.offsetToCenter()
+        p.translate(offset)
+
+        # Only draw what is exposed, e.g. the visible part of the image when
+        # zoomed in or the area of an edited shape.
+        exposed = event.rect()
+        scale = self.scale
+        margin = self.paintMargin() / scale
+        x1 = exposed.left() / scale - offset.x()
+        y1 = exposed.top() / scale - offset.y()
+        x2 = (exposed.right() + 1) / scale - offset.x()
+        y2 = (exposed.bottom() + 1) / scale - offset.y()
+        source = QtCore.QRectF(
+            QtCore.QPointF(x1, y1), QtCore.QPointF(x2, y2)
+        ).toAlignedRect().intersected(self.pixmap.rect())
+        if not self.drawTiles(p, source):
+            p.drawPixmap(source.topLeft(), self.pixmap, source)
+
+        self._syncShapeIndex()
+        in_view = self._shapeIndex.query(
+            (x1 - margin, y1 - margin, x2 + margin, y2 + margin)
+        )
+        painted = culled = 0
         Shape.scale = self.scale
         for shape in self.shapes:
             if (shape.selected or not self._hideBackround) and \
                     self.isVisible(shape):
+                if shape not in in_view:
+                    culled += 1
+                    continue
                 shape.fill = shape.selected or shape == self.hShape
                 shape.paint(p)
+                painted += 1
         if self.current:
             self.current.paint(p)
             self.line.paint(p)
@@ -565,6 +706,93 @@ class Canvas(QtWidgets.QWidget):
 
         p.end()
 
+        frame_time = time.perf_counter() - t_start
+        stats = self.paintStats
+        stats['paints'] += 1
+        stats['frame_time'] += frame_time
+        stats['max_frame_time'] = max(stats['max_frame_time'], frame_time)
+        stats['shapes_painted'] += painted
+        stats['shapes_culled'] += culled
+        stats['path_hits'] += path_stats['hits'] - hits
+        stats['path_misses'] += path_stats['misses'] - misses
+        self.lastFrameTime = frame_time
+        if stats['paints'] % self.paintStatsInterval == 0:
+            logger.debug('Canvas paint stats: {}'.format(
+                self.paintStatsReport()))
+
+    def drawTiles(self, painter, rect):
+        """Draw rect of the image from the tile pyramid.
+
+        Returns False if the image should be drawn from the pixmap, i.e.
+        there is no pyramid or the zoom is too large for downscaled tiles
+        of an image that is not lazy.
+        """
+        pyramid = self._pyramid
+        if pyramid is None:
+            return False
+        level = pyramid.level(self.scale)
+        if level == 0 and not pyramid.lazy:
+            return False
+        keys = pyramid.tiles(level, rect)
+        missing = []
+        for key in keys:
+            target = pyramid.tileRect(key)
+            tile = pyramid.tile(key)
+            if tile is None:
+                # not rendered yet, draw it from a coarser tile or once
+                # from the full resolution
+                missing.append(key)
+                self._drawMissingTile(painter, pyramid, key)
+            else:
+                painter.drawImage(QtCore.QRectF(target), tile)
+        if missing:
+            pyramid.prefetch(missing)
+            self._tileTimer.start()
+        self.paintStats['tiles_drawn'] += len(keys) - len(missing)
+        self.paintStats['tiles_missing'] += len(missing)
+        return True
+
+    def _drawMissingTile(self, painter, pyramid, key):
+        level, tx, ty = key
+        target = pyramid.tileRect(key)
+        for parent_level in range(level + 1, pyramid.num_levels):
+            n = 2 ** (parent_level - level)
+            parent_key = (parent_level, tx // n, ty // n)
+            parent = pyramid.tile(parent_key)
+            if parent is None:
+                continue
+            origin = pyramid.tileRect(parent_key).topLeft()
+            factor = 2.0 ** parent_level
+            source = QtCore.QRectF(
+                (target.x() - origin.x()) / factor,
+                (target.y() - origin.y()) / factor,
+                target.width() / factor,
+                target.height() / factor,
+            )
+            painter.drawImage(QtCore.QRectF(target), parent, source)
+            return
+        if not pyramid.lazy:
+            painter.drawPixmap(target.topLeft(), self.pixmap, target)
+
+    def paintStatsReport(self):
+        stats = self.paintStats
+        paints = stats['paints']
+        lookups = stats['path_hits'] + stats['path_misses']
+        mean_frame_time = stats['frame_time'] / paints if paints else 0.0
+        return dict(
+            paints=paints,
+            mean_frame_ms=1000 * mean_frame_time,
+            max_frame_ms=1000 * stats['max_frame_time'],
+            last_frame_ms=1000 * self.lastFrameTime,
+            shapes_painted=stats['shapes_painted'],
+            shapes_culled=stats['shapes_culled'],
+            tiles_drawn=stats['tiles_drawn'],
+            tiles_missing=stats['tiles_missing'],
+            path_hits=stats['path_hits'],
+            path_misses=stats['path_misses'],
+            path_hit_rate=stats['path_hits'] / lookups if lookups else 0.0,
+        )
+
     def transformPos(self, point):
         """Convert from widget-logical coordinates to painter-logical ones."""
         return point / self.scale - self.offsetToCenter()
@@ -703,8 +931,7 @@ class Canvas(QtWidgets.QWidget):
         assert text
         self.shapes[-1].label = text
         self.shapes[-1].flags = flags
-        self.shapesBackups.pop()
-        self.storeShapes()
+        self.storeShapes(amend=True)
         return self.shapes[-1]
 
     def undoLastLine(self):
@@ -730,8 +957,26 @@ class Canvas(QtWidgets.QWidget):
             self.drawingPolygon.emit(False)
         self.repaint()
 
-    def loadPixmap(self, pixmap):
+    def loadPixmap(self, pixmap, image=None):
+        """Load pixmap; pass its QImage to enable the tile pyramid.
+
+        pixmap may also be a LazyImage, which is then only drawn from
+        tiles decoded for the visible area.
+        """
         self.pixmap = pixmap
+        if self._pyramid is not None:
+            self._pyramid.shutdown()
+            self._pyramid = None
+        if isinstance(pixmap, LazyImage):
+            image = pixmap
+        if image is not None and (
+                isinstance(image, LazyImage) or
+                image.width() * image.height() >=
+                self.tile_pyramid_megapixels * 10 ** 6):
+            self._pyramid = TilePyramid(
+                image, max_bytes=self.tile_cache_mb * 2 ** 20
+            )
+            self._pyramid.build()
         self.shapes = []
         self.repaint()
 
@@ -762,7 +1007,7 @@ class Canvas(QtWidgets.QWidget):
     def resetState(self):
         self.restoreCursor()
         self.pixmap = None
-        self.shapesBackups = []
+        self.shapesHistory.clear()
         self.update()
 
     def shapeIsLocked(self, shape):
@@ -0,0 +1,143 @@
+from qtpy import QtCore
+from qtpy.QtCore import Qt
+from qtpy import QtWidgets
+
+
+class FileListModel(QtCore.QAbstractListModel):
+
+    """Flat list of image paths with their labeled state."""
+
+    def __init__(self, parent=None):
+        super(FileListModel, self).__init__(parent)
+        self._paths = []
+        self._rows = {}
+        self._labeled = bytearray()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self._paths[index.row()]
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self._labeled[index.row()] else Qt.Unchecked
+        return None
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def setFiles(self, paths, labeled):
+        self.beginResetModel()
+        self._paths = list(paths)
+        self._rows = {path: row for row, path in enumerate(self._paths)}
+        self._labeled = bytearray(bool(x) for x in labeled)
+        self.endResetModel()
+
+    def path(self, row):
+        return self._paths[row]
+
+    def row(self, path):
+        return self._rows.get(path, -1)
+
+    def isLabeled(self, row):
+        return bool(self._labeled[row])
+
+    def setLabeled(self, path, labeled=True):
+        row = self.row(path)
+        if row < 0:
+            return
+        self._labeled[row] = labeled
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+
+
+class FileFilterProxyModel(QtCore.QSortFilterProxyModel):
+
+    def __init__(self, parent=None):
+        super(FileFilterProxyModel, self).__init__(parent)
+        self._pattern = None
+        self._showLabeled = True
+        self._paths = None
+        # keep rows visible until the filter changes, e.g. when the current
+        # image gets labeled while labeled images are hidden
+        self.setDynamicSortFilter(False)
+
+    def setFilter(self, pattern=None, showLabeled=True, paths=None):
+        self._pattern = pattern
+        self._showLabeled = showLabeled
+        self._paths = paths
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, sourceRow, sourceParent):
+        model = self.sourceModel()
+        path = model.path(sourceRow)
+        if self._pattern and self._pattern not in path:
+            return False
+        if not self._showLabeled and model.isLabeled(sourceRow):
+            return False
+        if self._paths is not None and path not in self._paths:
+            return False
+        return True
+
+
+class FileListWidget(QtWidgets.QListView):
+
+    """File list for directories with a very large number of images.
+
+    Rows are looked up through a path to row dict and the filter proxy, so
+    selection and next/prev do not depend on the number of images.
+    """
+
+    itemSelectionChanged = QtCore.Signal()
+
+    def __init__(self):
+        super(FileListWidget, self).__init__()
+        self._model = FileListModel(self)
+        self._proxy = FileFilterProxyModel(self)
+        self._proxy.setSourceModel(self._model)
+        self.setModel(self._proxy)
+        self.setUniformItemSizes(True)
+        self.selectionModel().selectionChanged.connect(
+            lambda selected, deselected: self.itemSelectionChanged.emit()
+        )
+
+    def setFiles(self, paths, labeled):
+        self._model.setFiles(paths, labeled)
+
+    def setFilter(self, pattern=None, showLabeled=True, paths=None):
+        self._proxy.setFilter(pattern, showLabeled, paths)
+
+    def clear(self):
+        self._model.setFiles([], [])
+
+    def count(self):
+        return self._proxy.rowCount()
+
+    def path(self, row):
+        index = self._proxy.mapToSource(self._proxy.index(row, 0))
+        return self._model.path(index.row())
+
+    def paths(self):
+        return [self.path(row) for row in range(self.count())]
+
+    def findRow(self, path):
+        sourceRow = self._model.row(path)
+        if sourceRow < 0:
+            return -1
+        return self._proxy.mapFromSource(self._model.index(sourceRow)).row()
+
+    def currentRow(self):
+        return self.currentIndex().row()
+
+    def setCurrentRow(self, row):
+        self.setCurrentIndex(self._proxy.index(row, 0))
+
+    def selectedPaths(self):
+        return [self.path(index.row()) for index in self.selectedIndexes()]
+
+    def setLabeled(self, path, labeled=True):
+        self._model.setLabeled(path, labeled)
@@ -0,0 +1,141 @@
+import base64
+import json
+import os
+import os.path as osp
+import shutil
+import tempfile
+
+import numpy as np
+
+from labelme.cli import export
+
+
+here = osp.dirname(osp.abspath(__file__))
+data_dir = osp.join(here, '../../../examples/instance_segmentation')
+
+
+def _copy_input(tmp_dir):
+    input_dir = osp.join(tmp_dir, 'data_annotated')
+    shutil.copytree(osp.join(data_dir, 'data_annotated'), input_dir)
+    return input_dir
+
+
+def test_export_voc():
+    tmp_dir = tempfile.mkdtemp()
+    input_dir = _copy_input(tmp_dir)
+    output_dir = osp.join(tmp_dir, 'data_dataset_voc')
+    labels_file = osp.join(data_dir, 'labels.txt')
+
+    assert export.export(
+        input_dir, output_dir, labels_file, noviz=True
+    ) == 0
+    cls = np.load(
+        osp.join(output_dir, 'SegmentationClass', '2011_000003.npy')
+    )
+    assert cls.shape == (338, 500)
+    assert cls.max() > 0
+
+    # unchanged files are skipped
+    out_file = osp.join(output_dir, 'SegmentationClass', '2011_000006.npy')
+    os.remove(out_file)
+    mtime = os.stat(
+        osp.join(output_dir, 'SegmentationClass', '2011_000025.npy')
+    ).st_mtime_ns
+    assert export.export(
+        input_dir, output_dir, labels_file, noviz=True
+    ) == 0
+    assert osp.exists(out_file)
+    assert os.stat(
+        osp.join(output_dir, 'SegmentationClass', '2011_000025.npy')
+    ).st_mtime_ns == mtime
+
+    # outputs of removed label files are removed
+    os.remove(osp.join(input_dir, '2011_000025.json'))
+    assert export.export(
+        input_dir, output_dir, labels_file, noviz=True
+    ) == 0
+    assert not osp.exists(
+        osp.join(output_dir, 'SegmentationClass', '2011_000025.npy')
+    )
+    with open(osp.join(output_dir, export.MANIFEST)) as f:
+        assert sorted(json.load(f)['files']) == [
+            '2011_000003.json', '2011_000006.json',
+        ]
+
+
+def test_export_embedded_image_data():
+    tmp_dir = tempfile.mkdtemp()
+    input_dir = _copy_input(tmp_dir)
+    labels_file = osp.join(data_dir, 'labels.txt')
+    # saved with store_data: true, and the image is gone
+    label_file = osp.join(input_dir, '2011_000003.json')
+    img_file = osp.join(input_dir, '2011_000003.jpg')
+    with open(label_file) as f:
+        label_data = json.load(f)
+    with open(img_file, 'rb') as f:
+        label_data['imageData'] = base64.b64encode(f.read()).decode()
+    with open(label_file, 'w') as f:
+        json.dump(label_data, f)
+    os.remove(img_file)
+
+    output_dir = osp.join(tmp_dir, 'data_dataset_voc')
+    assert export.export(
+        input_dir, output_dir, labels_file, noviz=True
+    ) == 0
+    cls = np.load(
+        osp.join(output_dir, 'SegmentationClass', '2011_000003.npy')
+    )
+    assert cls.shape == (338, 500)
+    assert cls.max() > 0
+    assert osp.exists(osp.join(output_dir, 'JPEGImages', '2011_000003.jpg'))
+
+    output_dir = osp.join(tmp_dir, 'data_dataset_coco')
+    assert export.export(
+        input_dir, output_dir, labels_file, format='coco'
+    ) == 0
+    with open(osp.join(output_dir, 'annotations.json')) as f:
+        image = json.load(f)['images'][0]
+    assert (image['height'], image['width']) == (338, 500)
+
+
+def test_export_coco():
+    tmp_dir = tempfile.mkdtemp()
+    input_dir = _copy_input(tmp_dir)
+    output_dir = osp.join(tmp_dir, 'data_dataset_coco')
+    labels_file = osp.join(data_dir, 'labels.txt')
+
+    assert export.export(
+        input_dir, output_dir, labels_file, format='coco', jobs=2
+    ) == 0
+    with open(osp.join(output_dir, 'annotations.json')) as f:
+        data = json.load(f)
+    assert [image['id'] for image in data['images']] == [0, 1, 2]
+    assert data['images'][0]['file_name'] == osp.join(
+        'JPEGImages', '2011_000003.jpg'
+    )
+    assert len(data['categories']) == 21
+    annotation_ids = [a['id'] for a in data['annotations']]
+    assert annotation_ids == list(range(len(annotation_ids)))
+    for annotation in data['annotations']:
+        x, y, w, h = annotation['bbox']
+        assert 0 < annotation['area'] <= w * h
+
+    # editing one label file only exports that file again
+    label_file = osp.join(input_dir, '2011_000006.json')
+    with open(label_file) as f:
+        label_data = json.load(f)
+    label_data['shapes'] = label_data['shapes'][:1]
+    with open(label_file, 'w') as f:
+        json.dump(label_data, f)
+    fragment_file = osp.join(
+        output_dir, export.FRAGMENT_DIR, '2011_000003.json'
+    )
+    mtime = os.stat(fragment_file).st_mtime_ns
+    assert export.export(
+        input_dir, output_dir, labels_file, format='coco'
+    ) == 0
+    assert os.stat(fragment_file).st_mtime_ns == mtime
+    with open(osp.join(output_dir, 'annotations.json')) as f:
+        data2 = json.load(f)
+    n_image1 = sum(a['image_id'] == 1 for a in data['annotations'])
+    assert len(data2['annotations']) == len(data['annotations']) - n_image1 + 1
@@ -1,7 +1,9 @@
+import os
 import os.path as osp
 import shutil
 import tempfile
 
+import labelme
 import labelme.app
 import labelme.config
 import labelme.testing
@@ -68,6 +70,18 @@ def test_MainWindow_openPrevImg(qtbot):
     win.openNextImg()
 
 
+def test_MainWindow_prefetch(qtbot):
+    win = test_MainWindow_open_dir(qtbot)
+    next_file = win.imageList[1]
+    qtbot.waitUntil(lambda: next_file in win.imageCache)
+    hits = win.imageCache.hits
+    win.openNextImg()
+    assert win.filename == next_file
+    assert win.imageCache.hits == hits + 1
+    win.openPrevImg()
+    assert win.imageCache.hits == hits + 2
+
+
 def test_MainWindow_annotate_jpg(qtbot):
     tmp_dir = tempfile.mkdtemp()
     input_file = osp.join(data_dir, 'raw/2011_000003.jpg')
@@ -102,3 +116,138 @@ def test_MainWindow_annotate_jpg(qtbot):
 
     labelme.testing.assert_labelfile_sanity(out_file)
     shutil.rmtree(tmp_dir)
+
+
+def test_MainWindow_labeled_after_write(qtbot):
+    tmp_dir = tempfile.mkdtemp()
+    image_file = osp.join(tmp_dir, '2011_000003.jpg')
+    shutil.copy(osp.join(data_dir, 'raw/2011_000003.jpg'), image_file)
+
+    win = labelme.app.MainWindow(filename=tmp_dir)
+    qtbot.addWidget(win)
+    _win_show_and_wait_imageData(qtbot, win)
+    model = win.fileListWidget._model
+    row = model.row(win.imagePath)
+    assert not model.isLabeled(row)
+
+    label_file = osp.join(tmp_dir, '2011_000003.json')
+    with qtbot.waitSignal(win.labelFileSaved) as blocker:
+        win.saveLabels(label_file)
+        # marked as labeled only once the writer is done
+        assert not model.isLabeled(row)
+    assert blocker.args == [label_file, None]
+    assert model.isLabeled(row)
+    assert not win._savedImagePaths
+    labelme.testing.assert_labelfile_sanity(label_file)
+    win.close()
+    shutil.rmtree(tmp_dir)
+
+
+def test_MainWindow_ground_truth_builder(qtbot):
+    tmp_dir = tempfile.mkdtemp()
+    img_file = osp.join(data_dir, 'annotated/2011_000003.jpg')
+    json_file = osp.join(data_dir, 'annotated/2011_000003.json')
+    n_shapes = len(labelme.LabelFile(json_file, loadImage=False).shapes)
+    for folder in ['Ground Truth', 'Annotator 1', 'Annotator 2']:
+        os.makedirs(osp.join(tmp_dir, folder))
+        shutil.copy(img_file, osp.join(tmp_dir, folder))
+        if folder != 'Ground Truth':
+            shutil.copy(json_file, osp.join(tmp_dir, folder))
+
+    win = labelme.app.MainWindow(config=labelme.config.get_default_config())
+    qtbot.addWidget(win)
+    reads = []
+    loader = win.annotatorCache._loader
+    win.annotatorCache._loader = lambda f: reads.append(f) or loader(f)
+    win.actions.groundTruthBuilderMode.setChecked(True)
+    win.setupGroundTruthBuilder(refreshImageList=False)
+    win.importDirImages(tmp_dir, load=False)
+    gt_file = osp.join(tmp_dir, 'Ground Truth', '2011_000003.jpg')
+    assert [folder for _, folder in win.annotatorImages[gt_file]] == \
+        ['Annotator 1', 'Annotator 2']
+
+    win.loadFile(gt_file)  # selects it in the file list, which loads it
+    assert len(win.canvas.shapes) == 2 * n_shapes
+    assert all(s.locked for s in win.canvas.shapes)
+    assert len(reads) == 2
+
+    win.setClean()
+    assert win.loadFile(gt_file)
+    assert len(win.canvas.shapes) == 2 * n_shapes
+    assert len(reads) == 2  # cached
+    win.setClean()
+
+    df = win.dfAllImages
+    win.importDirImages(tmp_dir, load=False)
+    assert win.dfAllImages is df  # same images: not parsed again
+    assert list(df.columns) == ['Image Folder', 'File Name',
+                                'Ground Truth Group', 'Is Ground Truth']
+    assert df.loc[gt_file].tolist() == \
+        ['Ground Truth', '2011_000003.jpg', '2011_000003.jpg', True]
+    assert win.groundTruthGroup('01a-Image 1.JPG') == 'image 1.jpg'
+    assert win.groundTruthGroup('0a-Image.jpg') == '0a-image.jpg'
+    win.close()
+    shutil.rmtree(tmp_dir)
+
+
+def test_MainWindow_auto_annotate_dir(qtbot):
+    import numpy as np
+    from labelme import user_extns
+
+    tmp_dir = tempfile.mkdtemp()
+    for name in ['a.jpg', 'b.jpg']:
+        shutil.copy(osp.join(data_dir, 'raw/2011_000003.jpg'),
+                    osp.join(tmp_dir, name))
+
+    config = labelme.config.get_default_config()
+    config['auto_annotate']['max_workers'] = 0
+    win = labelme.app.MainWindow(config=config)
+    qtbot.addWidget(win)
+    win.ipm.shutdown()
+    win.ipm = user_extns.ImgPredMgr(backend=user_extns.ModelBackend(
+        lambda batch: np.stack([batch[..., 0] < 0.5,
+                                batch[..., 0] >= 0.5], axis=-1)))
+    win.importDirImages(tmp_dir, load=False)
+    with qtbot.waitSignal(win.autoAnnotateFinished, timeout=10000) as blocker:
+        win.btnAutoAnnotate.click()
+    result = blocker.args[0]
+    assert result['annotated'] == win.imageList
+    for image_path in win.imageList:
+        label_file = osp.splitext(image_path)[0] + '.json'
+        shapes = labelme.LabelFile(label_file, loadImage=False).shapes
+        assert shapes and shapes[0]['label'] == 'Tissue boundary'
+    assert not osp.exists(osp.join(tmp_dir, '.auto_annotate_checkpoint'))
+    assert win.btnAutoAnnotate.isEnabled()
+    win.close()
+    shutil.rmtree(tmp_dir)
+
+
+def test_MainWindow_auto_annotate_dir_skips_open_image(qtbot):
+    import numpy as np
+    from labelme import user_extns
+
+    tmp_dir = tempfile.mkdtemp()
+    for name in ['a.jpg', 'b.jpg']:
+        shutil.copy(osp.join(data_dir, 'raw/2011_000003.jpg'),
+                    osp.join(tmp_dir, name))
+
+    config = labelme.config.get_default_config()
+    config['auto_annotate']['max_workers'] = 0
+    win = labelme.app.MainWindow(config=config, filename=tmp_dir)
+    qtbot.addWidget(win)
+    _win_show_and_wait_imageData(qtbot, win)
+    win.ipm.shutdown()
+    win.ipm = user_extns.ImgPredMgr(backend=user_extns.ModelBackend(
+        lambda batch: np.stack([batch[..., 0] < 0.5,
+                                batch[..., 0] >= 0.5], axis=-1)))
+    with qtbot.waitSignal(win.autoAnnotateFinished, timeout=10000) as blocker:
+        win.btnAutoAnnotate.click()
+    result = blocker.args[0]
+    # the open image may be saved by the GUI, so it is left alone
+    assert result['skipped'] == [win.filename]
+    assert result['annotated'] == [
+        f for f in win.imageList if f != win.filename]
+    assert not osp.exists(osp.splitext(win.filename)[0] + '.json')
+    assert not win._autoAnnotateExclude
+    win.close()
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,82 @@
+import os
+import os.path as osp
+import shutil
+import tempfile
+
+from labelme.dir_index import DirIndex
+
+
+def _touch(path):
+    with open(path, 'w'):
+        pass
+
+
+def test_DirIndex():
+    tmp_dir = tempfile.mkdtemp()
+    root = osp.join(tmp_dir, 'images')
+    os.makedirs(osp.join(root, 'sub'))
+    _touch(osp.join(root, 'a.jpg'))
+    _touch(osp.join(root, 'sub', 'b.jpg'))
+    db_file = osp.join(tmp_dir, 'index.db3')
+
+    index = DirIndex(db_file)
+    assert not index.load(root)
+    assert index.refresh(root)
+    assert sorted(index.files(root)) == [
+        osp.join(root, 'a.jpg'), osp.join(root, 'sub', 'b.jpg'),
+    ]
+    assert index.exists(osp.join(root, 'a.jpg'))
+    assert not index.exists(osp.join(root, 'a.json'))
+    assert not index.refresh(root)
+
+    # a new index is served from the database without scanning
+    index = DirIndex(db_file)
+    assert index.load(root)
+    assert len(index.files(root)) == 2
+
+    _touch(osp.join(root, 'sub', 'b.json'))
+    shutil.rmtree(osp.join(root, 'sub'))
+    os.makedirs(osp.join(root, 'other'))
+    _touch(osp.join(root, 'other', 'c.jpg'))
+    assert index.refresh(root)
+    assert sorted(index.files(root)) == [
+        osp.join(root, 'a.jpg'), osp.join(root, 'other', 'c.jpg'),
+    ]
+
+    index.add(osp.join(root, 'a.json'))
+    assert index.exists(osp.join(root, 'a.json'))
+    index.discard(osp.join(root, 'a.json'))
+    assert not index.exists(osp.join(root, 'a.json'))
+
+    shutil.rmtree(tmp_dir)
+
+
+def test_DirIndex_add_during_refresh():
+    tmp_dir = tempfile.mkdtemp()
+    root = osp.join(tmp_dir, 'images')
+    os.makedirs(root)
+    _touch(osp.join(root, 'a.jpg'))
+    index = DirIndex(osp.join(tmp_dir, 'index.db3'))
+    label_file = osp.join(root, 'a.json')
+
+    scan = index._scan
+
+    def scan_and_save(conn, absroot):
+        scan(conn, absroot)
+        # saved by labelme after the scan listed the directory
+        _touch(label_file)
+        index.add(label_file)
+
+    index._scan = scan_and_save
+    index.refresh(root)
+    del index._scan
+    assert index.exists(label_file)
+
+    # the next refresh lists it
+    assert index.refresh(root)
+    assert index.exists(label_file)
+    os.remove(label_file)
+    index.refresh(root)
+    assert not index.exists(label_file)
+
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import threading
+
+from labelme.image_cache import ImageCache
+
+
+def _loader(key):
+    return 'value-{}'.format(key), 10
+
+
+def test_ImageCache_prefetch_and_stats():
+    cache = ImageCache(_loader, max_bytes=100)
+    assert cache.get('a') is None
+    cache.prefetch(['a', 'b'])
+    assert cache.get('a') == 'value-a'
+    assert cache.get('b') == 'value-b'
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['nbytes'] == 20
+    cache.shutdown()
+
+
+def test_ImageCache_lru_eviction():
+    cache = ImageCache(_loader, max_bytes=30)
+    for key in 'abc':
+        cache.put(key, 'value-{}'.format(key), 10)
+    assert cache.get('a') == 'value-a'  # b becomes least recently used
+    cache.put('d', 'value-d', 10)
+    assert 'b' not in cache
+    assert 'a' in cache and 'd' in cache
+    assert cache.stats()['evictions'] == 1
+    assert cache.nbytes == 30
+    cache.shutdown()
+
+
+def test_ImageCache_waits_for_pending():
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_loader(key):
+        started.set()
+        release.wait(5)
+        return key, 1
+
+    cache = ImageCache(slow_loader)
+    cache.prefetch(['a'])
+    started.wait(5)
+    assert cache.get('a', wait=False) is None
+    threading.Timer(0.1, release.set).start()
+    assert cache.get('a') == 'a'
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+    cache.shutdown()
+
+
+def test_ImageCache_stale_entry():
+    tmp_file = tempfile.mktemp()
+    with open(tmp_file, 'w') as f:
+        f.write('a')
+
+    def stamp(key):
+        return os.path.getsize(key)
+
+    cache = ImageCache(_loader, stamp=stamp)
+    cache.put(tmp_file, 'old', 1)
+    assert cache.get(tmp_file) == 'old'
+    with open(tmp_file, 'w') as f:
+        f.write('ab')
+    assert cache.get(tmp_file) is None
+    assert tmp_file not in cache
+    os.remove(tmp_file)
+    cache.shutdown()
+
+
+def test_ImageCache_prefetch_reloads_stale_entry():
+    tmp_file = tempfile.mktemp()
+    with open(tmp_file, 'w') as f:
+        f.write('a')
+
+    def loader(key):
+        with open(key) as f:
+            return f.read(), 1
+
+    def stamp(key):
+        return os.path.getsize(key)
+
+    cache = ImageCache(loader, stamp=stamp)
+    cache.prefetch([tmp_file])
+    assert cache.get(tmp_file) == 'a'
+    with open(tmp_file, 'w') as f:
+        f.write('ab')
+    cache.prefetch([tmp_file])
+    assert cache.get(tmp_file) == 'ab'
+    assert cache.stats()['misses'] == 0
+    os.remove(tmp_file)
+    cache.shutdown()
@@ -0,0 +1,97 @@
+import json
+import os.path as osp
+import tempfile
+
+from labelme import json_codec
+from labelme.label_file import LabelFile
+
+
+here = osp.dirname(osp.abspath(__file__))
+data_dir = osp.join(here, 'data')
+
+
+def test_loads_skipping():
+    data = {
+        'shapes': [{'label': 'imageData', 'other': {'imageData': 'x'}}],
+        'imageData': 'a\\"b' * 10,
+        'imagePath': 'é.jpg',
+    }
+    for indent in [None, 2]:
+        raw = json.dumps(data, indent=indent, ensure_ascii=False)
+        result = json_codec.loads_skipping(raw.encode('utf-8'), 'imageData')
+        assert result == dict(data, imageData=None)
+
+    # only inside a nested object: parsed entirely
+    nested = {'shapes': [{'imageData': 'x'}], 'imageData': None}
+    raw = json.dumps(nested).encode('utf-8')
+    assert json_codec.loads_skipping(raw, 'imageData') == nested
+
+    data = {
+        'shapes': [
+            {'label': 'a', 'points': [[1, 2.5e3], [-3, 4]]},
+            {'label': 'b', 'points': []},
+        ],
+        'other': {'points': [['a']]},
+    }
+    for indent in [None, 2]:
+        raw = json.dumps(data, indent=indent).encode('utf-8')
+        result = json_codec.loads_skipping(
+            raw, 'imageData', arrays=['points']
+        )
+        assert [s['points'] for s in result['shapes']] == [None, None]
+        assert result['other'] == data['other']
+
+
+def test_LabelFile_load_save():
+    json_file = osp.join(data_dir, 'annotated_with_data/apc2016_obj3.json')
+    label_file = LabelFile(json_file)
+    assert label_file.imageData is not None
+    label_file_noimage = LabelFile(json_file, loadImage=False)
+    assert label_file_noimage.imageData is None
+    assert label_file_noimage.shapes == label_file.shapes
+    assert label_file_noimage.otherData == label_file.otherData
+
+    shapes = []
+    for shape in label_file.shapes:
+        shape = dict(shape)
+        shape.update(shape.pop('other_data'))
+        shapes.append(shape)
+    tmp_dir = tempfile.mkdtemp()
+    for compact in [False, True]:
+        filename = osp.join(tmp_dir, 'compact.json' if compact else 'a.json')
+        label_file.save(
+            filename, shapes, label_file.imagePath,
+            None, None, label_file.imageData, flags=label_file.flags,
+            compact=compact,
+        )
+        with open(filename, 'rb') as f:
+            assert (b'\n' not in f.read()) == compact
+        loaded = LabelFile(filename)
+        assert loaded.shapes == label_file.shapes
+        assert loaded.imageData == label_file.imageData
+
+
+def test_LabelFile_load_metadata():
+    json_file = osp.join(data_dir, 'annotated_with_data/apc2016_obj3.json')
+    label_file = LabelFile(json_file, loadImage=False)
+    metadata = LabelFile.load_metadata(json_file)
+    assert metadata['imagePath'] == label_file.imagePath
+    assert metadata['flags'] == label_file.flags
+    for shape, expected in zip(metadata['shapes'], label_file.shapes):
+        for key in ['label', 'group_id', 'shape_type', 'flags']:
+            assert shape[key] == expected[key]
+    assert len(metadata['shapes']) == len(label_file.shapes)
+    assert 'points' not in metadata['shapes'][0]
+    assert LabelFile.load_metadata(json_file) is metadata  # cached
+
+    tmp_dir = tempfile.mkdtemp()
+    filename = osp.join(tmp_dir, 'a.json')
+    label_file.save(filename, [], 'a.jpg', 10, 20)
+    assert LabelFile.load_metadata(filename)['shapes'] == []
+    label_file.save(
+        filename, [dict(label='b', points=[[1, 2]], group_id=1)], 'a.jpg',
+        10, 20,
+    )
+    assert LabelFile.load_metadata(filename)['shapes'] == [
+        dict(label='b', group_id=1, shape_type='polygon', flags={})
+    ]
@@ -0,0 +1,63 @@
+import os
+import os.path as osp
+import shutil
+import tempfile
+import threading
+
+from labelme.label_file import LabelFile
+from labelme.label_writer import LabelFileWriter
+
+
+class _BlockingLabelFile(LabelFile):
+
+    def __init__(self, started, release):
+        super(_BlockingLabelFile, self).__init__()
+        self.started = started
+        self.release = release
+
+    def save(self, filename, **kwargs):
+        self.started.set()
+        self.release.wait()
+        super(_BlockingLabelFile, self).save(filename, **kwargs)
+
+
+def _kwargs(label):
+    return dict(
+        shapes=[dict(label=label, points=[[1, 2]], group_id=None)],
+        imagePath='a.jpg', imageHeight=10, imageWidth=20,
+    )
+
+
+def test_LabelFileWriter():
+    tmp_dir = tempfile.mkdtemp()
+    done = []
+    writer = LabelFileWriter(done=lambda f, e: done.append((f, e)))
+
+    started, release = threading.Event(), threading.Event()
+    first = osp.join(tmp_dir, 'first.json')
+    second = osp.join(tmp_dir, 'sub', 'second.json')
+    writer.save(_BlockingLabelFile(started, release), first, **_kwargs('a'))
+    started.wait()
+    # queued while the first file is being written: coalesced
+    for label in ['b', 'c', 'd']:
+        writer.save(LabelFile(), second, **_kwargs(label))
+    assert writer.pending() == 2
+    assert writer.pending(second) == 1
+    assert not writer.wait(second, timeout=0.01)
+    release.set()
+
+    assert writer.wait(second)
+    assert writer.pending() == 0
+    assert writer.coalesced == 2
+    assert [f for f, _ in done] == [first, second]
+    assert LabelFile(second, loadImage=False).shapes[0]['label'] == 'd'
+    assert sorted(os.listdir(osp.join(tmp_dir, 'sub'))) == ['second.json']
+
+    # errors are reported, the worker keeps running
+    writer.save(LabelFile(), osp.join(tmp_dir, 'bad.json'), shapes=None)
+    writer.save(LabelFile(), first, **_kwargs('e'))
+    writer.shutdown()
+    assert done[2][1] is not None
+    assert done[3] == (first, None)
+    assert sorted(os.listdir(tmp_dir)) == ['first.json', 'sub']
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,74 @@
+import os.path as osp
+import tempfile
+
+from qtpy import QtCore
+from qtpy import QtGui
+
+from labelme.lazy_image import LazyImage
+from labelme.lazy_image import open_lazy_image
+from labelme.tile_pyramid import TilePyramid
+
+
+def _save_image(filename, width=2000, height=1000):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    image.fill(QtGui.QColor(0, 0, 255))
+    # left half red
+    painter = QtGui.QPainter(image)
+    painter.fillRect(0, 0, width // 2, height, QtGui.QColor(255, 0, 0))
+    painter.end()
+    assert image.save(filename)
+    return filename
+
+
+def _is_red(color):
+    color = QtGui.QColor(color)
+    return color.red() > 200 and color.blue() < 50
+
+
+def test_LazyImage():
+    tmp_dir = tempfile.mkdtemp()
+    image = LazyImage(_save_image(osp.join(tmp_dir, 'large.jpg')))
+    assert image
+    assert (image.width(), image.height()) == (2000, 1000)
+    assert image.rect() == QtCore.QRect(0, 0, 2000, 1000)
+    assert image.clipSupported
+
+    region = image.region(
+        QtCore.QRect(900, 0, 200, 100), QtCore.QSize(50, 25)
+    )
+    assert (region.width(), region.height()) == (50, 25)
+    assert _is_red(region.pixel(5, 10))
+    assert not _is_red(region.pixel(45, 10))
+
+    assert not LazyImage(osp.join(tmp_dir, 'missing.jpg'))
+
+
+def test_open_lazy_image():
+    tmp_dir = tempfile.mkdtemp()
+    jpg_file = _save_image(osp.join(tmp_dir, 'large.jpg'))
+    png_file = _save_image(osp.join(tmp_dir, 'large.png'))
+    assert isinstance(open_lazy_image(jpg_file, 1), LazyImage)
+    assert open_lazy_image(jpg_file, 10) is None
+    assert open_lazy_image(jpg_file, None) is None
+    # PNG cannot be decoded by region
+    assert open_lazy_image(png_file, 1) is None
+
+
+def test_TilePyramid_lazy():
+    tmp_dir = tempfile.mkdtemp()
+    image = LazyImage(_save_image(osp.join(tmp_dir, 'large.jpg')))
+    pyramid = TilePyramid(image, tile_size=256, max_workers=1)
+    assert pyramid.lazy
+    assert pyramid.num_levels == 4
+    pyramid.build()
+    top = pyramid.tile((3, 0, 0), wait=True)
+    assert (top.width(), top.height()) == (250, 125)
+    assert _is_red(top.pixel(10, 60))
+    assert not _is_red(top.pixel(240, 60))
+    # only the top level is decoded in advance
+    assert pyramid.stats()['entries'] == 1
+
+    pyramid.prefetch([(0, 7, 3)])
+    tile = pyramid.tile((0, 7, 3), wait=True)
+    assert (tile.width(), tile.height()) == (208, 232)
+    pyramid.shutdown()
@@ -0,0 +1,98 @@
+from qtpy import QtCore
+
+from labelme.shape import Shape
+from labelme.shape_history import ShapeHistory
+
+
+def _shape(label, points):
+    shape = Shape(label=label)
+    shape.points = [QtCore.QPointF(x, y) for x, y in points]
+    shape.close()
+    return shape
+
+
+def _points(shape):
+    return [(p.x(), p.y()) for p in shape.points]
+
+
+def test_ShapeHistory_undo_redo():
+    a = _shape('a', [(0, 0), (10, 0), (10, 10)])
+    b = _shape('b', [(20, 20), (30, 20), (30, 30)])
+    shapes = [a, b]
+    history = ShapeHistory()
+    assert not history.commit(shapes)  # initial state
+    assert not history.canUndo()
+    assert not history.commit(shapes)  # nothing changed
+
+    a.moveVertexBy(0, QtCore.QPointF(1, 1))
+    assert history.isModified(a)
+    assert not history.isModified(b)
+    assert history.commit(shapes)
+    assert len(history._undo[-1].changes) == 1  # only a is recorded
+
+    c = _shape('c', [(5, 5), (6, 6), (7, 5)])
+    shapes.append(c)
+    assert history.commit(shapes)
+    b.label = 'b2'
+    shapes.remove(a)
+    assert history.commit(shapes)
+    assert len(history) == 3
+
+    assert history.undo(shapes)
+    assert shapes == [a, b, c]
+    assert b.label == 'b'
+    assert _points(a)[0] == (1, 1)
+    assert history.undo(shapes)
+    assert shapes == [a, b]
+    assert history.undo(shapes)
+    assert _points(a)[0] == (0, 0)
+    assert not history.undo(shapes)
+
+    assert history.redo(shapes)
+    assert _points(a)[0] == (1, 1)
+    assert history.redo(shapes)
+    assert history.redo(shapes)
+    assert shapes == [b, c]
+    assert b.label == 'b2'
+    assert not history.canRedo()
+
+    history.undo(shapes)
+    a.label = 'a2'
+    assert history.commit(shapes)
+    assert not history.canRedo()
+
+
+def test_ShapeHistory_amend_and_drop():
+    shapes = []
+    history = ShapeHistory()
+    history.commit(shapes)
+    shape = _shape(None, [(0, 0), (10, 0), (10, 10)])
+    shapes.append(shape)
+    history.commit(shapes)
+    shape.label = 'a'
+    history.commit(shapes, amend=True)
+    assert len(history) == 1
+    history.undo(shapes)
+    assert shapes == []
+    history.redo(shapes)
+    assert shapes == [shape] and shape.label == 'a'
+
+    other = _shape(None, [(0, 0), (1, 0), (1, 1)])
+    shapes.append(other)
+    history.commit(shapes)
+    shapes.pop()  # e.g. the label dialog was canceled
+    history.dropLast()
+    assert len(history) == 1
+    assert not history.commit(shapes)
+
+
+def test_ShapeHistory_memory_budget():
+    shape = _shape('a', [(i, i) for i in range(100)])
+    shapes = [shape]
+    history = ShapeHistory(max_bytes=100000)
+    history.commit(shapes)
+    for _ in range(50):
+        shape.moveBy(QtCore.QPointF(1, 0))
+        history.commit(shapes)
+    assert history.nbytes <= 100000
+    assert 1 < len(history) < 50
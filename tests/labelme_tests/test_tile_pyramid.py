@@ -0,0 +1,50 @@
+from qtpy import QtCore
+from qtpy import QtGui
+
+from labelme.tile_pyramid import TilePyramid
+
+
+def _image(width, height):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    image.fill(QtGui.QColor(0, 0, 255))
+    # left half red
+    painter = QtGui.QPainter(image)
+    painter.fillRect(0, 0, width // 2, height, QtGui.QColor(255, 0, 0))
+    painter.end()
+    return image
+
+
+def test_TilePyramid_levels():
+    pyramid = TilePyramid(_image(1000, 300), tile_size=100)
+    assert pyramid.num_levels == 5  # 1000 px fit into one tile at level 4
+    assert pyramid.level(2) == 0
+    assert pyramid.level(0.9) == 0
+    assert pyramid.level(0.5) == 1
+    assert pyramid.level(0.2) == 2
+    assert pyramid.level(0.001) == 4
+
+    assert pyramid.tiles(4, QtCore.QRect(0, 0, 1000, 300)) == [(4, 0, 0)]
+    assert pyramid.tiles(1, QtCore.QRect(150, 50, 300, 10)) == [
+        (1, 0, 0), (1, 1, 0), (1, 2, 0),
+    ]
+    assert pyramid.tiles(1, QtCore.QRect(2000, 0, 10, 10)) == []
+    assert pyramid.tileRect((1, 4, 1)) == QtCore.QRect(800, 200, 200, 100)
+    pyramid.shutdown()
+
+
+def test_TilePyramid_render():
+    pyramid = TilePyramid(_image(1000, 300), tile_size=100, max_workers=1)
+    assert pyramid.tile((4, 0, 0)) is None
+    pyramid.build()
+    top = pyramid.tile((4, 0, 0), wait=True)
+    assert (top.width(), top.height()) == (63, 19)
+    assert QtGui.QColor(top.pixel(10, 10)) == QtGui.QColor(255, 0, 0)
+    assert QtGui.QColor(top.pixel(50, 10)) == QtGui.QColor(0, 0, 255)
+
+    # lower levels were rendered on the way
+    tile = pyramid.tile((1, 4, 1))
+    assert (tile.width(), tile.height()) == (100, 50)
+    assert QtGui.QColor(tile.pixel(50, 25)) == QtGui.QColor(0, 0, 255)
+    stats = pyramid.stats()
+    assert stats['entries'] == 10 + 3 + 2 + 1
+    pyramid.shutdown()
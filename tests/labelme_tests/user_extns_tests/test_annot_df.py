@@ -0,0 +1,93 @@
+import json
+import os.path as osp
+import tempfile
+
+from labelme.user_extns import tools
+
+
+def _write_label_file(img_file, shapes):
+    data = dict(
+        version='4.2.9',
+        flags={},
+        shapes=shapes,
+        imagePath=osp.basename(img_file),
+        imageData=None,
+        imageHeight=100,
+        imageWidth=100,
+    )
+    with open(osp.splitext(img_file)[0] + '.json', 'w') as f:
+        json.dump(data, f)
+
+
+def _shape(label, group_id=None, flags=None):
+    return dict(
+        label=label,
+        points=[[1, 1], [10, 1], [10, 10]],
+        group_id=group_id,
+        shape_type='polygon',
+        flags=flags or {},
+    )
+
+
+def _make_files(num_images):
+    tmp_dir = tempfile.mkdtemp()
+    img_files = []
+    for i in range(num_images):
+        img_file = osp.join(tmp_dir, '{:03d}.bmp'.format(i))
+        img_files.append(img_file)
+        if i % 3 == 2:
+            continue  # no label file
+        _write_label_file(img_file, [
+            _shape('Tissue boundary'),
+            _shape('Hole', group_id=i, flags={'Not in tissue': i % 2 == 0}),
+        ])
+    return img_files
+
+
+def test_getAnnotDf():
+    img_files = _make_files(30)
+    df = tools.getAnnotDf(img_files)
+
+    assert len(df) == 20 * 2 + 10
+    assert list(df.columns) == tools.AnnotDf.COLUMNS + ['Not_in_tissue']
+    assert list(df.index) == list(range(len(df)))
+    # rows are in the order of the files
+    assert df['image_path'].tolist()[:5] == [
+        img_files[0], img_files[0], img_files[1], img_files[1], img_files[2],
+    ]
+    row = df.iloc[1]
+    assert row['label'] == 'Hole'
+    assert row['annot_num'] == 2
+    assert row['group_id'] == 0
+    assert row['Not_in_tissue']
+    assert row['shape_obj'].label == 'Hole'
+    # image without a label file, and shape without flags
+    assert df.iloc[4]['annot_num'] == 0
+    assert df.iloc[4]['label'] is None
+    assert df.iloc[0]['Not_in_tissue'] is None
+
+
+def test_AnnotDf_iter_images():
+    img_files = _make_files(10)
+    messages = []
+
+    def status_callback(msg):
+        messages.append(msg)
+
+    annot_df = tools.AnnotDf(status_callback=status_callback, max_workers=2)
+
+    start = 0
+    for i, (img_file, label_file, df) in enumerate(
+        annot_df.iter_images(img_files, keep=False)
+    ):
+        assert img_file == img_files[i]
+        assert (label_file is None) == (i % 3 == 2)
+        assert set(df['image_path']) == {img_file}
+        assert df.index[0] == start
+        start = df.index[-1] + 1
+    assert len(messages) == 10
+    assert len(annot_df) == 0
+
+    annot_df.load_files(img_files[:2])
+    assert annot_df.df_annot.index[0] == start
+    assert len(annot_df) == 4
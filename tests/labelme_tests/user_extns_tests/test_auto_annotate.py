@@ -0,0 +1,156 @@
+import os.path as osp
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import PIL.Image
+
+from labelme.label_file import LabelFile
+from labelme.user_extns.auto_annotate import AutoAnnotator
+from labelme.user_extns.gcp_lib import ImgPredMgr
+from labelme.user_extns.gcp_lib import ModelBackend
+
+
+def _model(batch):
+    # class 1 where the image is red
+    red = batch[..., 0]
+    return np.stack([1 - red, red], axis=-1)
+
+
+def _make_images(tmp_dir, n):
+    img = np.zeros((100, 160, 3), dtype=np.uint8)
+    img[20:80, 40:120, 0] = 255
+    image_paths = []
+    for i in range(n):
+        image_path = osp.join(tmp_dir, '{}.png'.format(i))
+        PIL.Image.fromarray(img).save(image_path)
+        image_paths.append(image_path)
+    return image_paths
+
+
+def test_AutoAnnotator():
+    tmp_dir = tempfile.mkdtemp()
+    image_paths = _make_images(tmp_dir, 4)
+    image_paths.append(osp.join(tmp_dir, 'missing.png'))
+    with open(image_paths[0], 'rb') as f:
+        image_data = f.read()
+    # already annotated: skipped
+    LabelFile().save(
+        osp.join(tmp_dir, '0.json'),
+        [dict(label='Tissue boundary', points=[[1, 2]], group_id=None)],
+        '0.png', 100, 160,
+    )
+    # other shapes and image data: merged
+    LabelFile().save(
+        osp.join(tmp_dir, '1.json'),
+        [dict(label='Hole', points=[[1, 2]], group_id=3, extra='x')],
+        '1.png', None, None, imageData=image_data, flags={'ok': True},
+    )
+
+    ipm = ImgPredMgr(backend=ModelBackend(_model), batch_size=2)
+    annotator = AutoAnnotator(ipm, output_dir=None, min_area=100,
+                              flags={'Reviewed': False}, max_workers=1)
+    progress = []
+    result = annotator.run(image_paths,
+                           progress=lambda *args: progress.append(args))
+    assert result['annotated'] == image_paths[1:4]
+    assert result['skipped'] == image_paths[:1]
+    assert result['failed'] == image_paths[4:]
+    assert progress[-1][:2] == (5, 5)
+
+    merged = LabelFile(osp.join(tmp_dir, '1.json'))
+    assert merged.imageData == image_data
+    assert merged.flags == {'ok': True}
+    assert [s['label'] for s in merged.shapes] == ['Hole', 'Tissue boundary']
+    assert merged.shapes[0]['other_data'] == {'extra': 'x'}
+    shape = LabelFile(osp.join(tmp_dir, '2.json')).shapes[0]
+    assert shape['flags'] == {'Reviewed': False}
+    points = np.array(shape['points'])
+    np.testing.assert_allclose(points.min(axis=0), [40, 20], atol=2)
+    np.testing.assert_allclose(points.max(axis=0), [120, 80], atol=2)
+
+    # nothing left to do
+    result = annotator.run(image_paths[:4])
+    assert result['skipped'] == image_paths[:4]
+    ipm.shutdown()
+    shutil.rmtree(tmp_dir)
+
+
+def test_AutoAnnotator_cancel_resume():
+    tmp_dir = tempfile.mkdtemp()
+    out_dir = osp.join(tmp_dir, 'labels')
+    image_paths = _make_images(tmp_dir, 5)
+    checkpoint = osp.join(tmp_dir, 'checkpoint.txt')
+    ipm = ImgPredMgr(backend=ModelBackend(_model), batch_size=1)
+    annotator = AutoAnnotator(ipm, output_dir=out_dir, label='Tissue',
+                              checkpoint=checkpoint, max_workers=0)
+
+    cancel = threading.Event()
+    result = annotator.run(image_paths,
+                           cancel=cancel, progress=lambda *_: cancel.set())
+    assert result['cancelled']
+    # the batch being predicted when cancelled is still written
+    assert result['annotated'] == image_paths[:2]
+    with open(checkpoint) as f:
+        assert f.read().splitlines() == image_paths[:2]
+    label_file = osp.join(out_dir, '0.json')
+    assert LabelFile(label_file).imagePath == osp.join('..', '0.png')
+
+    # an image of the checkpoint without label file is not redone
+    annotator.label = 'Other'
+    result = annotator.run(image_paths)
+    assert not result['cancelled']
+    assert result['skipped'] == image_paths[:2]
+    assert result['annotated'] == image_paths[2:]
+    assert not osp.exists(checkpoint)
+    ipm.shutdown()
+    shutil.rmtree(tmp_dir)
+
+
+def test_AutoAnnotator_exclude():
+    tmp_dir = tempfile.mkdtemp()
+    image_paths = _make_images(tmp_dir, 4)
+    ipm = ImgPredMgr(backend=ModelBackend(_model), batch_size=2)
+    exclude = {image_paths[0]}
+    lock = threading.Lock()
+    annotator = AutoAnnotator(ipm, exclude=exclude, lock=lock,
+                              max_workers=0)
+
+    def progress(done, total, image_path):
+        # opened in the GUI while the run goes on
+        if image_path is None:
+            with lock:
+                exclude.add(image_paths[3])
+
+    result = annotator.run(image_paths, progress=progress)
+    assert result['annotated'] == image_paths[1:3]
+    assert result['skipped'] == [image_paths[0], image_paths[3]]
+    assert not osp.exists(osp.join(tmp_dir, '0.json'))
+    assert not osp.exists(osp.join(tmp_dir, '3.json'))
+    ipm.shutdown()
+    shutil.rmtree(tmp_dir)
+
+
+def test_AutoAnnotator_exif_orientation():
+    tmp_dir = tempfile.mkdtemp()
+    img = np.zeros((100, 160, 3), dtype=np.uint8)
+    img[20:80, 40:120, 0] = 255
+    image_path = osp.join(tmp_dir, 'rotated.jpg')
+    exif = PIL.Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 clockwise to display
+    PIL.Image.fromarray(img).save(image_path, exif=exif, quality=100)
+
+    ipm = ImgPredMgr(backend=ModelBackend(_model))
+    annotator = AutoAnnotator(ipm, min_area=100, max_workers=0)
+    result = annotator.run([image_path])
+    assert result['annotated'] == [image_path]
+    label_file = osp.join(tmp_dir, 'rotated.json')
+    data = LabelFile.load_metadata(label_file)
+    # raw pixels, as displayed by the canvas and predicted by getFeatures
+    assert (data['imageWidth'], data['imageHeight']) == (160, 100)
+    points = np.array(LabelFile(label_file).shapes[0]['points'])
+    np.testing.assert_allclose(points.min(axis=0), [40, 20], atol=2)
+    np.testing.assert_allclose(points.max(axis=0), [120, 80], atol=2)
+    ipm.shutdown()
+    shutil.rmtree(tmp_dir)
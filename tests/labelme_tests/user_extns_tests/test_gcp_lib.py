@@ -0,0 +1,150 @@
+import base64
+import http.server
+import json
+import threading
+
+import numpy as np
+import PIL.Image
+import pytest
+import requests
+
+from labelme.user_extns.gcp_lib import ImgPredMgr
+from labelme.user_extns.gcp_lib import ModelBackend
+from labelme.user_extns.gcp_lib import RemoteBackend
+
+
+class _PredictHandler(http.server.BaseHTTPRequestHandler):
+
+    # keep-alive, as the predict endpoint
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(body)
+        self.server.clients.add(self.client_address)
+        if self.server.fail:
+            status, response = 400, {'error': 'Bad instances'}
+        else:
+            status, response = 200, {'predictions': [
+                {'conv2d_transpose_output': [[[0.9, 0.1], [0.2, 0.8]]]}
+                for _ in body['instances']
+            ]}
+        data = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(
+        ('127.0.0.1', 0), _PredictHandler
+    )
+    server.requests = []
+    server.clients = set()
+    server.fail = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _ipm(server, batch_size=8, **kwargs):
+    backend = RemoteBackend(
+        endpoint='http://127.0.0.1:{}/v1/model:predict'.format(
+            server.server_port),
+        session=requests.Session(),
+        **kwargs
+    )
+    return ImgPredMgr(backend=backend, batch_size=batch_size)
+
+
+def test_ImgPredMgr_predict_imgs(server):
+    imgs = [PIL.Image.new('RGB', (300, 200), (255, i, 0)) for i in range(5)]
+    ipm = _ipm(server, batch_size=2)
+    predictions = ipm.predict_imgs(imgs)
+    assert len(predictions) == 5
+    assert [len(r['instances']) for r in server.requests] == [2, 2, 1]
+    assert len(server.clients) == 1  # one connection for all requests
+    instance = np.array(server.requests[0]['instances'][1])
+    assert instance.shape == (224, 224, 3)
+    np.testing.assert_allclose(instance[0, 0], [1, 1 / 255, 0], atol=1e-4)
+    assert len(ipm.resized_images) == 5
+    assert [m.tolist() for m in ipm.pred_masks_np] == [[[0, 1]]] * 5
+
+    ipm.shutdown()
+
+    for payload, dtype in [('png', None), ('float16', '<f2')]:
+        ipm = _ipm(server, payload=payload)
+        ipm.predict_imgs(imgs[1:2])
+        data = base64.b64decode(server.requests[-1]['instances'][0]['b64'])
+        if dtype is None:
+            assert data.startswith(b'\x89PNG')
+        else:
+            instance = np.frombuffer(data, dtype=dtype).reshape(224, 224, 3)
+            np.testing.assert_allclose(instance[0, 0], [1, 1 / 255, 0],
+                                       atol=1e-3)
+    ipm.shutdown()
+
+
+def test_ImgPredMgr_predict_imgs_async(server):
+    ipm = _ipm(server)
+    done = threading.Event()
+    future = ipm.predict_imgs_async(
+        [PIL.Image.new('L', (10, 10))], done=lambda f: done.set()
+    )
+    assert len(future.result(timeout=10)) == 1
+    assert done.wait(10)
+    assert ipm.predictions is future.result()
+
+    server.fail = True
+    future = ipm.predict_imgs_async([PIL.Image.new('L', (10, 10))])
+    with pytest.raises(RuntimeError):
+        future.result(timeout=10)
+    ipm.shutdown()
+
+
+class _DummyModel(object):
+
+    """Scores class 1 where the red channel is above 0.5, at half size."""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, batch):
+        self.batches.append(batch)
+        red = batch[:, ::2, ::2, 0]
+        return np.stack([1 - red, red], axis=-1)
+
+
+def test_ImgPredMgr_model_backend():
+    model = _DummyModel()
+    ipm = ImgPredMgr(backend=ModelBackend(model), batch_size=3)
+    img = np.zeros((100, 120, 3), dtype=np.uint8)
+    img[:, 60:, 0] = 255
+    imgs = [PIL.Image.fromarray(img), PIL.Image.fromarray(img[..., 0]),
+            PIL.Image.fromarray(img).convert('RGBA'),
+            PIL.Image.fromarray(img[::2])]
+
+    predictions = ipm.predict_imgs(imgs)
+    assert [b.shape for b in model.batches] == \
+        [(3, 224, 224, 3), (1, 224, 224, 3)]
+    assert all(b.dtype == np.float32 for b in model.batches)
+    assert predictions.shape == (4, 112, 112, 2)
+    masks = ipm.pred_masks_np
+    assert len(masks) == 4
+    for mask in masks:
+        # a gray image is converted to RGB: red where it is white
+        assert (mask[:, :54] == 0).all() and (mask[:, 58:] == 1).all()
+
+    ipm.warmup().result(timeout=10)
+    assert model.batches[-1].shape == (1, 224, 224, 3)
+    assert len(ipm.predict_imgs([])) == 0
+    assert ipm.pred_masks_np == []
+    ipm.shutdown()
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from labelme.user_extns.img_ml_lib import MaskToPolygon
+
+
+def _mask():
+    mask = np.zeros((224, 224), dtype=np.int64)
+    mask[20:120, 30:150] = 1  # largest
+    mask[150:200, 160:210] = 2  # other class: also foreground
+    mask[140, 80] = 1  # noise, removed by opening
+    return mask
+
+
+def test_MaskToPolygon():
+    m_to_p = MaskToPolygon(targ_size=(448, 112))
+    polygon = m_to_p.get_polygon(_mask())
+    assert polygon.shape == (4, 2)
+    np.testing.assert_allclose(polygon.min(axis=0), [60, 10])
+    np.testing.assert_allclose(polygon.max(axis=0), [298, 59.5])
+
+    polygons = m_to_p.get_polygons(_mask(), scale_points=False)
+    assert [p.shape for p in polygons] == [(4, 2), (4, 2)]
+    np.testing.assert_allclose(polygons[1].min(axis=0), [160, 150])
+
+    m_to_p.min_area = 50 * 50
+    assert len(m_to_p.get_polygons(_mask(), scale_points=False)) == 1
+
+    # a circle is simplified with a tolerance from its perimeter
+    circle = np.zeros((224, 224), dtype=np.uint8)
+    yy, xx = np.mgrid[:224, :224]
+    circle[(yy - 112) ** 2 + (xx - 112) ** 2 < 80 ** 2] = 1
+    points = m_to_p.get_polygon(circle, scale_points=False)
+    assert 10 < len(points) < 60
+    radius = np.linalg.norm(points - 112, axis=1)
+    assert (abs(radius - 80) < 3).all()
+
+    batch = np.stack([_mask(), np.zeros((224, 224), dtype=np.int64)])
+    result = m_to_p.get_polygons_batch(batch, scale_points=False)
+    assert [len(polygons) for polygons in result] == [1, 0]
+    assert m_to_p.get_polygon(batch[1], scale_points=False) is None
+
+    with pytest.raises(ValueError):
+        MaskToPolygon().get_polygon(_mask())
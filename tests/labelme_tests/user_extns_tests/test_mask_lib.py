@@ -0,0 +1,64 @@
+import os.path as osp
+import tempfile
+
+import numpy as np
+import PIL.Image
+
+from labelme import utils
+from labelme.user_extns import mask_lib
+
+
+shapes = [
+    dict(label='a', points=[[10, 10], [30, 10], [30, 30]],
+         shape_type='polygon'),
+    dict(label='a', points=[[50, 50], [55, 50]], shape_type='circle'),
+    dict(label='b', points=[[0, 0], [5, 5]], shape_type='rectangle'),
+]
+
+
+def _args(shape):
+    return dict(points=shape['points'], shape_type=shape['shape_type'])
+
+
+def test_shapes_to_mask():
+    mask = mask_lib.shapes_to_mask((60, 80), shapes[:2], value=7)
+    assert mask.dtype == np.uint8
+    assert mask.shape == (60, 80)
+    expected = utils.shape_to_mask((60, 80), **_args(shapes[0])) | \
+        utils.shape_to_mask((60, 80), **_args(shapes[1]))
+    assert np.array_equal(mask == 7, expected)
+    assert set(np.unique(mask)) == {0, 7}
+
+
+def test_label_masks():
+    masks = mask_lib.label_masks((60, 80), shapes, label_to_value={'b': 3})
+    assert sorted(masks) == ['a', 'b']
+    assert masks['a'].max() == 255
+    assert masks['b'].max() == 3
+    assert masks['b'][2, 2] == 3
+    assert masks['b'][20, 20] == 0
+
+
+def test_draw_outlines():
+    img = PIL.Image.new('L', (80, 60))
+    colors = {'a': (255, 0, 0), 'b': (0, 255, 0)}
+    img_out = np.asarray(mask_lib.draw_outlines(img, shapes, colors))
+    assert img_out.shape == (60, 80, 3)
+    assert tuple(img_out[10, 20]) == (255, 0, 0)
+    assert tuple(img_out[0, 2]) == (0, 255, 0)
+    # outlines only
+    assert tuple(img_out[25, 28]) == (0, 0, 0)
+
+
+def test_save_mask():
+    mask = mask_lib.shapes_to_mask((60, 80), shapes, value=9)
+    tmp_dir = tempfile.mkdtemp()
+    for mode in ['L', 'RGB']:
+        path = osp.join(tmp_dir, mode, 'mask.png')
+        mask_lib.save_mask(path, mask, mode=mode)
+        img = PIL.Image.open(path)
+        assert img.mode == mode
+        img = np.asarray(img)
+        if mode == 'RGB':
+            img = img[:, :, 0]
+        assert np.array_equal(img, mask)
@@ -0,0 +1,94 @@
+import json
+import os
+import os.path as osp
+import shutil
+import tempfile
+
+import numpy as np
+import PIL.Image
+
+from labelme.user_extns.annot_export import rpt01_gen
+
+
+def _shape(label, x, group_id=None, flags=None):
+    return dict(
+        label=label,
+        points=[[x, 10], [x + 20, 10], [x + 20, 30]],
+        group_id=group_id,
+        shape_type='polygon',
+        flags=flags or {},
+    )
+
+
+def _make_label_dir(tmp_dir):
+    label_dir = osp.join(tmp_dir, 'annot', 'Ground Truth')
+    os.makedirs(label_dir)
+    shapes = {
+        'a': [_shape('Hole', 10, 7, {'Rework': True}), _shape('Epi', 40, 9),
+              _shape('Hole', 70), _shape('Hole', 100, 1)],
+        'b': [_shape('Epi', 10, 9)],
+        'c': None,  # no label file
+    }
+    for name, img_shapes in shapes.items():
+        img_file = osp.join(label_dir, name + '.bmp')
+        PIL.Image.fromarray(np.zeros((60, 160, 3), dtype=np.uint8)).save(
+            img_file)
+        if img_shapes is None:
+            continue
+        with open(osp.join(label_dir, name + '.json'), 'w') as f:
+            json.dump(dict(version='4.2.9', flags={}, shapes=img_shapes,
+                           imagePath=name + '.bmp', imageData=None,
+                           imageHeight=60, imageWidth=160), f)
+    classes_file = osp.join(tmp_dir, 'classes.json')
+    with open(classes_file, 'w') as f:
+        json.dump({'1': {'name': 'Hole'}, '2': {'name': 'Epi'}}, f)
+    return label_dir, classes_file
+
+
+def test_generate_report():
+    tmp_dir = tempfile.mkdtemp()
+    label_dir, classes_file = _make_label_dir(tmp_dir)
+    export_root = osp.join(tmp_dir, 'export')
+    for max_workers in [0, 2]:
+        df_annot = rpt01_gen.generate_report(
+            label_dir,
+            classes_file_path=classes_file,
+            export_root=export_root,
+            create_img_exports='all',
+            create_annot_exports='all',
+            create_img_masks='all',
+            create_annot_masks='all',
+            max_workers=max_workers,
+        )
+        df_a = df_annot[df_annot['image_basename'] == 'a.bmp']
+        assert df_a['label_instance'].tolist() == [1, 1, 2, 3]
+        # group_id 1 is below min_intensity
+        assert df_a['divs'].notna().tolist() == [True, True, True, False]
+        assert 'Rework' in df_a['divs'].iloc[0]
+
+    for name in ['a_export.png', 'b_export.png']:
+        assert osp.exists(osp.join(export_root, 'annotation_exports', name))
+    assert not osp.exists(
+        osp.join(export_root, 'annotation_exports', 'c_export.png'))
+    assert osp.exists(osp.join(export_root, 'annotation_masks_single',
+                               'Hole', 'a_mask_Hole2.png'))
+    assert osp.exists(osp.join(export_root, 'annotation_exports_single',
+                               'Epi', 'b_export_Epi1_annot.png'))
+    with open(osp.join(export_root, 'rpt01.html')) as f:
+        report = f.read()
+    assert report.count('<h2 id="Hole">') == 1
+    assert report.count('class="disp_img"') == 4
+    assert report.index('<h2 id="Epi">') < report.index('<h2 id="Hole">')
+    shutil.rmtree(tmp_dir)
+
+
+def test_main():
+    tmp_dir = tempfile.mkdtemp()
+    label_dir, _ = _make_label_dir(tmp_dir)
+    export_root = osp.join(tmp_dir, 'export')
+    rpt01_gen.main([label_dir, '--export-root', export_root,
+                    '--img-masks', 'none', '--annot-masks', 'none',
+                    '--max-workers', '0', '--rpt-name', 'r.html'])
+    assert osp.exists(osp.join(export_root, 'r.html'))
+    assert not osp.exists(osp.join(export_root, 'annotation_masks'))
+    shutil.rmtree(tmp_dir)
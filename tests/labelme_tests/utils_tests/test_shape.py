@@ -1,3 +1,7 @@
+import numpy as np
+import PIL.Image
+import PIL.ImageDraw
+
 from .util import get_img_and_data
 
 from labelme.utils import shape as shape_module
@@ -21,3 +25,48 @@ def test_shape_to_mask():
         points = shape['points']
         mask = shape_module.shape_to_mask(img.shape[:2], points)
         assert mask.shape == img.shape[:2]
+
+
+def _shape_to_full_mask(img_shape, points, shape_type=None):
+    # reference: draw on a full-size image
+    mask = PIL.Image.fromarray(np.zeros(img_shape[:2], dtype=np.uint8))
+    draw = PIL.ImageDraw.Draw(mask)
+    xy = [tuple(point) for point in points]
+    shape_module._draw_shape(draw, xy, shape_type, 10, 5)
+    return np.array(mask, dtype=bool)
+
+
+def test_shape_to_mask_matches_full_frame():
+    img_shape = (120, 160)
+    shapes = [
+        ('polygon', [(10.3, 5.7), (80.5, 20.2), (40.1, 70.9)]),
+        ('polygon', [(-20.5, -10.2), (30.7, 15.3), (-5.1, 60.6)]),
+        ('polygon', [(150.2, 100.9), (190.4, 110.1), (170.6, 140.3)]),
+        ('rectangle', [(20.4, 30.6), (90.5, 80.5)]),
+        ('circle', [(60.2, 60.7), (75.3, 90.1)]),
+        ('line', [(5.5, 5.5), (150.2, 110.8)]),
+        ('linestrip', [(5.5, 100.5), (50.2, 10.8), (120.1, 90.3)]),
+        ('point', [(158.7, 2.2)]),
+        ('polygon', [(200.0, 200.0), (210.0, 200.0), (205.0, 210.0)]),
+    ]
+    for shape_type, points in shapes:
+        expected = _shape_to_full_mask(img_shape, points, shape_type)
+        mask = shape_module.shape_to_mask(img_shape, points, shape_type)
+        np.testing.assert_array_equal(mask, expected)
+
+
+def test_shapes_to_label_instances():
+    img_shape = (50, 50)
+    shapes = [
+        dict(label='a', points=[(0, 0), (20, 0), (20, 20)], group_id=1),
+        dict(label='b', points=[(30, 30), (49, 30), (49, 49)], group_id=1),
+        dict(label='a', points=[(0, 30), (20, 30), (20, 49)], group_id=1),
+        dict(label='a', points=[(30, 0), (49, 0), (49, 20)]),
+    ]
+    cls, ins = shape_module.shapes_to_label(
+        img_shape, shapes, {'a': 1, 'b': 2}
+    )
+    assert cls[5, 15] == 1 and ins[5, 15] == 1
+    assert cls[35, 45] == 2 and ins[35, 45] == 2
+    assert cls[35, 15] == 1 and ins[35, 15] == 1
+    assert cls[5, 45] == 1 and ins[5, 45] == 3
@@ -0,0 +1,28 @@
+from labelme.utils import GridIndex
+
+
+def test_GridIndex():
+    index = GridIndex(cell_size=10, max_cells=16)
+    index.insert('a', (0, 0, 5, 5))
+    index.insert('b', (20, 20, 35, 25))
+    index.insert('huge', (-100, -100, 100, 100))
+    assert len(index) == 3
+
+    assert index.query((1, 1, 2, 2)) == {'a', 'huge'}
+    assert index.query((6, 6, 7, 7)) == {'huge'}
+    assert index.query((30, 24, 40, 40)) == {'b', 'huge'}
+    assert index.query((-1000, -1000, 1000, 1000)) == {'a', 'b', 'huge'}
+
+    index.insert('a', (30, 30, 31, 31))
+    assert index.query((1, 1, 2, 2)) == {'huge'}
+    assert index.query((30, 30, 30, 30)) == {'a', 'huge'}
+    assert index.bbox('a') == (30, 30, 31, 31)
+
+    index.remove('huge')
+    index.remove('missing')
+    assert 'huge' not in index
+    assert index.query((-1000, -1000, 1000, 1000)) == {'a', 'b'}
+
+    index.clear()
+    assert len(index) == 0
+    assert index.query((0, 0, 100, 100)) == set()
@@ -0,0 +1,225 @@
+import copy
+import os.path as osp
+import tempfile
+
+from qtpy import QtCore
+from qtpy import QtGui
+
+from labelme.lazy_image import LazyImage
+from labelme.shape import Shape
+import labelme.utils
+from labelme.widgets import Canvas
+
+
+def _shape(points, shape_type='polygon'):
+    shape = Shape(label='a', shape_type=shape_type)
+    shape.points = [QtCore.QPointF(x, y) for x, y in points]
+    return shape
+
+
+def test_Shape_nearest():
+    shape = _shape([(0, 0), (10, 0), (10, 10), (10, 10), (0, 10)])
+    for x, y in [(1, 1), (9, 2), (5, 11), (-2, 5), (10, 10), (30, 30)]:
+        point = QtCore.QPointF(x, y)
+        expected_vertex = None
+        expected_edge = None
+        min_vertex = min_edge = float('inf')
+        for i, p in enumerate(shape.points):
+            dist = labelme.utils.distance(p - point)
+            if dist <= 3 and dist < min_vertex:
+                min_vertex, expected_vertex = dist, i
+            dist = labelme.utils.distancetoline(
+                point, [shape.points[i - 1], p]
+            )
+            if dist <= 3 and dist < min_edge:
+                min_edge, expected_edge = dist, i
+        assert shape.nearestVertex(point, 3) == expected_vertex
+        assert shape.nearestEdge(point, 3) == expected_edge
+
+    version = shape.version
+    shape.moveVertexBy(0, QtCore.QPointF(-5, 0))
+    assert shape.version > version
+    assert shape.boundingBox() == (-5, 0, 10, 10)
+    assert shape.nearestVertex(QtCore.QPointF(-5, 0), 1) == 0
+
+    copied = copy.deepcopy(shape)
+    assert copied.boundingBox() == shape.boundingBox()
+
+
+def test_Shape_points():
+    shape = Shape(label='a')
+    shape.addPoints([(0, 0), (10, 0), (10, 10), (0, 0)])
+    assert shape.isClosed()
+    assert shape.pointsArray().tolist() == [[0, 0], [10, 0], [10, 10]]
+    assert shape.points == [
+        QtCore.QPointF(0, 0), QtCore.QPointF(10, 0), QtCore.QPointF(10, 10)
+    ]
+    assert not hasattr(shape, '_array')
+
+    shape[1] = QtCore.QPointF(20, 0)
+    assert shape[1] == QtCore.QPointF(20, 0)
+    assert shape[-1] == QtCore.QPointF(10, 10)
+    assert shape[:2] == [QtCore.QPointF(0, 0), QtCore.QPointF(20, 0)]
+    shape.insertPoint(1, QtCore.QPointF(5, -5))
+    shape.removePoint(0)
+    assert shape.popPoint() == QtCore.QPointF(10, 10)
+    assert shape.pointsArray().tolist() == [[5, -5], [20, 0]]
+
+    shape.moveBy(QtCore.QPointF(1, 2))
+    assert shape.boundingBox() == (6, -3, 21, 2)
+    path = shape.makePath()
+    assert path.elementCount() == 2
+    assert path.elementAt(1).x == 21
+
+    copied = shape.copy()
+    copied.moveVertexBy(0, QtCore.QPointF(1, 1))
+    assert shape[0] == QtCore.QPointF(6, -3)
+    assert copied[0] == QtCore.QPointF(7, -2)
+
+
+def test_Canvas_shapesAt(qtbot):
+    canvas = Canvas()
+    qtbot.addWidget(canvas)
+    bottom = _shape([(0, 0), (100, 0), (100, 100), (0, 100)])
+    top = _shape([(40, 40), (60, 60)], shape_type='rectangle')
+    far = _shape([(500, 500), (510, 510)], shape_type='circle')
+    canvas.loadShapes([bottom, top, far])
+
+    point = QtCore.QPointF(50, 50)
+    assert canvas.shapesAt(point) == [top, bottom]
+    assert canvas.shapesAt(QtCore.QPointF(10, 10)) == [bottom]
+    assert canvas.shapesAt(QtCore.QPointF(495, 495)) == [far]
+
+    # changes made to the shapes are picked up without notifying the canvas
+    top.moveBy(QtCore.QPointF(200, 0))
+    assert canvas.shapesAt(point) == [bottom]
+    canvas.shapes.remove(bottom)
+    assert canvas.shapesAt(point) == []
+    assert canvas.shapesAt(QtCore.QPointF(101, 50), epsilon=2) == []
+    canvas.shapes.append(bottom)
+    assert canvas.shapesAt(QtCore.QPointF(101, 50), epsilon=2) == [bottom]
+
+    canvas.setShapeVisible(bottom, False)
+    assert canvas.shapesAt(point) == []
+
+
+def test_Shape_paint_cache():
+    shape = _shape([(0, 0), (10, 0), (10, 10)])
+    shape.close()
+    line_path = shape.linePath()
+    vertex_path = shape.vertexPath()
+    assert shape.linePath() is line_path
+    assert shape.vertexPath() is vertex_path
+    n_elements = line_path.elementCount()
+
+    shape.highlightVertex(0, shape.MOVE_VERTEX)
+    assert shape.linePath() is line_path
+    assert shape.vertexPath() is not vertex_path
+
+    shape.addPoint(QtCore.QPointF(0, 10))
+    assert shape.linePath() is not line_path
+    assert shape.linePath().elementCount() == n_elements + 1
+
+
+def test_Canvas_paintStats(qtbot):
+    canvas = Canvas()
+    qtbot.addWidget(canvas)
+    canvas.loadPixmap(QtGui.QPixmap(100, 100))
+    shape = _shape([(0, 0), (50, 0), (50, 50)])
+    canvas.loadShapes([shape])
+    canvas.resize(100, 100)
+    with qtbot.waitExposed(canvas):
+        canvas.show()
+    canvas.paintStats.clear()
+    for _ in range(3):
+        canvas.repaint()
+    report = canvas.paintStatsReport()
+    assert report['paints'] == 3
+    assert report['path_misses'] == 0
+    assert report['path_hits'] == 6
+
+    shape.moveBy(QtCore.QPointF(1, 1))
+    canvas.repaint()
+    report = canvas.paintStatsReport()
+    assert report['path_misses'] == 2
+    assert report['path_hit_rate'] == 0.75
+
+
+def test_Canvas_culling(qtbot):
+    canvas = Canvas()
+    qtbot.addWidget(canvas)
+    canvas.loadPixmap(QtGui.QPixmap(800, 800))
+    shapes = [
+        _shape([(x, y), (x + 20, y), (x + 20, y + 20)])
+        for x in range(0, 800, 80) for y in range(0, 800, 80)
+    ]
+    canvas.loadShapes(shapes)
+    canvas.resize(800, 800)
+    with qtbot.waitExposed(canvas):
+        canvas.show()
+
+    canvas.paintStats.clear()
+    canvas.repaint()
+    assert canvas.paintStatsReport()['shapes_painted'] == 100
+
+    canvas.paintStats.clear()
+    canvas.repaint(canvas.shapesRect([shapes[0]]))
+    report = canvas.paintStatsReport()
+    assert report['paints'] == 1
+    assert report['shapes_painted'] == 1
+    assert report['shapes_culled'] == 99
+    assert report['last_frame_ms'] > 0
+
+    rect = canvas.shapesRect([shapes[0]])
+    assert rect.contains(QtCore.QPoint(0, 0))
+    assert rect.contains(QtCore.QPoint(20, 20))
+    assert not rect.contains(QtCore.QPoint(80, 80))
+
+
+def test_Canvas_tiles(qtbot):
+    canvas = Canvas(tile_pyramid_megapixels=0.1)
+    qtbot.addWidget(canvas)
+    image = QtGui.QImage(2000, 1000, QtGui.QImage.Format_RGB32)
+    image.fill(QtGui.QColor(0, 255, 0))
+    canvas.loadPixmap(QtGui.QPixmap.fromImage(image), image)
+    canvas.scale = 0.25
+    canvas.adjustSize()
+    with qtbot.waitExposed(canvas):
+        canvas.show()
+
+    qtbot.waitUntil(
+        lambda: canvas.paintStatsReport()['tiles_drawn'] > 0, timeout=5000
+    )
+    canvas.paintStats.clear()
+    canvas.repaint()
+    report = canvas.paintStatsReport()
+    assert report['tiles_missing'] == 0
+    assert report['tiles_drawn'] == 1  # level 2 tiles cover 2048 pixels
+
+    canvas.loadPixmap(QtGui.QPixmap.fromImage(image))
+    canvas.paintStats.clear()
+    canvas.repaint()
+    assert canvas.paintStatsReport()['tiles_drawn'] == 0
+
+
+def test_Canvas_lazy_image(qtbot):
+    tmp_dir = tempfile.mkdtemp()
+    filename = osp.join(tmp_dir, 'large.jpg')
+    image = QtGui.QImage(2000, 1000, QtGui.QImage.Format_RGB32)
+    image.fill(QtGui.QColor(0, 255, 0))
+    image.save(filename)
+
+    canvas = Canvas()
+    qtbot.addWidget(canvas)
+    canvas.loadPixmap(LazyImage(filename))
+    canvas.loadShapes([_shape([(1900, 900), (1990, 990)], 'rectangle')])
+    assert canvas.sizeHint() == QtCore.QSize(2000, 1000)
+    canvas.resize(500, 500)
+    with qtbot.waitExposed(canvas):
+        canvas.show()
+
+    qtbot.waitUntil(
+        lambda: canvas.paintStatsReport()['tiles_drawn'] > 0, timeout=5000
+    )
+    assert not canvas.outOfPixmap(QtCore.QPointF(1999, 999))
+    assert canvas.outOfPixmap(QtCore.QPointF(2000, 999))
@@ -0,0 +1,35 @@
+from qtpy.QtCore import Qt
+
+from labelme.widgets import FileListWidget
+
+
+def test_FileListWidget(qtbot):
+    widget = FileListWidget()
+    qtbot.addWidget(widget)
+
+    paths = ['a/1.jpg', 'a/2.jpg', 'b/3.jpg', 'b/4.jpg']
+    widget.setFiles(paths, [False, True, False, True])
+    assert widget.count() == 4
+    assert widget.paths() == paths
+    assert widget.findRow('b/3.jpg') == 2
+    assert widget.findRow('c/5.jpg') == -1
+
+    widget.setFilter(pattern='b/')
+    assert widget.paths() == ['b/3.jpg', 'b/4.jpg']
+    assert widget.findRow('b/3.jpg') == 0
+    assert widget.findRow('a/1.jpg') == -1
+
+    widget.setFilter(showLabeled=False)
+    assert widget.paths() == ['a/1.jpg', 'b/3.jpg']
+
+    widget.setFilter(paths={'a/1.jpg', 'a/2.jpg'})
+    assert widget.paths() == ['a/1.jpg', 'a/2.jpg']
+
+    widget.setFilter()
+    with qtbot.waitSignal(widget.itemSelectionChanged):
+        widget.setCurrentRow(1)
+    assert widget.selectedPaths() == ['a/2.jpg']
+
+    widget.setLabeled('a/1.jpg')
+    index = widget.model().index(0, 0)
+    assert widget.model().data(index, Qt.CheckStateRole) == Qt.Checked